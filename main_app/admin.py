@@ -1,10 +1,185 @@
 from django.contrib import admin
-from .models import Charity, Beneficiary, Program, Event, EventRegistration, ProgramApplication
+from .models import (
+    Charity, Beneficiary, Program, Event, EventRegistration, ProgramApplication, Tombstone,
+    WebhookEndpoint, OutboxEvent, WebhookDelivery, StoredDocument, DocumentUpload,
+    ArchivedProgramApplication, ArchivedEventRegistration, DuplicateCandidate, DuplicateScan, AuditEntry,
+    NotificationJob, Notification, EventSeries, ApplicationStatusChange
+)
+from .paginators import EstimatedCountPaginator
 
 
-admin.site.register(Charity)
-admin.site.register(Beneficiary)
-admin.site.register(Event)
-admin.site.register(Program)
-admin.site.register(EventRegistration)
-admin.site.register(ProgramApplication)
\ No newline at end of file
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for tables that grow to millions of rows: no full
+    COUNT(*) per page, related rows joined rather than fetched per row,
+    and foreign keys edited by id instead of rendered into dropdowns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+# Searches use exact (=) or prefix (^) lookups on indexed columns so they
+# can use an index; plain contains searches scan the whole table.
+@admin.register(Charity)
+class CharityAdmin(admin.ModelAdmin):
+    list_display = ("name", "registration_number", "charity_type", "region", "city", "is_active")
+    list_filter = ("charity_type", "is_active", "region")
+    search_fields = ("^name", "=registration_number", "=email")
+    raw_id_fields = ("admin_user",)
+
+
+@admin.register(Beneficiary)
+class BeneficiaryAdmin(LargeTableAdmin):
+    list_display = ("national_id", "user", "charity", "region", "city", "is_active", "created_at")
+    list_select_related = ("user", "charity")
+    list_filter = ("is_active",)
+    search_fields = ("=national_id", "=user__username")
+    raw_id_fields = ("user",)
+    autocomplete_fields = ("charity",)
+
+
+@admin.register(Program)
+class ProgramAdmin(admin.ModelAdmin):
+    list_display = ("name", "ministry_owner", "status", "application_deadline")
+    list_filter = ("status",)
+    search_fields = ("^name", "=ministry_owner")
+
+
+@admin.register(EventSeries)
+class EventSeriesAdmin(admin.ModelAdmin):
+    list_display = ("title", "charity", "frequency", "interval", "starts_at", "until", "generated_until", "is_active")
+    list_select_related = ("charity",)
+    list_filter = ("frequency", "is_active")
+    search_fields = ("^title",)
+    autocomplete_fields = ("charity",)
+    readonly_fields = ("generated_until",)
+
+
+@admin.register(Event)
+class EventAdmin(LargeTableAdmin):
+    list_display = ("title", "charity", "event_date", "city", "max_capacity", "is_active")
+    list_select_related = ("charity",)
+    list_filter = ("is_active",)
+    search_fields = ("^title",)
+    raw_id_fields = ("series",)
+    autocomplete_fields = ("charity",)
+    date_hierarchy = "event_date"
+
+
+@admin.register(EventRegistration)
+class EventRegistrationAdmin(LargeTableAdmin):
+    list_display = ("id", "event", "beneficiary", "attended", "registered_at")
+    list_select_related = ("event__charity", "beneficiary__user")
+    list_filter = ("attended",)
+    search_fields = ("=beneficiary__national_id",)
+    raw_id_fields = ("beneficiary",)
+    autocomplete_fields = ("event",)
+    date_hierarchy = "registered_at"
+
+
+@admin.register(ProgramApplication)
+class ProgramApplicationAdmin(LargeTableAdmin):
+    list_display = ("id", "program", "beneficiary", "status", "submitted_at", "reviewed_at", "claimed_by")
+    list_select_related = ("program", "beneficiary__user", "claimed_by")
+    list_filter = ("status",)
+    search_fields = ("=beneficiary__national_id",)
+    raw_id_fields = ("beneficiary", "claimed_by")
+    autocomplete_fields = ("program",)
+    date_hierarchy = "submitted_at"
+
+
+@admin.register(ApplicationStatusChange)
+class ApplicationStatusChangeAdmin(LargeTableAdmin):
+    list_display = ("application_id", "from_status", "to_status", "changed_at", "changed_by", "seconds_in_status")
+    list_select_related = ("changed_by",)
+    list_filter = ("to_status",)
+    search_fields = ("=application__id",)
+    raw_id_fields = ("application", "program", "changed_by")
+    date_hierarchy = "changed_at"
+
+
+@admin.register(Tombstone)
+class TombstoneAdmin(LargeTableAdmin):
+    list_display = ("resource", "object_id", "deleted_at")
+    list_filter = ("resource",)
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdmin):
+    list_display = ("id", "event_type", "created_at")
+    list_filter = ("event_type",)
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(LargeTableAdmin):
+    list_display = ("id", "event", "endpoint", "status", "attempts", "next_attempt_at")
+    list_select_related = ("event", "endpoint")
+    list_filter = ("status",)
+    raw_id_fields = ("event",)
+
+
+@admin.register(DocumentUpload)
+class DocumentUploadAdmin(LargeTableAdmin):
+    list_display = ("id", "filename", "status", "received", "size", "expires_at")
+    list_filter = ("status",)
+    raw_id_fields = ("owner", "document")
+
+
+@admin.register(ArchivedProgramApplication)
+class ArchivedProgramApplicationAdmin(LargeTableAdmin):
+    list_display = ("original_id", "program_name", "charity_name", "status", "submitted_at", "archived_at")
+    list_filter = ("status",)
+    search_fields = ("=original_id",)
+
+
+@admin.register(ArchivedEventRegistration)
+class ArchivedEventRegistrationAdmin(LargeTableAdmin):
+    list_display = ("original_id", "event_title", "attended", "registered_at", "archived_at")
+    list_filter = ("attended",)
+    search_fields = ("=original_id",)
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(LargeTableAdmin):
+    list_display = ("beneficiary_a", "beneficiary_b", "score", "status", "updated_at")
+    list_select_related = ("beneficiary_a__user", "beneficiary_b__user")
+    list_filter = ("status",)
+    raw_id_fields = ("beneficiary_a", "beneficiary_b")
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(LargeTableAdmin):
+    list_display = ("created_at", "action", "resource", "object_id", "actor_username")
+    list_filter = ("action", "resource")
+    search_fields = ("=object_id",)
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(LargeTableAdmin):
+    list_display = ("id", "kind", "expanded", "created_at")
+    list_filter = ("kind", "expanded")
+    exclude = ("recipient_ids",)
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ("id", "job", "user", "status", "attempts", "next_attempt_at", "sent_at")
+    list_select_related = ("job", "user")
+    list_filter = ("status",)
+    raw_id_fields = ("job", "user")
+
+
+admin.site.register(WebhookEndpoint)
+admin.site.register(StoredDocument)
+admin.site.register(DuplicateScan)
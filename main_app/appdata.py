@@ -0,0 +1,180 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import BooleanField, CharField, Count, FloatField, JSONField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Program, ProgramApplication
+
+KEY_TYPES = ("number", "text", "boolean")
+LOOKUPS = ("exact", "gt", "gte", "lt", "lte", "in")
+MAX_GROUPS = 1000
+# Keys are interpolated into index DDL and filter SQL, so only plain
+# identifiers are accepted.
+re_key = re.compile(r"^[a-z][a-z0-9_]{0,39}$")
+TABLE = ProgramApplication._meta.db_table
+INDEX_PREFIX = "appdata_"
+
+
+class AppDataError(ValueError):
+    pass
+
+
+def validate_keys(value):
+    if not isinstance(value, dict):
+        raise AppDataError("indexed_data_keys must be an object of {key: type}")
+    for key, kind in value.items():
+        if not re_key.match(key):
+            raise AppDataError(f"Invalid key {key!r}: use lowercase letters, digits and underscores")
+        if kind not in KEY_TYPES:
+            raise AppDataError(f"Invalid type {kind!r} for {key!r}; choose from {', '.join(KEY_TYPES)}")
+    return value
+
+
+def index_name(key):
+    return f"{INDEX_PREFIX}{key}_idx"
+
+
+def key_sql(key, vendor):
+    # Every path into DDL or RawSQL comes through here, validated or not
+    if not re_key.match(key):
+        raise AppDataError(f"Invalid key {key!r}: use lowercase letters, digits and underscores")
+    if vendor == "postgresql":
+        return f"(application_data -> '{key}')"
+    return f"json_extract(application_data, '$.{key}')"
+
+
+def create_index_sql(key, vendor):
+    # Shared by every program that declares the key; program_id leads so
+    # one program's rows are a contiguous range.
+    if vendor == "postgresql":
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(key)} ON {TABLE} (program_id, {key_sql(key, vendor)})"
+    if vendor == "sqlite":
+        return f"CREATE INDEX IF NOT EXISTS {index_name(key)} ON {TABLE} (program_id, {key_sql(key, vendor)})"
+    return None
+
+
+def ensure_indexes(keys, using="default"):
+    """
+    Create the expression index for each key. On PostgreSQL this builds
+    CONCURRENTLY, so call it outside a transaction (sync_indexes() does).
+    """
+    connection = connections[using]
+    created = []
+    with connection.cursor() as cursor:
+        for key in keys:
+            sql = create_index_sql(key, connection.vendor)
+            if sql:
+                cursor.execute(sql)
+                created.append(index_name(key))
+    return created
+
+
+def invalid_indexes(cursor, vendor):
+    """
+    Names of our indexes PostgreSQL marked invalid. A CONCURRENTLY build
+    that fails leaves one behind, and IF NOT EXISTS would skip it forever.
+    """
+    if vendor != "postgresql":
+        return set()
+    cursor.execute(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_class t ON t.oid = i.indrelid WHERE t.relname = %s AND NOT i.indisvalid",
+        [TABLE])
+    return {name for name, in cursor.fetchall() if name.startswith(INDEX_PREFIX)}
+
+
+def sync_indexes(using="default"):
+    """
+    Create indexes for every declared key, rebuild any left invalid by a
+    failed build, and drop those no program declares any more. Saving a
+    program does not build indexes; run this (manage.py
+    sync_application_data_indexes) after changing declarations.
+    """
+    declared = set()
+    for keys in Program.objects.using(using).values_list("indexed_data_keys", flat=True):
+        declared.update(validate_keys(keys or {}))
+    connection = connections[using]
+    concurrently = "CONCURRENTLY " if connection.vendor == "postgresql" else ""
+    with connection.cursor() as cursor:
+        existing = {name for name in connection.introspection.get_constraints(cursor, TABLE)
+                    if name.startswith(INDEX_PREFIX)}
+        invalid = invalid_indexes(cursor, connection.vendor)
+        for name in sorted(invalid):
+            cursor.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
+    existing -= invalid
+    wanted = {index_name(key) for key in declared}
+    ensure_indexes(sorted(declared), using)
+    dropped = sorted(existing - wanted)
+    with connection.cursor() as cursor:
+        for name in dropped:
+            cursor.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
+    rebuilt = sorted(invalid & wanted)
+    return sorted(wanted - existing - invalid), rebuilt, dropped + sorted(invalid - wanted)
+
+
+def parse_value(kind, raw):
+    if kind == "number":
+        try:
+            number = float(raw)
+        except ValueError:
+            raise AppDataError(f"Expected a number, got {raw!r}")
+        return int(number) if number.is_integer() and "." not in raw else number
+    if kind == "boolean":
+        if raw.lower() not in ("true", "false"):
+            raise AppDataError(f"Expected true or false, got {raw!r}")
+        return raw.lower() == "true"
+    return raw
+
+
+def key_expression(key, kind, vendor):
+    if vendor == "postgresql":
+        # jsonb compares numbers numerically and strings lexically
+        output = JSONField()
+    else:
+        output = {"number": FloatField(), "boolean": BooleanField()}.get(kind, CharField())
+    return RawSQL(key_sql(key, vendor), [], output_field=output)
+
+
+def data_filters(params):
+    """Yield (key, lookup, raw value) for "data.<key>[__lookup]" query parameters."""
+    for name, raw in params.items():
+        if name.startswith("data."):
+            key, _, lookup = name[len("data."):].partition("__")
+            yield key, lookup or "exact", raw
+
+
+def filter_applications(queryset, program, params):
+    """
+    Apply "data.<key>[__lookup]=value" filters on the program's declared
+    keys. Undeclared keys are rejected rather than scanned.
+    """
+    declared = program.indexed_data_keys or {}
+    vendor = connections[queryset.db].vendor
+    for key, lookup, raw in data_filters(params):
+        if key not in declared:
+            raise AppDataError(f"application_data key {key!r} is not indexed for this program")
+        if lookup not in LOOKUPS:
+            raise AppDataError(f"Unsupported lookup {lookup!r}; choose from {', '.join(LOOKUPS)}")
+        kind = declared[key]
+        values = [parse_value(kind, v) for v in raw.split(",")] if lookup == "in" else [parse_value(kind, raw)]
+        if vendor == "postgresql" and lookup in ("exact", "in"):
+            # Containment is answered by the GIN index on application_data
+            queryset = queryset.filter(reduce(or_, [Q(application_data__contains={key: v}) for v in values]))
+            continue
+        alias = f"data_{key}"
+        value = values if lookup == "in" else values[0]
+        queryset = queryset.alias(**{alias: key_expression(key, kind, vendor)}).filter(**{f"{alias}__{lookup}": value})
+    return queryset
+
+
+def count_by(queryset, program, key):
+    declared = program.indexed_data_keys or {}
+    if key not in declared:
+        raise AppDataError(f"application_data key {key!r} is not indexed for this program")
+    vendor = connections[queryset.db].vendor
+    rows = (queryset.order_by().annotate(value=key_expression(key, declared[key], vendor))
+            .values("value").annotate(count=Count("pk")).order_by("-count")[:MAX_GROUPS])
+    return list(rows)
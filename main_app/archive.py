@@ -0,0 +1,210 @@
+import operator
+import time
+from datetime import timedelta
+from functools import reduce
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .changes import record_tombstones, tombstone_related
+from .models import ArchivedEventRegistration, ArchivedProgramApplication, EventRegistration, ProgramApplication
+
+ARCHIVE_DEFAULTS = {
+    "BATCH_SIZE": 500,
+    "SLEEP_SECONDS": 0,
+    # Applications move once their program has been CLOSED this long
+    "CLOSED_PROGRAM_DAYS": 90,
+    # Registrations move once their event is this far in the past
+    "PAST_EVENT_DAYS": 180,
+}
+
+
+def archive_settings():
+    return {**ARCHIVE_DEFAULTS, **getattr(settings, "ARCHIVE", {})}
+
+
+def delete_rows(model, rows):
+    """Delete loaded rows, writing their changes-feed tombstones in one insert."""
+    record_tombstones(model, rows)
+    model._base_manager.filter(pk__in=[r.pk for r in rows]).delete()
+
+
+def archivable_applications(now=None, days=None):
+    days = archive_settings()["CLOSED_PROGRAM_DAYS"] if days is None else days
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return ProgramApplication.objects.filter(program__status="CLOSED", program__closed_at__lt=cutoff)
+
+
+def archivable_registrations(now=None, days=None):
+    days = archive_settings()["PAST_EVENT_DAYS"] if days is None else days
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return EventRegistration.objects.filter(event__event_date__lt=cutoff)
+
+
+def archived_application(a):
+    return ArchivedProgramApplication(
+        original_id=a.id, program_id=a.program_id, program_name=a.program.name,
+        ministry_owner=a.program.ministry_owner, beneficiary_id=a.beneficiary_id,
+        charity_id=a.beneficiary.charity_id, charity_name=a.beneficiary.charity.name,
+        status=a.status, application_data=a.application_data, submitted_at=a.submitted_at,
+        reviewed_at=a.reviewed_at, review_notes=a.review_notes,
+    )
+
+
+def archived_registration(r):
+    return ArchivedEventRegistration(
+        original_id=r.id, event_id=r.event_id, event_title=r.event.title, event_date=r.event.event_date,
+        charity_id=r.event.charity_id, beneficiary_id=r.beneficiary_id, registered_at=r.registered_at,
+        attended=r.attended, notes=r.notes,
+    )
+
+
+# name: (source queryset factory, archive model, row builder, relations the builder reads)
+ARCHIVES = {
+    "applications": (archivable_applications, ArchivedProgramApplication, archived_application,
+                     ("program", "beneficiary__charity")),
+    "registrations": (archivable_registrations, ArchivedEventRegistration, archived_registration,
+                      ("event", "beneficiary")),
+}
+
+
+def move_in_batches(queryset, archive_model, build, related=(), batch_size=None, sleep=None, progress=None):
+    """
+    Copy rows into `archive_model` and delete them from the hot table,
+    batch_size rows per transaction, pausing `sleep` seconds in between.
+    Returns the number of rows moved.
+    """
+    config = archive_settings()
+    batch_size = batch_size or config["BATCH_SIZE"]
+    sleep = config["SLEEP_SECONDS"] if sleep is None else sleep
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.select_related(*related).select_for_update(of=("self",))
+                        .order_by("pk")[:batch_size])
+            if not rows:
+                break
+            # original_id is unique, so re-running after a partial failure
+            # cannot duplicate archive rows.
+            archive_model.objects.bulk_create([build(r) for r in rows], ignore_conflicts=True)
+            delete_rows(queryset.model, rows)
+        moved += len(rows)
+        if progress:
+            progress(moved)
+        if sleep:
+            time.sleep(sleep)
+    return moved
+
+
+def _cascade_children(model):
+    for rel in model._meta.related_objects:
+        if rel.on_delete is models.CASCADE and not rel.many_to_many:
+            yield rel.related_model, rel.field.name
+
+
+def purge_plan(queryset, _path=()):
+    """Querysets to delete, deepest cascade children first and `queryset` last."""
+    model = queryset.model
+    steps = []
+    for child, field in _cascade_children(model):
+        if child in _path or child is model:
+            continue
+        steps += purge_plan(child._base_manager.filter(**{f"{field}__in": queryset.values("pk")}),
+                            _path + (model,))
+    steps.append(queryset)
+    return steps
+
+
+def record_cascade_tombstones(queryset):
+    """
+    Tombstones for every changes-feed row that deleting `queryset` removes,
+    itself and its cascade children, with one select and one insert per
+    model. Call it just before the delete, in the same transaction.
+    """
+    by_model = {}
+    for qs in purge_plan(queryset):
+        if tombstone_related(qs.model) is not None:
+            by_model.setdefault(qs.model, []).append(Q(pk__in=qs.values("pk")))
+    for model, conditions in by_model.items():
+        rows = model._base_manager.filter(reduce(operator.or_, conditions)).select_related(*tombstone_related(model))
+        record_tombstones(model, rows)
+
+
+def _delete_in_batches(queryset, batch_size, sleep, progress):
+    model, label = queryset.model, queryset.model._meta.label
+    related = tombstone_related(model)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            if related is not None:
+                rows = list(queryset.select_related(*related).order_by("pk")[:batch_size])
+            else:
+                rows = [model(pk=pk) for pk in queryset.order_by("pk").values_list("pk", flat=True)[:batch_size]]
+            if not rows:
+                return deleted
+            delete_rows(model, rows)
+        deleted += len(rows)
+        if progress:
+            progress(label, deleted)
+        if sleep:
+            time.sleep(sleep)
+
+
+def purge(queryset, batch_size=None, sleep=None, dry_run=False, progress=None):
+    """
+    Delete `queryset` and everything that cascades from it, deepest
+    children first, in short transactions of batch_size rows.
+
+    Returns {model label: rows} for what was (or, with dry_run, would be)
+    deleted. Relations that are not CASCADE (PROTECT, SET_NULL) are left
+    to Django's normal delete handling for each batch.
+    """
+    config = archive_settings()
+    batch_size = batch_size or config["BATCH_SIZE"]
+    sleep = config["SLEEP_SECONDS"] if sleep is None else sleep
+    steps = purge_plan(queryset)
+
+    if dry_run:
+        # A model reachable by several paths (registrations via both the
+        # event and the beneficiary) is counted once.
+        by_model = {}
+        for qs in steps:
+            by_model.setdefault(qs.model, []).append(Q(pk__in=qs.values("pk")))
+        return {
+            model._meta.label: model._base_manager.filter(reduce(operator.or_, conditions)).count()
+            for model, conditions in by_model.items()
+        }
+
+    counts = {}
+    for qs in steps:
+        label = qs.model._meta.label
+        counts[label] = counts.get(label, 0) + _delete_in_batches(qs, batch_size, sleep, progress)
+    return counts
+
+
+def include_archive(params):
+    return str(params.get("include_archive", "")).lower() in ("1", "true", "yes")
+
+
+def application_archive_summary(archived):
+    return {
+        "total_applications": archived.count(),
+        "unique_beneficiaries": archived.values("beneficiary_id").distinct().count(),
+        "applications_by_status": list(archived.values("status").annotate(count=Count("id")).order_by("status")),
+        "applications_by_program": list(
+            archived.values("program_id", "program_name").annotate(count=Count("id")).order_by("-count")),
+    }
+
+
+def registration_archive_summary(archived):
+    total = archived.count()
+    attended = archived.filter(attended=True).count()
+    return {
+        "total_registrations": total,
+        "attended_registrations": attended,
+        "attendance_rate": round(attended / total * 100, 1) if total else 0,
+        "registrations_by_event": list(
+            archived.values("event_id", "event_title").annotate(count=Count("id")).order_by("-count")),
+    }
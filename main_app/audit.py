@@ -0,0 +1,165 @@
+import base64
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import AuditEntry
+
+AUDIT_DEFAULTS = {
+    "BATCH_SIZE": 500,
+    "PAGE_SIZE": 100,
+    "MAX_PAGE_SIZE": 1000,
+}
+
+# Never copied into the log
+EXCLUDED_FIELDS = {"password", "last_login", "updated_at"}
+
+
+def audit_settings():
+    return {**AUDIT_DEFAULTS, **getattr(settings, "AUDIT_LOG", {})}
+
+
+def _plain(value):
+    if isinstance(value, FieldFile):
+        return value.name or None
+    return value
+
+
+def snapshot(instance):
+    return {
+        f.attname: _plain(f.value_from_object(instance))
+        for f in instance._meta.concrete_fields if f.attname not in EXCLUDED_FIELDS
+    }
+
+
+def diff(before, after):
+    return {name: [before.get(name), value] for name, value in after.items() if before.get(name) != value}
+
+
+_local = threading.local()
+
+
+def _pending():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class atomic:
+    """
+    transaction.atomic() that writes the audit entries recorded inside it
+    in one bulk insert just before the outermost block commits, so the
+    entries are durable exactly when the change is.
+    """
+
+    def __init__(self, using=None):
+        self.transaction = transaction.atomic(using=using)
+
+    def __enter__(self):
+        self.transaction.__enter__()
+        _pending().append([])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stack = _pending()
+        entries = stack.pop()
+        if exc_type is None and entries:
+            try:
+                if stack:
+                    stack[-1].extend(entries)
+                else:
+                    AuditEntry.objects.bulk_create(entries, batch_size=audit_settings()["BATCH_SIZE"])
+            except Exception as e:
+                self.transaction.__exit__(type(e), e, e.__traceback__)
+                raise
+        return self.transaction.__exit__(exc_type, exc, tb)
+
+
+def record(actor, action, instance, changes, object_id=None):
+    if action == "UPDATE" and not changes:
+        return
+    entry = AuditEntry(
+        actor_id=getattr(actor, "pk", None), actor_username=getattr(actor, "username", "") or "",
+        action=action, resource=instance._meta.model_name, object_id=str(object_id or instance.pk),
+        changes=changes,
+    )
+    stack = _pending()
+    if stack:
+        stack[-1].append(entry)
+    else:
+        # Written in the caller's transaction, if any, so it commits or rolls back with the change
+        AuditEntry.objects.bulk_create([entry])
+
+
+def record_created(actor, instance):
+    record(actor, "CREATE", instance, diff({}, snapshot(instance)))
+
+
+@contextmanager
+def tracking(actor, instance, action="UPDATE"):
+    """Record the field-level changes the block makes to `instance`, or its deletion."""
+    before = snapshot(instance)
+    object_id = instance.pk
+    yield
+    if action == "DELETE":
+        record(actor, action, instance, {name: [value, None] for name, value in before.items()}, object_id)
+    else:
+        record(actor, action, instance, diff(before, snapshot(instance)))
+
+
+def encode_cursor(entry):
+    return base64.urlsafe_b64encode(f"{entry.created_at.isoformat()}|{entry.id}".encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        created_at, id = base64.urlsafe_b64decode(value.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_moment(value, end=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value!r}")
+        moment = datetime.combine(day, dt_time.max if end else dt_time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def search(resource=None, object_id=None, actor_id=None, action=None, since=None, until=None, cursor=None):
+    """
+    Entries newest first, filtered on the indexed columns: one object's
+    history (resource + object_id), one actor's activity, or a time range.
+    Paged by a (created_at, id) keyset cursor.
+    """
+    entries = AuditEntry.objects.order_by("-created_at", "-id")
+    if resource:
+        entries = entries.filter(resource=resource)
+    if object_id:
+        entries = entries.filter(object_id=object_id)
+    if actor_id:
+        try:
+            entries = entries.filter(actor_id=int(actor_id))
+        except ValueError:
+            raise ValueError("actor_id must be an integer")
+    if action:
+        entries = entries.filter(action=action.upper())
+    if since:
+        entries = entries.filter(created_at__gte=parse_moment(since))
+    if until:
+        entries = entries.filter(created_at__lte=parse_moment(until, end=True))
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        entries = entries.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id))
+    return entries
+
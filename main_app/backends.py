@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+def users_by_email(email):
+    """
+    Case-insensitive email lookup matching the auth_user_email_lower_idx
+    expression index. Active accounts come first, then the oldest, so
+    duplicate emails always resolve to the same user.
+    """
+    return (
+        UserModel.objects.alias(email_lower=Lower("email"))
+        .filter(email_lower=email.strip().lower())
+        .select_related("charity_admin", "beneficiary_profile")
+        .order_by("-is_active", "id")
+    )
+
+
+class EmailBackend(ModelBackend):
+    """
+    Authenticates with email and password in a single query that also
+    loads the charity and beneficiary relations the login response needs.
+
+    User.check_password re-encodes the stored hash when the configured
+    hasher's parameters have changed, so cost can be tuned without resets.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not isinstance(email, str) or password is None:
+            return None
+        user = users_by_email(email).first()
+        if user is None:
+            # Spend the same hashing time as a wrong password would.
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,355 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Charity, Beneficiary, Program, Event, EventRegistration, ProgramApplication, Tombstone
+from .renderers import FastJSONRenderer
+from .serializers import (
+    CharitySerializer, BeneficiarySerializer, ProgramSerializer, EventSerializer,
+    EventRegistrationSerializer, ProgramApplicationSerializer
+)
+
+FEED_DEFAULTS = {
+    # Rows newer than this are held back so transactions that commit late
+    # with an earlier updated_at are not skipped by the cursor.
+    "SAFETY_LAG_SECONDS": 2,
+    "PAGE_SIZE": 500,
+    "MAX_PAGE_SIZE": 5000,
+    "TOMBSTONE_RETENTION_DAYS": 30,
+}
+
+CURSOR_SALT = "main_app.changes.cursor"
+
+
+class CursorExpired(Exception):
+    pass
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def feed_settings():
+    return {**FEED_DEFAULTS, **getattr(settings, "CHANGES_FEED", {})}
+
+
+def _role(user):
+    if user.is_superuser:
+        return "ministry"
+    if hasattr(user, "charity_admin"):
+        return "charity"
+    if hasattr(user, "beneficiary_profile"):
+        return "beneficiary"
+    return None
+
+
+class FeedResource:
+    name = None
+    model = None
+    serializer_class = None
+    related = ()
+    # Relations tombstone_scope() reads, joined when tombstoning in bulk
+    scope_related = ()
+
+    def live(self, user, role):
+        raise NotImplementedError
+
+    def tombstones(self, user, role):
+        raise NotImplementedError
+
+    def visible(self, user, role, obj):
+        # Rows that are in the live queryset but should be hidden from this
+        # user are sent as deletions, so clients drop them.
+        return True
+
+    def queryset(self, user, role):
+        return self.live(user, role).select_related(*self.related)
+
+    def tombstone_scope(self, obj):
+        return {}
+
+
+class CharityResource(FeedResource):
+    name = "charities"
+    model = Charity
+    serializer_class = CharitySerializer
+    related = ("admin_user",)
+
+    def live(self, user, role):
+        if role == "ministry":
+            return Charity.objects.all()
+        if role == "charity":
+            return Charity.objects.filter(admin_user=user)
+        return Charity.objects.none()
+
+    def tombstones(self, user, role):
+        if role == "ministry":
+            return Q()
+        if role == "charity":
+            return Q(scope_charity=user.charity_admin.id)
+        return None
+
+    def tombstone_scope(self, obj):
+        return {"scope_charity": obj.id}
+
+
+class ProgramResource(FeedResource):
+    name = "programs"
+    model = Program
+    serializer_class = ProgramSerializer
+
+    def live(self, user, role):
+        name = user.first_name if role == "ministry" else None
+        if name:
+            return Program.objects.filter(ministry_owner__icontains=name)
+        return Program.objects.all()
+
+    def tombstones(self, user, role):
+        name = user.first_name if role == "ministry" else None
+        return Q(scope_ministry__icontains=name) if name else Q()
+
+    def visible(self, user, role, obj):
+        return role == "ministry" or obj.status == "ACTIVE"
+
+    def tombstone_scope(self, obj):
+        return {"scope_ministry": obj.ministry_owner}
+
+
+class BeneficiaryResource(FeedResource):
+    name = "beneficiaries"
+    model = Beneficiary
+    serializer_class = BeneficiarySerializer
+    related = ("user", "charity")
+
+    def live(self, user, role):
+        if role == "ministry":
+            return Beneficiary.objects.all()
+        if role == "charity":
+            return Beneficiary.objects.filter(charity=user.charity_admin)
+        if role == "beneficiary":
+            return Beneficiary.objects.filter(user=user)
+        return Beneficiary.objects.none()
+
+    def tombstones(self, user, role):
+        if role == "ministry":
+            return Q()
+        if role == "charity":
+            return Q(scope_charity=user.charity_admin.id)
+        if role == "beneficiary":
+            return Q(scope_user=user.id)
+        return None
+
+    def tombstone_scope(self, obj):
+        return {"scope_charity": obj.charity_id, "scope_user": obj.user_id}
+
+
+class EventResource(FeedResource):
+    name = "events"
+    model = Event
+    serializer_class = EventSerializer
+    related = ("charity",)
+
+    def live(self, user, role):
+        if role == "ministry":
+            return Event.objects.all()
+        if role == "charity":
+            return Event.objects.filter(charity=user.charity_admin)
+        if role == "beneficiary":
+            return Event.objects.filter(charity=user.beneficiary_profile.charity_id)
+        return Event.objects.none()
+
+    def tombstones(self, user, role):
+        if role == "ministry":
+            return Q()
+        if role == "charity":
+            return Q(scope_charity=user.charity_admin.id)
+        if role == "beneficiary":
+            return Q(scope_charity=user.beneficiary_profile.charity_id)
+        return None
+
+    def visible(self, user, role, obj):
+        return role != "beneficiary" or obj.is_active
+
+    def tombstone_scope(self, obj):
+        return {"scope_charity": obj.charity_id}
+
+
+class ApplicationResource(FeedResource):
+    name = "applications"
+    model = ProgramApplication
+    serializer_class = ProgramApplicationSerializer
+    scope_related = ("beneficiary", "program")
+
+    def live(self, user, role):
+        if role == "ministry":
+            name = user.first_name
+            qs = ProgramApplication.objects.all()
+            return qs.filter(program__ministry_owner__icontains=name) if name else qs
+        if role == "charity":
+            return ProgramApplication.objects.filter(beneficiary__charity=user.charity_admin)
+        if role == "beneficiary":
+            return ProgramApplication.objects.filter(beneficiary__user=user)
+        return ProgramApplication.objects.none()
+
+    def tombstones(self, user, role):
+        if role == "ministry":
+            return Q(scope_ministry__icontains=user.first_name) if user.first_name else Q()
+        if role == "charity":
+            return Q(scope_charity=user.charity_admin.id)
+        if role == "beneficiary":
+            return Q(scope_user=user.id)
+        return None
+
+    def tombstone_scope(self, obj):
+        beneficiary = obj.beneficiary
+        return {
+            "scope_charity": beneficiary.charity_id,
+            "scope_user": beneficiary.user_id,
+            "scope_ministry": obj.program.ministry_owner,
+        }
+
+
+class RegistrationResource(FeedResource):
+    name = "registrations"
+    model = EventRegistration
+    serializer_class = EventRegistrationSerializer
+    scope_related = ("event", "beneficiary")
+
+    def live(self, user, role):
+        if role == "ministry":
+            return EventRegistration.objects.all()
+        if role == "charity":
+            return EventRegistration.objects.filter(event__charity=user.charity_admin)
+        if role == "beneficiary":
+            return EventRegistration.objects.filter(beneficiary__user=user)
+        return EventRegistration.objects.none()
+
+    def tombstones(self, user, role):
+        if role == "ministry":
+            return Q()
+        if role == "charity":
+            return Q(scope_charity=user.charity_admin.id)
+        if role == "beneficiary":
+            return Q(scope_user=user.id)
+        return None
+
+    def tombstone_scope(self, obj):
+        return {"scope_charity": obj.event.charity_id, "scope_user": obj.beneficiary.user_id}
+
+
+# Parents before children, so a client applying the feed in order never
+# sees a row that references something it has not received yet.
+RESOURCES = {
+    r.name: r for r in (
+        CharityResource(), ProgramResource(), BeneficiaryResource(),
+        EventResource(), ApplicationResource(), RegistrationResource(),
+    )
+}
+RESOURCE_BY_MODEL = {r.model: r for r in RESOURCES.values()}
+
+
+def record_tombstones(model, instances):
+    resource = RESOURCE_BY_MODEL.get(model)
+    if resource is None:
+        return []
+    return Tombstone.objects.bulk_create([
+        Tombstone(resource=resource.name, object_id=obj.pk, **resource.tombstone_scope(obj))
+        for obj in instances
+    ])
+
+
+def purge_tombstones():
+    """Delete tombstones older than TOMBSTONE_RETENTION_DAYS; cursors that old are refused anyway."""
+    cutoff = timezone.now() - timedelta(days=feed_settings()["TOMBSTONE_RETENTION_DAYS"])
+    return Tombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
+
+
+def tombstone_related(model):
+    """Relations to join when loading rows for record_tombstones(), or None if `model` has no tombstones."""
+    resource = RESOURCE_BY_MODEL.get(model)
+    return resource.scope_related if resource else None
+
+
+def encode_cursor(state):
+    return signing.dumps(state, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return {"positions": {}, "deleted": {}, "horizon": None}
+    try:
+        state = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor("Invalid cursor")
+    horizon = parse_datetime(state.get("horizon") or "")
+    retention = timedelta(days=feed_settings()["TOMBSTONE_RETENTION_DAYS"])
+    if horizon is None or horizon < timezone.now() - retention:
+        raise CursorExpired("Cursor is older than the tombstone retention window, a full resync is required")
+    return state
+
+
+def _after(position, time_field):
+    if not position:
+        return Q()
+    moment, pk = parse_datetime(position[0]), position[1]
+    return Q(**{f"{time_field}__gt": moment}) | Q(**{time_field: moment, "id__gt": pk})
+
+
+def _line(obj):
+    return FastJSONRenderer().render(obj) + b"\n"
+
+
+def iter_changes(user, cursor_state, resource_names, limit):
+    """
+    Yield NDJSON lines for rows changed after the cursor, in resource order
+    and (updated_at, id) order within each resource, followed by tombstones
+    and a final line carrying the next cursor.
+    """
+    role = _role(user)
+    horizon = timezone.now() - timedelta(seconds=feed_settings()["SAFETY_LAG_SECONDS"])
+    positions = dict(cursor_state.get("positions", {}))
+    deleted = dict(cursor_state.get("deleted", {}))
+    remaining, has_more = limit, False
+
+    for name in resource_names:
+        resource = RESOURCES[name]
+        qs = resource.queryset(user, role).filter(
+            _after(positions.get(name), "updated_at"), updated_at__lte=horizon
+        ).order_by("updated_at", "id")[:remaining + 1]
+        sent = 0
+        for obj in qs.iterator(chunk_size=200):
+            if sent == remaining:
+                has_more = True
+                break
+            sent += 1
+            positions[name] = [obj.updated_at.isoformat(), obj.id]
+            if resource.visible(user, role, obj):
+                yield _line({"op": "upsert", "resource": name, "id": obj.id, "updated_at": obj.updated_at,
+                             "data": resource.serializer_class(obj).data})
+            else:
+                yield _line({"op": "delete", "resource": name, "id": obj.id, "deleted_at": obj.updated_at})
+        remaining -= sent
+
+    for name in reversed(resource_names):
+        scope = RESOURCES[name].tombstones(user, role)
+        if scope is None:
+            continue
+        qs = Tombstone.objects.filter(scope, _after(deleted.get(name), "deleted_at"),
+                                      resource=name, deleted_at__lte=horizon)\
+            .order_by("deleted_at", "id")[:remaining + 1]
+        sent = 0
+        for tomb in qs.iterator(chunk_size=500):
+            if sent == remaining:
+                has_more = True
+                break
+            sent += 1
+            deleted[name] = [tomb.deleted_at.isoformat(), tomb.id]
+            yield _line({"op": "delete", "resource": name, "id": tomb.object_id, "deleted_at": tomb.deleted_at})
+        remaining -= sent
+
+    cursor = encode_cursor({"positions": positions, "deleted": deleted, "horizon": horizon.isoformat()})
+    yield _line({"op": "cursor", "cursor": cursor, "has_more": has_more})
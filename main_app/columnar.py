@@ -0,0 +1,162 @@
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+
+from .models import Beneficiary, EventRegistration, ProgramApplication
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, CSV exports only
+    pa = pq = None
+
+COLUMNAR_DEFAULTS = {
+    "CHUNK_ROWS": 10000,
+    "COMPRESSION": "zstd",
+}
+
+# content type, file extension, supported codecs
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet", ("zstd", "snappy", "gzip", "lz4", "none")),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow", ("zstd", "lz4", "none")),
+}
+
+Column = namedtuple("Column", "name lookup kind")
+Dataset = namedtuple("Dataset", "model date_field charity_field columns")
+
+DATASETS = {
+    "applications": Dataset(ProgramApplication, "submitted_at", "beneficiary__charity_id", (
+        Column("id", "id", "int"),
+        Column("program_id", "program_id", "int"),
+        Column("program", "program__name", "category"),
+        Column("ministry", "program__ministry_owner", "category"),
+        Column("beneficiary_id", "beneficiary_id", "int"),
+        Column("charity_id", "beneficiary__charity_id", "int"),
+        Column("charity", "beneficiary__charity__name", "category"),
+        Column("region", "beneficiary__region", "category"),
+        Column("city", "beneficiary__city", "category"),
+        Column("status", "status", "category"),
+        Column("submitted_at", "submitted_at", "timestamp"),
+        Column("reviewed_at", "reviewed_at", "timestamp"),
+        Column("review_notes", "review_notes", "str"),
+    )),
+    "registrations": Dataset(EventRegistration, "registered_at", "event__charity_id", (
+        Column("id", "id", "int"),
+        Column("event_id", "event_id", "int"),
+        Column("event", "event__title", "category"),
+        Column("event_date", "event__event_date", "timestamp"),
+        Column("event_city", "event__city", "category"),
+        Column("charity_id", "event__charity_id", "int"),
+        Column("beneficiary_id", "beneficiary_id", "int"),
+        Column("beneficiary_charity_id", "beneficiary__charity_id", "int"),
+        Column("registered_at", "registered_at", "timestamp"),
+        Column("attended", "attended", "bool"),
+    )),
+    "beneficiaries": Dataset(Beneficiary, "created_at", "charity_id", (
+        Column("id", "id", "int"),
+        Column("charity_id", "charity_id", "int"),
+        Column("charity", "charity__name", "category"),
+        Column("region", "region", "category"),
+        Column("city", "city", "category"),
+        Column("date_of_birth", "date_of_birth", "date"),
+        Column("family_size", "family_size", "int"),
+        Column("monthly_income", "monthly_income", "money"),
+        Column("is_active", "is_active", "bool"),
+        Column("created_at", "created_at", "timestamp"),
+    )),
+}
+
+
+class ColumnarError(ValueError):
+    pass
+
+
+def columnar_settings():
+    return {**COLUMNAR_DEFAULTS, **getattr(settings, "COLUMNAR_EXPORT", {})}
+
+
+def available():
+    return pa is not None
+
+
+def arrow_type(kind):
+    return {
+        "int": pa.int64(),
+        "str": pa.string(),
+        # Low-cardinality text is dictionary-encoded: each distinct value is stored once
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "bool": pa.bool_(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "money": pa.decimal128(10, 2),
+    }[kind]
+
+
+def schema(dataset):
+    return pa.schema([pa.field(c.name, arrow_type(c.kind)) for c in dataset.columns])
+
+
+def record_batches(rows, dataset, chunk_rows):
+    """
+    Turn an iterable of row tuples into record batches of at most
+    `chunk_rows` rows. Category dictionaries only grow from batch to
+    batch, so the IPC file writer emits each new value once as a delta.
+    """
+    target = schema(dataset)
+    dictionaries = {i: {} for i, c in enumerate(dataset.columns) if c.kind == "category"}
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            return
+        arrays = []
+        for i, (values, field) in enumerate(zip(zip(*chunk), target)):
+            if i in dictionaries:
+                codes = dictionaries[i]
+                indices = [None if v is None else codes.setdefault(v, len(codes)) for v in values]
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()),
+                                                             pa.array(list(codes), type=pa.string())))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        yield pa.record_batch(arrays, schema=target)
+
+
+def write(rows, dataset, fmt, out, compression=None, chunk_rows=None):
+    """
+    Write `rows` (tuples in `dataset.columns` order) to the binary file
+    `out` as an Arrow IPC file or Parquet, one record batch (row group)
+    per chunk, so memory stays bounded by the chunk size. Returns the
+    number of rows written.
+    """
+    if not available():
+        raise ColumnarError("Columnar exports require the pyarrow package")
+    if fmt not in FORMATS:
+        raise ColumnarError(f"format must be one of {', '.join(FORMATS)}")
+    config = columnar_settings()
+    compression = (compression or config["COMPRESSION"] or "none").lower()
+    if compression not in FORMATS[fmt][2]:
+        raise ColumnarError(f"{fmt} compression must be one of {', '.join(FORMATS[fmt][2])}")
+    chunk_rows = chunk_rows or config["CHUNK_ROWS"]
+    target = schema(dataset)
+    count = 0
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(out, target, compression=compression)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression,
+                                         emit_dictionary_deltas=True)
+        writer = pa.ipc.new_file(out, target, options=options)
+    with writer:
+        for batch in record_batches(rows, dataset, chunk_rows):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def export(queryset, dataset, fmt, out, compression=None):
+    """Stream `queryset` straight from values_list() chunks into a columnar file."""
+    chunk_rows = columnar_settings()["CHUNK_ROWS"]
+    rows = (queryset.order_by("id").values_list(*(c.lookup for c in dataset.columns))
+            .iterator(chunk_size=chunk_rows))
+    return write(rows, dataset, fmt, out, compression, chunk_rows)
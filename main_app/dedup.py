@@ -0,0 +1,237 @@
+import logging
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import django
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Beneficiary, DuplicateCandidate, DuplicateScan
+
+logger = logging.getLogger(__name__)
+
+DEDUP_DEFAULTS = {
+    "THRESHOLD": 0.7,
+    # Blocks larger than this are skipped (and logged) rather than compared
+    # pairwise; they usually mean a blocking key is too coarse.
+    "MAX_BLOCK_SIZE": 500,
+    "BLOCKS_PER_TASK": 200,
+    # None uses one process per CPU; 0 scores in the calling process.
+    "WORKERS": None,
+    "CROSS_CHARITY_ONLY": True,
+}
+
+WEIGHTS = {"name": 0.5, "date_of_birth": 0.2, "phone": 0.15, "location": 0.1, "national_id": 0.05}
+
+ARABIC_FOLD = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ة": "ه", "ى": "ي", "ؤ": "و", "ئ": "ي"})
+# Letters that carry little sound information for the phonetic key
+SILENT = set("aeiouyhw") | set("اوي")
+SOUND_GROUPS = {c: str(g) for g, letters in enumerate(["bfpv", "cgjkqsxz", "dt", "l", "mn", "r"], 1) for c in letters}
+re_non_letter = re.compile(r"[^\w\s]|\d|_")
+
+Record = namedtuple("Record", "id charity_id name first_key last_key dob region city phone national_id keys changed")
+
+
+def dedup_settings():
+    return {**DEDUP_DEFAULTS, **getattr(settings, "DUPLICATE_DETECTION", {})}
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    # Drops Latin accents and Arabic diacritics alike
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re_non_letter.sub(" ", text.lower().translate(ARABIC_FOLD))
+    return " ".join(text.split())
+
+
+def phonetic(token):
+    """Soundex-style key: first letter, then consonant classes with silent letters and repeats dropped."""
+    if not token:
+        return ""
+    out, last = [token[0]], SOUND_GROUPS.get(token[0], token[0])
+    for ch in token[1:]:
+        if ch in SILENT:
+            last = None
+            continue
+        code = SOUND_GROUPS.get(ch, ch)
+        if code != last:
+            out.append(code)
+        last = code
+    return "".join(out)[:4]
+
+
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def strip_article(name):
+    for article in ("al", "el", "ال"):
+        if name.startswith(article) and len(name) > len(article) + 2:
+            return name[len(article):]
+    return name
+
+
+def digits(value):
+    return "".join(c for c in value or "" if c.isdigit())
+
+
+def blocking_keys(first_key, last_key, dob, region, phone):
+    # Each key only needs to catch the pairs the others miss: typos in the
+    # name still share date of birth and region, a wrong date of birth
+    # still shares the name sound, and either still shares the phone.
+    keys = [("dob", dob, region), ("name", first_key, last_key)]
+    if len(phone) >= 7:
+        keys.append(("phone", phone[-7:]))
+    return tuple(keys)
+
+
+def make_record(row, changed):
+    id, charity_id, first_name, last_name, dob, region, city, phone, national_id = row
+    first, last = normalize(first_name), normalize(last_name)
+    first_key = phonetic(first.split()[0]) if first else ""
+    last_key = phonetic(strip_article("".join(last.split())))
+    dob = dob.isoformat() if dob else ""
+    region, phone = normalize(region), digits(phone)
+    return Record(
+        # Spaces are dropped so "Al Harbi" and "Alharbi" share trigrams
+        id=id, charity_id=charity_id, name="".join(f"{first} {last}".split()),
+        first_key=first_key, last_key=last_key, dob=dob, region=region, city=normalize(city),
+        phone=phone, national_id=digits(national_id) or national_id,
+        keys=blocking_keys(first_key, last_key, dob, region, phone), changed=changed,
+    )
+
+
+def _near(a, b):
+    """True for one substituted digit or one adjacent transposition."""
+    if len(a) != len(b):
+        return False
+    diff = [i for i in range(len(a)) if a[i] != b[i]]
+    return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1
+                              and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+
+
+def _dob_score(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    (ya, ma, da), (yb, mb, db) = a.split("-"), b.split("-")
+    # Same year with day and month swapped, or a one-digit slip
+    return 0.5 if ya == yb and ((ma, da) == (db, mb) or _near(a, b)) else 0.0
+
+
+def score_pair(a, b, grams):
+    ga, gb = grams[a.id], grams[b.id]
+    name = len(ga & gb) / len(ga | gb) if ga and gb else 0.0
+    if a.first_key and (a.first_key, a.last_key) == (b.first_key, b.last_key):
+        # Transliteration variants (Mohammed / Muhammad) share few trigrams
+        # but sound the same.
+        name = max(name, 0.8)
+    reasons = {
+        "name": round(name, 3),
+        "date_of_birth": _dob_score(a.dob, b.dob),
+        "phone": 1.0 if a.phone and a.phone[-9:] == b.phone[-9:] else 0.0,
+        "location": 1.0 if a.region == b.region and a.city == b.city else 0.5 if a.region == b.region else 0.0,
+        "national_id": 1.0 if a.national_id == b.national_id else 0.5 if _near(a.national_id, b.national_id) else 0.0,
+    }
+    return round(sum(WEIGHTS[k] * v for k, v in reasons.items()), 4), reasons
+
+
+def score_blocks(blocks, threshold, cross_charity_only, scored_keys):
+    """
+    Score every pair within each (key, records) block and return
+    (candidates, compared). Runs in worker processes, so it only touches
+    the records it is given; `scored_keys` are the keys of every block
+    being scored in this run, across all tasks.
+    """
+    candidates, compared = [], 0
+    for key, records in blocks:
+        grams = {r.id: trigrams(r.name) for r in records}
+        for a, b in combinations(sorted(records, key=lambda r: r.id), 2):
+            if not (a.changed or b.changed):
+                continue
+            if cross_charity_only and a.charity_id == b.charity_id:
+                continue
+            # A pair sharing several keys is scored only in the first one
+            # that is scored at all, so an oversized block does not hide it.
+            if next(k for k in a.keys if k in b.keys and k in scored_keys) != key:
+                continue
+            compared += 1
+            score, reasons = score_pair(a, b, grams)
+            if score >= threshold:
+                candidates.append((a.id, b.id, score, reasons))
+    return candidates, compared
+
+
+def _tasks(blocks, size):
+    for i in range(0, len(blocks), size):
+        yield blocks[i:i + size]
+
+
+def detect(full=False, workers=None, threshold=None):
+    """
+    Find likely duplicate beneficiaries and upsert them into
+    DuplicateCandidate, keeping any review status already recorded.
+
+    Incremental runs (the default once a scan exists) only compare pairs
+    involving a beneficiary updated since the previous scan started.
+    """
+    config = dedup_settings()
+    threshold = config["THRESHOLD"] if threshold is None else threshold
+    workers = config["WORKERS"] if workers is None else workers
+    started = timezone.now()
+    previous = None if full else DuplicateScan.objects.order_by("-started_at").first()
+    since = previous.started_at if previous else None
+
+    blocks = defaultdict(list)
+    records = changed = 0
+    rows = Beneficiary.objects.values_list(
+        "id", "charity_id", "user__first_name", "user__last_name", "date_of_birth", "region", "city",
+        "phone", "national_id", "updated_at",
+    ).iterator(chunk_size=5000)
+    for *row, updated_at in rows:
+        record = make_record(row, since is None or updated_at >= since)
+        records += 1
+        changed += record.changed
+        for key in record.keys:
+            blocks[key].append(record)
+
+    work, skipped = [], 0
+    for key, members in blocks.items():
+        if len(members) < 2 or not any(r.changed for r in members):
+            continue
+        if config["CROSS_CHARITY_ONLY"] and len({r.charity_id for r in members}) < 2:
+            continue
+        if len(members) > config["MAX_BLOCK_SIZE"]:
+            skipped += 1
+            logger.warning("Skipping duplicate-detection block %s with %d beneficiaries", key, len(members))
+            continue
+        work.append((key, members))
+
+    args = (threshold, config["CROSS_CHARITY_ONLY"], frozenset(key for key, _ in work))
+    tasks = list(_tasks(work, config["BLOCKS_PER_TASK"]))
+    if workers == 0 or len(tasks) < 2:
+        results = [score_blocks(task, *args) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            results = list(pool.map(score_blocks, tasks, *[[a] * len(tasks) for a in args]))
+
+    pairs, compared = {}, 0
+    for found, n in results:
+        compared += n
+        for a, b, score, reasons in found:
+            pairs[(a, b)] = (score, reasons)
+
+    DuplicateCandidate.objects.bulk_create(
+        [DuplicateCandidate(beneficiary_a_id=a, beneficiary_b_id=b, score=score, reasons=reasons)
+         for (a, b), (score, reasons) in pairs.items()],
+        update_conflicts=True, unique_fields=["beneficiary_a", "beneficiary_b"],
+        update_fields=["score", "reasons", "updated_at"], batch_size=500,
+    )
+    DuplicateScan.objects.create(started_at=started, full=since is None, compared=compared, candidates=len(pairs))
+    return {"records": records, "changed": changed, "blocks": len(work), "skipped_blocks": skipped,
+            "compared": compared, "candidates": len(pairs)}
@@ -0,0 +1,185 @@
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Charity
+
+DISTRIBUTION_DEFAULTS = {
+    "CHUNK_ROWS": 50000,
+    "MAX_BINS": 200,
+    "MAX_GROUPS": 500,
+    "QUANTILES": (0.1, 0.25, 0.5, 0.75, 0.9),
+}
+
+# Default bin edges; values below the first edge or at/after the last are
+# reported as "below" / "above" rather than dropped silently.
+DEFAULT_EDGES = {
+    "monthly_income": [0, 1000, 2000, 3000, 4000, 5000, 7500, 10000, 15000, 20000],
+    "family_size": list(range(1, 14)),
+    "age": [0, 5, 12, 18, 25, 35, 45, 55, 65, 75, 120],
+}
+METRICS = tuple(DEFAULT_EDGES)
+GROUP_FIELDS = {"region": "region", "city": "city", "charity": "charity_id"}
+COLUMNS = {"monthly_income": "monthly_income", "family_size": "family_size", "age": "date_of_birth"}
+
+
+class DistributionError(ValueError):
+    pass
+
+
+def distribution_settings():
+    return {**DISTRIBUTION_DEFAULTS, **getattr(settings, "DISTRIBUTIONS", {})}
+
+
+def parse_edges(value, max_bins):
+    try:
+        edges = [float(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise DistributionError(f"Invalid bin edges: {value!r}")
+    if len(edges) < 2 or len(edges) > max_bins + 1:
+        raise DistributionError(f"Bin edges need between 2 and {max_bins + 1} values")
+    if any(b <= a for a, b in zip(edges, edges[1:])):
+        raise DistributionError("Bin edges must be strictly increasing")
+    return edges
+
+
+def parse_quantiles(value):
+    try:
+        qs = [float(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise DistributionError(f"Invalid quantiles: {value!r}")
+    if not qs or any(not 0 <= q <= 1 for q in qs):
+        raise DistributionError("Quantiles must be between 0 and 1")
+    return qs
+
+
+def load_columns(queryset, metrics, group_field=None, chunk_rows=None):
+    """
+    Stream the needed columns in chunks into NumPy arrays. Returns
+    ({metric: float array}, group codes or None, group values by code).
+    """
+    chunk_rows = chunk_rows or distribution_settings()["CHUNK_ROWS"]
+    fields = [COLUMNS[m] for m in metrics] + ([group_field] if group_field else [])
+    rows = queryset.order_by().values_list(*fields).iterator(chunk_size=chunk_rows)
+    today = np.datetime64(timezone.now().date(), "D")
+    parts = {m: [] for m in metrics}
+    code_parts, codes = [], {}
+
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            break
+        columns = list(zip(*chunk))
+        for metric, column in zip(metrics, columns):
+            if metric == "age":
+                days = (today - np.array(column, dtype="datetime64[D]")).astype(np.float64)
+                parts[metric].append(np.floor(days / 365.2425))
+            else:
+                parts[metric].append(np.array(column, dtype=np.float64))
+        if group_field:
+            code_parts.append(np.fromiter((codes.setdefault(v, len(codes)) for v in columns[-1]),
+                                          dtype=np.int64, count=len(chunk)))
+
+    arrays = {m: np.concatenate(p) if p else np.empty(0) for m, p in parts.items()}
+    group_codes = (np.concatenate(code_parts) if code_parts else np.empty(0, dtype=np.int64)) if group_field else None
+    keys = [None] * len(codes)
+    for value, code in codes.items():
+        keys[code] = value
+    return arrays, group_codes, keys
+
+
+def _round(values, digits=2):
+    return np.round(values, digits).tolist()
+
+
+def histogram(values, edges):
+    edges = np.asarray(edges, dtype=np.float64)
+    counts, _ = np.histogram(values[(values >= edges[0]) & (values < edges[-1])], bins=edges)
+    return {
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+        "below": int(np.count_nonzero(values < edges[0])),
+        "above": int(np.count_nonzero(values >= edges[-1])),
+    }
+
+
+def summary(values, quantiles, edges):
+    if not values.size:
+        return {"count": 0, **histogram(values, edges)}
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "std": round(float(values.std()), 2),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "quantiles": dict(zip(map(str, quantiles), _round(np.quantile(values, quantiles)))),
+        **histogram(values, edges),
+    }
+
+
+def grouped_quantiles(codes, values, group_count, quantiles):
+    """Per-group linear-interpolated quantiles from one sort, as a (quantile, group) array."""
+    order = np.lexsort((values, codes))
+    ordered = values[order]
+    counts = np.bincount(codes, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = starts + np.outer(quantiles, np.maximum(counts - 1, 0))
+    lo = np.floor(positions).astype(np.int64)
+    hi = np.minimum(lo + 1, starts + np.maximum(counts - 1, 0))
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (positions - lo)
+
+
+def grouped_summary(codes, values, group_count, quantiles, edges):
+    counts = np.bincount(codes, minlength=group_count)
+    safe = np.maximum(counts, 1)
+    means = np.bincount(codes, weights=values, minlength=group_count) / safe
+    edges_array = np.asarray(edges, dtype=np.float64)
+    inside = (values >= edges_array[0]) & (values < edges_array[-1])
+    bins = len(edges) - 1
+    bin_index = np.searchsorted(edges_array, values[inside], side="right") - 1
+    binned = np.bincount(codes[inside] * bins + bin_index, minlength=group_count * bins).reshape(group_count, bins)
+    by_quantile = grouped_quantiles(codes, values, group_count, quantiles) if values.size else np.empty((0, 0))
+    return {
+        "mean": _round(means),
+        "quantiles": {str(q): _round(row) for q, row in zip(quantiles, by_quantile)},
+        "counts": binned.tolist(),
+    }
+
+
+def _labels(group_by, keys):
+    if group_by != "charity":
+        return keys
+    names = dict(Charity.objects.filter(id__in=keys).values_list("id", "name"))
+    return [names.get(k) for k in keys]
+
+
+def distributions(queryset, metrics=METRICS, group_by=None, edges=None, quantiles=None, chunk_rows=None):
+    """
+    Histograms, quantiles and summary statistics for beneficiary metrics,
+    optionally broken down by region, city or charity. Group output is
+    columnar: one list per statistic, aligned with "keys".
+    """
+    config = distribution_settings()
+    edges = {**DEFAULT_EDGES, **(edges or {})}
+    quantiles = list(quantiles or config["QUANTILES"])
+    group_field = GROUP_FIELDS[group_by] if group_by else None
+    arrays, codes, keys = load_columns(queryset, metrics, group_field, chunk_rows)
+    if len(keys) > config["MAX_GROUPS"]:
+        raise DistributionError(f"More than {config['MAX_GROUPS']} groups; add filters or group more coarsely")
+
+    result = {
+        "count": int(next(iter(arrays.values())).size) if arrays else 0,
+        "metrics": {m: summary(arrays[m], quantiles, edges[m]) for m in metrics},
+    }
+    if group_field:
+        group_count = len(keys)
+        result["groups"] = {
+            "by": group_by,
+            "keys": keys,
+            "labels": _labels(group_by, keys),
+            "count": np.bincount(codes, minlength=group_count).tolist(),
+            **{m: grouped_summary(codes, arrays[m], group_count, quantiles, edges[m]) for m in metrics},
+        }
+    return result
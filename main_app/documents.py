@@ -0,0 +1,154 @@
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import quote_etag
+
+from .models import StoredDocument
+
+DOCUMENT_FIELDS = ("license_certificate", "admin_id_document")
+
+SERVE_DEFAULTS = {
+    # e.g. {"HEADER": "X-Accel-Redirect", "PREFIX": "/protected-media/"} for
+    # nginx, or {"HEADER": "X-Sendfile", "PREFIX": None} to send the
+    # absolute path (Apache mod_xsendfile).
+    "ACCEL_REDIRECT": None,
+    "BLOCK_BYTES": 64 * 1024,
+    "MAX_AGE_SECONDS": 300,
+}
+
+re_range = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def serve_settings():
+    return {**SERVE_DEFAULTS, **getattr(settings, "DOCUMENT_SERVING", {})}
+
+
+def document_metadata(field_file, stat):
+    """Return (etag, content_type) for a stored file."""
+    stored = StoredDocument.objects.filter(file=field_file.name).only("sha256", "content_type").first()
+    if stored is not None:
+        # Content-addressed files already carry a strong validator.
+        return quote_etag(stored.sha256), stored.content_type
+    content_type = mimetypes.guess_type(field_file.name)[0] or "application/octet-stream"
+    return quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}"), content_type
+
+
+def _etag_matches(header, etag):
+    # If-None-Match uses weak comparison
+    if header.strip() == "*":
+        return True
+    strip = (lambda t: t[2:] if t.startswith("W/") else t)
+    return strip(etag) in [strip(t.strip()) for t in header.split(",")]
+
+
+def _not_modified_since(header, mtime):
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single satisfiable byte range, None when the
+    header is absent or should be ignored, or "unsatisfiable".
+    """
+    if not header:
+        return None
+    match = re_range.match(header.strip())
+    if not match:
+        # Multiple ranges or other units: serving the whole file is allowed.
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return "unsatisfiable"
+    return start, end
+
+
+def _file_iterator(path, start, length, block):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            data = fh.read(min(block, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_document(request, field_file, download_stem):
+    """
+    Serve a stored document with Range and conditional request support.
+
+    When DOCUMENT_SERVING["ACCEL_REDIRECT"] is configured the body is left
+    to the front proxy; otherwise the file is streamed in BLOCK_BYTES pieces.
+    """
+    config = serve_settings()
+    path = field_file.path
+    stat = os.stat(path)
+    size = stat.st_size
+    etag, content_type = document_metadata(field_file, stat)
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    download_name = download_stem + (mimetypes.guess_extension(content_type) or "")
+
+    def base_headers(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = last_modified
+        response["Accept-Ranges"] = "bytes"
+        response["Cache-Control"] = f"private, max-age={config['MAX_AGE_SECONDS']}"
+        response["Content-Disposition"] = f'inline; filename="{download_name}"'
+        return response
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        not_modified = _not_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime)
+    if not_modified:
+        return base_headers(HttpResponse(status=304))
+
+    accel = config["ACCEL_REDIRECT"]
+    if accel:
+        response = base_headers(HttpResponse(content_type=content_type))
+        if accel.get("PREFIX") is None:
+            response[accel["HEADER"]] = path
+        else:
+            response[accel["HEADER"]] = accel["PREFIX"].rstrip("/") + "/" + field_file.name
+        return response
+
+    byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if byte_range and if_range and if_range != etag and if_range != last_modified:
+        # The client's partial copy is stale; send the whole current file.
+        byte_range = None
+
+    if byte_range == "unsatisfiable":
+        response = base_headers(HttpResponse(status=416))
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(
+        _file_iterator(path, start, length, config["BLOCK_BYTES"]),
+        status=206 if byte_range else 200, content_type=content_type)
+    base_headers(response)
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
@@ -0,0 +1,185 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Charity, Program, ProgramApplication
+
+EXPORT_DEFAULTS = {
+    # None uses one process per CPU; 0 exports every shard in the calling process.
+    "WORKERS": None,
+    # Bundles requested over HTTP run in the web worker; 0 keeps them there
+    # rather than spawning a process pool per request.
+    "REQUEST_WORKERS": 0,
+    "CHUNK_ROWS": 5000,
+}
+
+SHARD_FIELDS = {"program": "program_id", "charity": "beneficiary__charity_id"}
+HEADER = ["Application ID", "Program Name", "Program Status", "Beneficiary Name", "Charity Name",
+          "Application Status", "Submitted Date", "Reviewed Date", "Review Notes"]
+FIELDS = ("id", "program__name", "program__status", "beneficiary__user__first_name", "beneficiary__user__last_name",
+          "beneficiary__charity__name", "status", "submitted_at", "reviewed_at", "review_notes")
+
+
+def export_settings():
+    return {**EXPORT_DEFAULTS, **getattr(settings, "EXPORT_BUNDLE", {})}
+
+
+def applications(filters):
+    apps = ProgramApplication.objects.filter(program__ministry_owner__icontains=filters["ministry"])
+    if filters.get("max_id") is not None:
+        apps = apps.filter(id__lte=filters["max_id"])
+    if filters.get("program_id"):
+        apps = apps.filter(program_id=filters["program_id"])
+    if filters.get("status"):
+        apps = apps.filter(status=filters["status"])
+    if filters.get("date_from"):
+        apps = apps.filter(submitted_at__date__gte=filters["date_from"])
+    if filters.get("date_to"):
+        apps = apps.filter(submitted_at__date__lte=filters["date_to"])
+    return apps
+
+
+@contextmanager
+def snapshot(snapshot_id):
+    """Read inside the transaction snapshot exported by the coordinating process (PostgreSQL)."""
+    if snapshot_id is None:
+        yield
+        return
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", [snapshot_id])
+        yield
+
+
+class HashingWriter(io.RawIOBase):
+    """Counts and hashes the bytes written through it to `raw`."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+
+def _timestamp(value):
+    return timezone.localtime(value).strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+def export_shard(shard_by, key, filters, directory, snapshot_id=None):
+    """Stream one shard's applications to a gzipped CSV; runs in a pool worker."""
+    name = f"applications/{shard_by}-{key}.csv.gz"
+    path = os.path.join(directory, name.replace("/", "-"))
+    rows = 0
+    with snapshot(snapshot_id), open(path, "wb") as raw:
+        hashed = HashingWriter(raw)
+        with gzip.GzipFile(fileobj=hashed, mode="wb", compresslevel=6, mtime=0) as compressed, \
+                io.TextIOWrapper(compressed, encoding="utf-8", newline="") as text:
+            writer = csv.writer(text)
+            writer.writerow(HEADER)
+            shard = applications(filters).filter(**{SHARD_FIELDS[shard_by]: key}).order_by("id")
+            for id, program, program_status, first, last, charity, app_status, submitted, reviewed, notes in \
+                    shard.values_list(*FIELDS).iterator(chunk_size=export_settings()["CHUNK_ROWS"]):
+                writer.writerow([id, program, program_status, f"{first or ''} {last or ''}".strip(), charity or "",
+                                 app_status, _timestamp(submitted), _timestamp(reviewed), (notes or "")[:100]])
+                rows += 1
+    return {"name": name, "path": path, "shard": key, "rows": rows, "bytes": hashed.size,
+            "sha256": hashed.sha256.hexdigest()}
+
+
+def _pool_export_shard(args):
+    try:
+        return export_shard(*args)
+    finally:
+        connection.close()
+
+
+def shard_labels(shard_by, filters):
+    apps = applications(filters).order_by()
+    if shard_by == "program":
+        return dict(Program.objects.filter(id__in=apps.values("program_id")).order_by("id").values_list("id", "name"))
+    return dict(Charity.objects.filter(id__in=apps.values("beneficiary__charity_id")).order_by("id")
+                .values_list("id", "name"))
+
+
+def export_bundle(out, ministry, shard_by="program", program_id=None, status=None, date_from=None, date_to=None,
+                  workers=None):
+    """
+    Write a ZIP of gzipped CSV shards, one per program or charity, plus a
+    manifest.json with row counts and SHA-256 checksums, to the binary file
+    `out`. Shards are exported in parallel worker processes.
+
+    On PostgreSQL every worker reads the snapshot exported by this process,
+    so the bundle is consistent as of one instant. Elsewhere shards are
+    bounded by the highest application id seen at the start, which keeps
+    later submissions out but not later edits.
+    """
+    config = export_settings()
+    workers = config["WORKERS"] if workers is None else workers
+    if shard_by not in SHARD_FIELDS:
+        raise ValueError(f"shard_by must be one of {', '.join(SHARD_FIELDS)}")
+    filters = {"ministry": ministry, "program_id": program_id, "status": status,
+               "date_from": date_from, "date_to": date_to}
+    postgres = connection.vendor == "postgresql"
+
+    with transaction.atomic() if postgres else nullcontext():
+        snapshot_id = None
+        if postgres:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("SELECT pg_export_snapshot()")
+                snapshot_id = cursor.fetchone()[0]
+        filters["max_id"] = applications(filters).aggregate(top=Max("id"))["top"] or 0
+        labels = shard_labels(shard_by, filters)
+
+        with tempfile.TemporaryDirectory() as directory:
+            if workers == 0 or len(labels) < 2:
+                # Already inside this transaction's snapshot
+                results = [export_shard(shard_by, key, filters, directory) for key in labels]
+            else:
+                # spawn, not fork: children must not share this process's database connection
+                with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                         initializer=django.setup) as pool:
+                    results = list(pool.map(_pool_export_shard,
+                                            [(shard_by, key, filters, directory, snapshot_id) for key in labels]))
+
+            manifest = {
+                "ministry": ministry,
+                "generated_at": timezone.now(),
+                "shard_by": shard_by,
+                "filters": {k: v for k, v in filters.items() if k not in ("ministry", "max_id") and v},
+                "consistency": "snapshot" if postgres else "max_application_id",
+                "max_application_id": filters["max_id"],
+                "total_rows": sum(r["rows"] for r in results),
+                "files": [{"name": r["name"], "shard": r["shard"], "label": labels[r["shard"]], "rows": r["rows"],
+                           "bytes": r["bytes"], "sha256": r["sha256"]} for r in results],
+            }
+            # Shards are already compressed, so they are stored as-is
+            with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as bundle:
+                for r in results:
+                    bundle.write(r["path"], r["name"])
+                bundle.writestr("manifest.json", json.dumps(manifest, cls=DjangoJSONEncoder, indent=2),
+                                compress_type=zipfile.ZIP_DEFLATED)
+    return manifest
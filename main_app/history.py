@@ -0,0 +1,74 @@
+from django.db import connections
+from django.db.models import Count, F, Q
+from django.db.models.functions import RowNumber
+from django.db.models.expressions import Window
+
+from .models import ApplicationStatusChange, Program
+
+PERCENTILES = (("median", 0.5), ("p90", 0.9), ("p99", 0.99))
+DEFAULT_DAYS = 90
+DECISIONS = ("APPROVED", "REJECTED")
+
+
+def record_transition(application, previous, created):
+    """Write the history row for a create or status change of `application`."""
+    now = application.updated_at
+    seconds = None
+    if not created:
+        entered = (ApplicationStatusChange.objects.filter(application=application)
+                   .order_by("-changed_at", "-id").values_list("changed_at", flat=True).first()
+                   or application.submitted_at)
+        seconds = max(0.0, (now - entered).total_seconds())
+    changed_by = getattr(application, "_changed_by", None)
+    ApplicationStatusChange.objects.create(
+        application=application, program_id=application.program_id, from_status="" if created else previous or "",
+        to_status=application.status, changed_at=now, changed_by=changed_by, seconds_in_status=seconds)
+
+
+def _days(seconds):
+    return round(seconds / 86400, 2) if seconds is not None else None
+
+
+def stage_percentiles(changes):
+    """
+    Count, mean, median, p90 and p99 of the time applications spent in each
+    status, per program, computed in one query. Rows are ranked within each
+    (program, stage) by a window function and each percentile is the
+    smallest value whose rank reaches it (nearest-rank), so the database
+    returns one row per program and stage rather than every transition.
+    """
+    partition = [F("program_id"), F("from_status")]
+    ranked = (changes.filter(seconds_in_status__isnull=False).exclude(from_status="").order_by()
+              .annotate(row_pos=Window(RowNumber(), partition_by=partition, order_by=F("seconds_in_status").asc()),
+                        row_total=Window(Count("id"), partition_by=partition))
+              .values("program_id", "from_status", "seconds_in_status", "row_pos", "row_total"))
+    inner, params = ranked.query.sql_with_params()
+    columns = ", ".join(f"MIN(CASE WHEN row_pos >= {q} * row_total THEN seconds_in_status END)"
+                        for _, q in PERCENTILES)
+    sql = (f"SELECT program_id, from_status, COUNT(*), AVG(seconds_in_status), {columns} "
+           f"FROM ({inner}) ranked GROUP BY program_id, from_status ORDER BY program_id, from_status")
+    with connections[changes.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    names = dict(Program.objects.filter(id__in={r[0] for r in rows}).values_list("id", "name"))
+    return [
+        {"program_id": program_id, "program": names.get(program_id), "stage": stage, "count": count,
+         "mean_days": _days(mean), **{f"{name}_days": _days(v) for (name, _), v in zip(PERCENTILES, values)}}
+        for program_id, stage, count, mean, *values in rows
+    ]
+
+
+def reviewer_throughput(changes, days=None):
+    """Decisions per reviewer, with a daily rate when the window length is known."""
+    rows = (changes.filter(to_status__in=DECISIONS, changed_by__isnull=False).order_by()
+            .values("changed_by_id", "changed_by__username")
+            .annotate(decisions=Count("id"), approved=Count("id", filter=Q(to_status="APPROVED")),
+                      rejected=Count("id", filter=Q(to_status="REJECTED")))
+            .order_by("-decisions"))
+    return [
+        {"reviewer_id": r["changed_by_id"], "reviewer": r["changed_by__username"], "decisions": r["decisions"],
+         "approved": r["approved"], "rejected": r["rejected"],
+         "per_day": round(r["decisions"] / days, 2) if days else None}
+        for r in rows
+    ]
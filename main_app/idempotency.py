@@ -0,0 +1,129 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+IDEMPOTENCY_DEFAULTS = {
+    "TTL_SECONDS": 24 * 60 * 60,
+    # A retry that arrives while the first request is running waits this
+    # long for its response before getting a 409.
+    "WAIT_SECONDS": 10,
+    # An unfinished record older than this belongs to a request that died;
+    # the next retry takes it over.
+    "LOCK_SECONDS": 60,
+}
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def idempotency_settings():
+    return {**IDEMPOTENCY_DEFAULTS, **getattr(settings, "IDEMPOTENCY", {})}
+
+
+def _plain(value):
+    if isinstance(value, UploadedFile):
+        return [value.name, value.size]
+    return value
+
+
+def fingerprint(request):
+    data = request.data
+    if hasattr(data, "getlist"):
+        data = {k: [_plain(v) for v in data.getlist(k)] for k in data}
+    body = json.dumps([request.method, request.path, data], sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def begin(user, key, digest, config):
+    """
+    Claim `key` for this request and return None, or return the finished
+    record to replay. A duplicate of a request still in progress waits
+    for it, so concurrent retries run the view once.
+    """
+    deadline = time.monotonic() + config["WAIT_SECONDS"]
+    while True:
+        now = timezone.now()
+        record = IdempotencyRecord.objects.filter(user=user, key=key).first()
+        if record is None:
+            try:
+                with transaction.atomic():
+                    IdempotencyRecord.objects.create(user=user, key=key, fingerprint=digest,
+                                                     expires_at=now + timedelta(seconds=config["TTL_SECONDS"]))
+                return None
+            except IntegrityError:
+                # A concurrent duplicate inserted first
+                continue
+        stale = record.status_code is None and record.created_at < now - timedelta(seconds=config["LOCK_SECONDS"])
+        if record.expires_at < now or stale:
+            IdempotencyRecord.objects.filter(id=record.id, created_at=record.created_at).delete()
+            continue
+        if record.fingerprint != digest:
+            raise IdempotencyError(f"{HEADER} was already used for a different request",
+                                   status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record.status_code is not None:
+            return record
+        if time.monotonic() >= deadline:
+            raise IdempotencyError(f"A request with this {HEADER} is still in progress", status.HTTP_409_CONFLICT)
+        time.sleep(0.05)
+
+
+def finish(user, key, response):
+    records = IdempotencyRecord.objects.filter(user=user, key=key, status_code__isnull=True)
+    if response.status_code >= 500 or not hasattr(response, "data"):
+        # Let the client retry a failure instead of replaying it
+        records.delete()
+    else:
+        records.update(status_code=response.status_code,
+                       response=json.loads(json.dumps(response.data, cls=DjangoJSONEncoder)))
+
+
+def idempotent(method):
+    """
+    Make a POST handler replay its first response when the client retries
+    with the same Idempotency-Key, instead of running again.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            record = begin(request.user, key, fingerprint(request), idempotency_settings())
+        except IdempotencyError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        if record is not None:
+            return Response(record.response, status=record.status_code, headers={REPLAYED_HEADER: "true"})
+        try:
+            response = method(view, request, *args, **kwargs)
+        except BaseException:
+            IdempotencyRecord.objects.filter(user=request.user, key=key, status_code__isnull=True).delete()
+            raise
+        finish(request.user, key, response)
+        return response
+    return wrapper
+
+
+def purge_expired():
+    return IdempotencyRecord.objects.filter(expires_at__lt=timezone.now()).delete()[0]
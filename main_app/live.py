@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from itertools import takewhile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import EventRegistration, OutboxEvent, ProgramApplication
+
+logger = logging.getLogger(__name__)
+
+LIVE_DEFAULTS = {
+    # LocalBroker fans out within one process; OutboxBroker also reaches
+    # dashboards connected to other workers by polling the outbox table.
+    "BROKER": "main_app.live.LocalBroker",
+    "HEARTBEAT_SECONDS": 15,
+    "POLL_INTERVAL_SECONDS": 1,
+    # OutboxBroker holds back events younger than this, so one that commits
+    # late behind a higher id is not skipped by the poller's id cursor.
+    "SAFETY_LAG_SECONDS": 2,
+    "QUEUE_SIZE": 100,
+    "RETRY_MS": 5000,
+}
+
+EVENT_TYPES = (
+    "application.submitted",
+    "application.status_changed",
+    "registration.created",
+    "registration.attendance_changed",
+)
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def live_settings():
+    return {**LIVE_DEFAULTS, **getattr(settings, "LIVE_UPDATES", {})}
+
+
+def get_broker():
+    path = live_settings()["BROKER"]
+    with _brokers_lock:
+        if path not in _brokers:
+            _brokers[path] = import_string(path)()
+        return _brokers[path]
+
+
+def announce(event):
+    """Hand an outbox event to the broker once the transaction that wrote it commits."""
+    if event.event_type in EVENT_TYPES:
+        transaction.on_commit(lambda: get_broker().publish([event]))
+
+
+def route(events):
+    """
+    Turn outbox events into dashboard messages tagged with the ministry and
+    charity that should see them, in at most one query per kind.
+    """
+    application_ids = [e.payload["application_id"] for e in events if e.event_type.startswith("application.")]
+    registration_ids = [e.payload["registration_id"] for e in events if e.event_type.startswith("registration.")]
+    applications = {
+        id: (ministry, charity_id) for id, ministry, charity_id in ProgramApplication.objects.filter(
+            id__in=application_ids).values_list("id", "program__ministry_owner", "beneficiary__charity_id")
+    } if application_ids else {}
+    registrations = dict(EventRegistration.objects.filter(id__in=registration_ids)
+                         .values_list("id", "event__charity_id")) if registration_ids else {}
+
+    messages = []
+    for event in events:
+        if event.event_type.startswith("application."):
+            ministry, charity_id = applications.get(event.payload["application_id"], (None, None))
+        else:
+            ministry, charity_id = None, registrations.get(event.payload["registration_id"])
+        if ministry is None and charity_id is None:
+            continue
+        messages.append({"id": event.id, "type": event.event_type, "ministry": ministry,
+                         "charity_id": charity_id, "data": event.payload})
+    return messages
+
+
+def subscriber_filter(user):
+    """Which messages a dashboard user receives, or None if they have no dashboard."""
+    if user.is_superuser:
+        name = (user.first_name or "").lower()
+        # Mirrors the ministry_owner__icontains scoping of the statistics views
+        return (lambda m: bool(m["ministry"]) and name in m["ministry"].lower()) if name else None
+    charity = getattr(user, "charity_admin", None)
+    if charity is not None:
+        return lambda m: m["charity_id"] == charity.id
+    return None
+
+
+class Subscription:
+    def __init__(self, match, size):
+        self.match = match
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+    def offer(self, message):
+        # Called from whichever thread published; the queue belongs to the loop.
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class LocalBroker:
+    """Fans messages out to the dashboards connected to this process."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, match):
+        subscription = Subscription(match, live_settings()["QUEUE_SIZE"])
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def fanout(self, messages):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for message in messages:
+            for subscription in subscribers:
+                if subscription.match(message):
+                    subscription.offer(message)
+
+    def publish(self, events):
+        # Nobody listening here means nothing to route.
+        if self.subscribers:
+            self.fanout(route(events))
+
+
+class OutboxBroker(LocalBroker):
+    """
+    Cross-worker fan-out. Each process polls the outbox for new dashboard
+    events while it has subscribers, one query per interval however many
+    dashboards are connected, and fans them out locally.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.poller = None
+
+    def subscribe(self, match):
+        subscription = super().subscribe(match)
+        with self.lock:
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.poll, daemon=True, name="live-outbox-poller")
+                self.poller.start()
+        return subscription
+
+    def listening(self):
+        with self.lock:
+            if not self.subscribers:
+                self.poller = None
+            return bool(self.subscribers)
+
+    def publish(self, events):
+        # The poller picks these up from the outbox, in this process and others.
+        pass
+
+    def pending(self, last):
+        """Dashboard events after id `last` that are old enough to deliver, oldest first."""
+        horizon = timezone.now() - timedelta(seconds=live_settings()["SAFETY_LAG_SECONDS"])
+        events = OutboxEvent.objects.filter(id__gt=last, event_type__in=EVENT_TYPES).order_by("id")[:500]
+        # Stop at the first young event: a lower id may still be uncommitted.
+        return list(takewhile(lambda e: e.created_at <= horizon, events))
+
+    def poll(self):
+        interval = live_settings()["POLL_INTERVAL_SECONDS"]
+        try:
+            last = OutboxEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+            while self.listening():
+                events = self.pending(last)
+                if events:
+                    last = events[-1].id
+                    self.fanout(route(events))
+                else:
+                    time.sleep(interval)
+        except Exception:
+            logger.exception("Live update poller stopped")
+            with self.lock:
+                self.poller = None
+        finally:
+            connection.close()
+
+
+def sse(event=None, data=None, id=None):
+    lines = []
+    if id is not None:
+        lines.append(f"id: {id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, cls=DjangoJSONEncoder))
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(broker, match):
+    config = live_settings()
+    subscription = broker.subscribe(match)
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n" + sse("ready", {})
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), config["HEARTBEAT_SECONDS"])
+            except asyncio.TimeoutError:
+                # Comments keep proxies from closing an idle connection.
+                yield ": keepalive\n\n"
+                continue
+            if subscription.overflowed:
+                # Too slow to keep up: tell the client to refetch the full statistics once.
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.overflowed = False
+                yield sse("resync", {})
+                continue
+            yield sse(message["type"], message["data"], id=message["id"])
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from main_app.archive import ARCHIVES, archive_settings, move_in_batches
+
+
+class Command(BaseCommand):
+    help = ("Move applications of long-closed programs and registrations of past events "
+            "into the archive tables in small batches")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", choices=sorted(ARCHIVES), help="Archive one kind of row only")
+        parser.add_argument("--program-days", type=int, help="Days a program must have been CLOSED")
+        parser.add_argument("--event-days", type=int, help="Days since the event took place")
+        parser.add_argument("--batch-size", type=int, help="Rows per transaction")
+        parser.add_argument("--sleep", type=float, help="Seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would move")
+
+    def handle(self, *args, **options):
+        config = archive_settings()
+        days = {
+            "applications": options["program_days"] if options["program_days"] is not None
+            else config["CLOSED_PROGRAM_DAYS"],
+            "registrations": options["event_days"] if options["event_days"] is not None
+            else config["PAST_EVENT_DAYS"],
+        }
+        for name, (source, archive_model, build, related) in ARCHIVES.items():
+            if options["only"] and name != options["only"]:
+                continue
+            queryset = source(days=days[name])
+            if options["dry_run"]:
+                self.stdout.write(f"{name}: {queryset.count()} row(s) would be archived")
+                continue
+            moved = move_in_batches(
+                queryset, archive_model, build, related, batch_size=options["batch_size"],
+                sleep=options["sleep"],
+                progress=(lambda n, name=name: self.stdout.write(f"  {name}: {n} moved"))
+                if options["verbosity"] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(f"{name}: archived {moved} row(s)"))
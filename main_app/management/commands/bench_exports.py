@@ -0,0 +1,103 @@
+import csv
+import gzip
+import io
+import random
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app import columnar
+
+
+def synthetic_rows(dataset, count):
+    rnd = random.Random(42)
+    now = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    categories = {c.name: [f"{c.name} {i}" for i in range(rnd.randint(5, 60))] for c in dataset.columns}
+    makers = {
+        "int": lambda c, i: i + 1 if c.name == "id" else rnd.randint(1, 5000),
+        "str": lambda c, i: rnd.choice(["", "", "Documents verified", "Income proof missing, follow up by phone"]),
+        "category": lambda c, i: rnd.choice(categories[c.name]),
+        "bool": lambda c, i: rnd.random() < 0.7,
+        "date": lambda c, i: date(1950, 1, 1) + timedelta(days=rnd.randint(0, 25000)),
+        "timestamp": lambda c, i: now - timedelta(seconds=rnd.randint(0, 365 * 86400)),
+        "money": lambda c, i: Decimal(rnd.randint(0, 1500000)) / 100,
+    }
+    for i in range(count):
+        yield tuple(makers[c.kind](c, i) for c in dataset.columns)
+
+
+def write_csv(rows, dataset, out):
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6, mtime=0) as compressed, \
+            io.TextIOWrapper(compressed, encoding="utf-8", newline="") as text:
+        writer = csv.writer(text)
+        writer.writerow([c.name for c in dataset.columns])
+        writer.writerows(rows)
+
+
+def read_csv(body):
+    with gzip.open(io.BytesIO(body), "rt", encoding="utf-8", newline="") as text:
+        return sum(1 for _ in csv.reader(text)) - 1
+
+
+class Command(BaseCommand):
+    help = "Compare gzipped CSV against Arrow IPC and Parquet exports: write time, file size and load time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", choices=list(columnar.DATASETS), default="applications")
+        parser.add_argument("--rows", type=int, default=100000,
+                            help="Synthetic rows to export (default 100000)")
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--from-db", action="store_true",
+                            help="Export the real table instead of synthetic rows")
+
+    def handle(self, *args, **options):
+        if not columnar.available():
+            raise CommandError("pyarrow is not installed; only CSV exports are available")
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+
+        dataset = columnar.DATASETS[options["dataset"]]
+        if options["from_db"]:
+            rows = list(dataset.model.objects.order_by("id").values_list(*(c.lookup for c in dataset.columns)))
+        else:
+            rows = list(synthetic_rows(dataset, options["rows"]))
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{options['dataset']} ({len(rows):,} rows)"))
+
+        writers = [("csv.gz", lambda out: write_csv(rows, dataset, out), [
+            ("csv module", read_csv),
+            ("pyarrow.csv", lambda body: pa_csv.read_csv(
+                pa.CompressedInputStream(pa.BufferReader(body), "gzip")).num_rows),
+        ])]
+        for compression in ("zstd", "lz4"):
+            writers.append((f"arrow {compression}",
+                            lambda out, c=compression: columnar.write(rows, dataset, "arrow", out, c), [
+                                ("ipc read_all", lambda body: pa.ipc.open_file(pa.BufferReader(body)).read_all().num_rows),
+                            ]))
+        for compression in ("zstd", "snappy"):
+            writers.append((f"parquet {compression}",
+                            lambda out, c=compression: columnar.write(rows, dataset, "parquet", out, c), [
+                                ("read_table", lambda body: pq.read_table(pa.BufferReader(body)).num_rows),
+                            ]))
+
+        baseline = None
+        for label, writer, readers in writers:
+            best_write, body = float("inf"), b""
+            for _ in range(options["repeat"]):
+                out = io.BytesIO()
+                start = time.perf_counter()
+                writer(out)
+                best_write = min(best_write, time.perf_counter() - start)
+                body = out.getvalue()
+            baseline = baseline or len(body)
+            self.stdout.write(f"  {label:<15} write {best_write * 1000:9.2f} ms  {len(body):>12,} bytes "
+                              f"({len(body) / baseline * 100:.0f}% of csv.gz)")
+            for name, reader in readers:
+                best = float("inf")
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    loaded = reader(body)
+                    best = min(best, time.perf_counter() - start)
+                self.stdout.write(f"  {'':<15} load  {best * 1000:9.2f} ms  via {name} ({loaded:,} rows)")
@@ -0,0 +1,111 @@
+import random
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from main_app.middleware import brotli, compress, compression_settings
+from main_app.models import Beneficiary
+from main_app.renderers import FastJSONRenderer, orjson
+from main_app.serializers import BeneficiarySerializer
+
+
+def synthetic_beneficiaries(count):
+    rnd = random.Random(42)
+    now = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    rows = []
+    for i in range(count):
+        rows.append({
+            "id": i + 1,
+            "user": {
+                "id": i + 1, "username": f"user{i}", "email": f"user{i}@example.com",
+                "first_name": rnd.choice(["Ahmed", "Sara", "Mohammed", "Noura", "عبدالله"]),
+                "last_name": rnd.choice(["Alharbi", "Alqahtani", "Alotaibi", "الشمري"]),
+                "is_superuser": False,
+            },
+            "charity": rnd.randint(1, 50),
+            "national_id": str(1000000000 + i),
+            "phone": f"05{rnd.randint(10000000, 99999999)}",
+            "address": f"{rnd.randint(1, 999)} King Fahd Road",
+            "city": rnd.choice(["Riyadh", "Jeddah", "Dammam", "Abha"]),
+            "region": rnd.choice(["Riyadh", "Makkah", "Eastern", "Asir"]),
+            "date_of_birth": date(1950, 1, 1) + timedelta(days=rnd.randint(0, 25000)),
+            "family_size": rnd.randint(1, 12),
+            "monthly_income": Decimal(rnd.randint(0, 1500000)) / 100,
+            "special_needs": "",
+            "is_active": True,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now,
+        })
+    return rows
+
+
+def synthetic_ministry_statistics(programs):
+    today = date(2025, 1, 1)
+    return {
+        "ministry_name": "Ministry of Human Resources",
+        "total_programs": programs,
+        "applications_by_status": [{"status": s, "count": 1000} for s in ("PENDING", "APPROVED", "REJECTED")],
+        "programs_summary": [
+            {"id": i, "name": f"Program {i}", "status": "ACTIVE", "total_applications": i * 10,
+             "unique_beneficiaries": i * 7} for i in range(programs)
+        ],
+        "applications_over_time": [
+            {"date": (today - timedelta(days=29 - i)).strftime("%Y-%m-%d"),
+             "day": (today - timedelta(days=29 - i)).strftime("%d/%m"), "count": i} for i in range(30)
+        ],
+        "avg_processing_days": 3.4,
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON encode time and compressed response size for the largest payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000,
+                            help="Beneficiary rows in the list payload (default 5000)")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--from-db", action="store_true",
+                            help="Serialize real beneficiaries instead of synthetic rows")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        if options["from_db"]:
+            qs = Beneficiary.objects.select_related("user", "charity")[:rows]
+            beneficiaries = BeneficiarySerializer(qs, many=True).data
+        else:
+            beneficiaries = synthetic_beneficiaries(rows)
+
+        payloads = {
+            f"beneficiaries ({len(beneficiaries)} rows)": beneficiaries,
+            "ministry statistics (500 programs)": synthetic_ministry_statistics(500),
+        }
+        renderers = [("stdlib json", JSONRenderer())]
+        if orjson is not None:
+            renderers.append(("orjson", FastJSONRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING("orjson not installed, only the stdlib encoder is measured"))
+
+        config = compression_settings()
+        codings = ["gzip"] + (["br"] if brotli is not None else [])
+
+        for label, data in payloads.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            body = None
+            for name, renderer in renderers:
+                best = float("inf")
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    body = renderer.render(data, "application/json", {})
+                    best = min(best, time.perf_counter() - start)
+                self.stdout.write(f"  encode {name:<12} {best * 1000:8.2f} ms  {len(body):>10,} bytes")
+            for coding in codings:
+                start = time.perf_counter()
+                compressed = compress(body, coding, config)
+                elapsed = time.perf_counter() - start
+                ratio = len(compressed) / len(body) * 100
+                self.stdout.write(
+                    f"  {coding:<19} {elapsed * 1000:8.2f} ms  {len(compressed):>10,} bytes ({ratio:.1f}%)"
+                )
@@ -0,0 +1,89 @@
+import threading
+import time
+import uuid
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from main_app.models import Beneficiary, Charity, Program, ProgramApplication
+from main_app.workqueue import claim
+
+
+class Command(BaseCommand):
+    help = "Measure review-queue claim throughput for increasing numbers of concurrent reviewers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--applications", type=int, default=2000)
+        parser.add_argument("--reviewers", type=int, nargs="+", default=[1, 2, 4, 8])
+        parser.add_argument("--batch", type=int, default=10, help="Applications claimed per request")
+        parser.add_argument("--work-ms", type=float, default=5,
+                            help="Simulated review time per claimed batch")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        ministry = f"bench-{tag}"
+        self.stdout.write(f"Backend: {connection.vendor}, "
+                          f"skip locked: {connection.features.has_select_for_update_skip_locked}")
+        try:
+            program, reviewers = self.seed(tag, ministry, options["applications"], max(options["reviewers"]))
+            programs = Program.objects.filter(id=program.id)
+            for n in options["reviewers"]:
+                ProgramApplication.objects.filter(program=program).update(claimed_by=None, claim_expires_at=None)
+                elapsed, total = self.run(reviewers[:n], programs, options)
+                self.stdout.write(f"  {n:>3} reviewer(s): {total / elapsed:8.0f} applications/s "
+                                  f"({total} in {elapsed:.2f}s)")
+        finally:
+            Charity.objects.filter(registration_number=ministry).delete()
+            Program.objects.filter(ministry_owner=ministry).delete()
+            User.objects.filter(username__startswith=f"{ministry}-").delete()
+
+    def seed(self, tag, ministry, count, reviewer_count):
+        charity = Charity.objects.create(
+            name=ministry, registration_number=ministry, issuing_authority="bench", email=f"{ministry}@example.com",
+            phone="0", address="-", city="-", region="-")
+        program = Program.objects.create(name=ministry, description="-", ministry_owner=ministry)
+        User.objects.bulk_create([
+            User(username=f"{ministry}-b{i}", email=f"{ministry}-b{i}@example.com", password="!")
+            for i in range(count)
+        ])
+        users = User.objects.filter(username__startswith=f"{ministry}-b").order_by("id")
+        beneficiaries = Beneficiary.objects.bulk_create([
+            Beneficiary(user=u, charity=charity, national_id=f"{tag}{i}", phone="0", address="-", city="-",
+                        region="-", date_of_birth=date(1990, 1, 1))
+            for i, u in enumerate(users)
+        ])
+        ProgramApplication.objects.bulk_create([
+            ProgramApplication(beneficiary=b, program=program) for b in beneficiaries
+        ], batch_size=500)
+        User.objects.bulk_create([
+            User(username=f"{ministry}-r{i}", password="!", is_superuser=True) for i in range(reviewer_count)
+        ])
+        return program, list(User.objects.filter(username__startswith=f"{ministry}-r").order_by("id"))
+
+    def run(self, reviewers, programs, options):
+        counts = []
+        lock = threading.Lock()
+
+        def work(reviewer):
+            claimed = 0
+            try:
+                while True:
+                    ids = claim(reviewer, programs, options["batch"])
+                    if not ids:
+                        break
+                    claimed += len(ids)
+                    time.sleep(options["work_ms"] / 1000)
+            finally:
+                connection.close()
+                with lock:
+                    counts.append(claimed)
+
+        threads = [threading.Thread(target=work, args=(r,)) for r in reviewers]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start, sum(counts)
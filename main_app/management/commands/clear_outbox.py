@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main_app.outbox import purge_delivered
+
+
+class Command(BaseCommand):
+    help = "Delete delivered webhook deliveries and outbox events past OUTBOX[\"RETENTION_DAYS\"]"
+
+    def handle(self, *args, **options):
+        deliveries, events = purge_delivered()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Removed {deliveries} delivered webhook delivery(ies) and {events} outbox event(s)"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main_app.uploads import purge_stale
+
+
+class Command(BaseCommand):
+    help = "Delete expired document uploads and stored documents no charity references"
+
+    def handle(self, *args, **options):
+        uploads, documents = purge_stale()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Removed {uploads} expired upload(s) and {documents} unreferenced document(s)"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from main_app.changes import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete changes-feed tombstones past CHANGES_FEED[\"TOMBSTONE_RETENTION_DAYS\"]"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"✓ Removed {purge_tombstones()} expired tombstone(s)"))
@@ -1,10 +1,16 @@
 from django.core.management.base import BaseCommand
+from main_app.archive import purge
 from main_app.models import Program
 
 
 class Command(BaseCommand):
     help = 'Delete programs containing "takaful" in the name'
 
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Rows per transaction")
+        parser.add_argument("--sleep", type=float, help="Seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+
     def handle(self, *args, **options):
         programs = Program.objects.filter(name__icontains='takaful')
         
@@ -13,11 +19,15 @@ class Command(BaseCommand):
             for p in programs:
                 self.stdout.write(f"  - {p.name} (ID: {p.id}, Ministry: {p.ministry_owner})")
             
-            # Delete all found programs
-            deleted_count = programs.count()
-            programs.delete()
+            # Applications first, then the programs, a batch per transaction
+            counts = purge(programs, batch_size=options["batch_size"], sleep=options["sleep"],
+                           dry_run=options["dry_run"])
+            if options["dry_run"]:
+                for label, n in counts.items():
+                    self.stdout.write(f"  {label}: {n} would be deleted")
+                return
             self.stdout.write(
-                self.style.SUCCESS(f'\n✓ Successfully deleted {deleted_count} program(s)')
+                self.style.SUCCESS(f'\n✓ Successfully deleted {counts.get("main_app.Program", 0)} program(s)')
             )
         else:
             self.stdout.write(self.style.WARNING("No programs found with 'takaful' in name"))
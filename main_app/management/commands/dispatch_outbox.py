@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main_app.outbox import Dispatcher, outbox_settings
+
+
+class Command(BaseCommand):
+    help = "Deliver pending webhook events from the outbox in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Seconds to sleep when there is nothing to deliver")
+
+    def handle(self, *args, **options):
+        config = outbox_settings()
+        interval = options["interval"] if options["interval"] is not None else config["POLL_INTERVAL_SECONDS"]
+        dispatcher = Dispatcher(config)
+        while True:
+            close_old_connections()
+            result = dispatcher.run_once()
+            if result["delivered"] or result["failed"]:
+                self.stdout.write(f"delivered {result['delivered']}, failed {result['failed']}")
+            if options["once"]:
+                return
+            if not (result["delivered"] or result["failed"]):
+                time.sleep(interval)
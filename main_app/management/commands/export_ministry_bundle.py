@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from main_app.exports import SHARD_FIELDS, export_bundle
+
+
+class Command(BaseCommand):
+    help = "Export a ministry's applications as a ZIP of per-program or per-charity CSV shards, in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("ministry", help="Ministry name, matched against Program.ministry_owner")
+        parser.add_argument("--out", required=True, help="Path of the ZIP file to write")
+        parser.add_argument("--shard-by", choices=list(SHARD_FIELDS), default="program")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes; defaults to EXPORT_BUNDLE['WORKERS'] (one per CPU)")
+        parser.add_argument("--program-id", type=int, default=None)
+        parser.add_argument("--status", default=None)
+        parser.add_argument("--date-from", type=parse_date, default=None)
+        parser.add_argument("--date-to", type=parse_date, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["out"], "wb") as out:
+                manifest = export_bundle(
+                    out, options["ministry"], shard_by=options["shard_by"], program_id=options["program_id"],
+                    status=options["status"], date_from=options["date_from"], date_to=options["date_to"],
+                    workers=options["workers"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Wrote {manifest['total_rows']} application(s) in {len(manifest['files'])} shard(s) to {options['out']}"))
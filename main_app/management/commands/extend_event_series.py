@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from main_app.recurrence import extend_due
+
+
+class Command(BaseCommand):
+    help = "Create the next occurrences of recurring event series whose horizon has fallen behind"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"✓ Created {extend_due()} event occurrence(s)"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main_app.dedup import detect
+
+
+class Command(BaseCommand):
+    help = ("Find likely duplicate beneficiaries across charities and record them as "
+            "DuplicateCandidate rows for review")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Compare every beneficiary instead of only those changed since the last scan")
+        parser.add_argument("--workers", type=int, help="Worker processes (0 runs in this process)")
+        parser.add_argument("--threshold", type=float, help="Minimum score to record, between 0 and 1")
+
+    def handle(self, *args, **options):
+        stats = detect(full=options["full"], workers=options["workers"], threshold=options["threshold"])
+        self.stdout.write(
+            f"{stats['records']} beneficiaries ({stats['changed']} new or changed), "
+            f"{stats['blocks']} blocks, {stats['compared']} pairs compared"
+        )
+        if stats["skipped_blocks"]:
+            self.stdout.write(self.style.WARNING(f"{stats['skipped_blocks']} oversized block(s) skipped"))
+        self.stdout.write(self.style.SUCCESS(f"{stats['candidates']} candidate pair(s) recorded"))
@@ -0,0 +1,127 @@
+import logging
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+PASSWORD = "loadtest-pass-123"
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = ("Measure legitimate login latency while a credential-stuffing burst hits the login "
+            "endpoint, with throttling disabled and then enabled")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attackers", type=int, default=8, help="Concurrent attacking threads")
+        parser.add_argument("--attacker-ips", type=int, default=4,
+                            help="Distinct source addresses the attack rotates through")
+        parser.add_argument("--attack-interval", type=float, default=0.05,
+                            help="Pause between requests per attacking thread; the client runs in this "
+                                 "process, so an unpaced attacker competes with the server for CPU")
+        parser.add_argument("--users", type=int, default=20, help="Accounts created for the test")
+        parser.add_argument("--seconds", type=float, default=30)
+        parser.add_argument("--rate", action="append", default=[], metavar="SCOPE=RATE",
+                            help='Override a throttle rate for the "on" run, e.g. --rate login.ip=5/min')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(username=f"loadtest-{tag}-{i}", email=f"loadtest-{tag}-{i}@example.com",
+                                     password=PASSWORD)
+            for i in range(options["users"])
+        ]
+        # The attack works through a leaked list that does not include the
+        # accounts signing in legitimately.
+        emails = [u.email for u in users]
+        half = max(1, len(emails) // 2)
+        targets, legit_emails = emails[:half], emails[half:] or emails
+        rates = dict(settings.REST_FRAMEWORK.get("DEFAULT_THROTTLE_RATES", {}))
+        rates.update(item.split("=", 1) for item in options["rate"])
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                for label, run_rates in (("throttling off", {}), ("throttling on", rates)):
+                    with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                                           "DEFAULT_THROTTLE_RATES": run_rates}):
+                        self.report(label, self.run(targets, legit_emails, options))
+        finally:
+            request_logger.setLevel(level)
+            User.objects.filter(username__startswith=f"loadtest-{tag}-").delete()
+            cache.clear()
+
+    def run(self, targets, legit_emails, options):
+        cache.clear()
+        url = reverse("login")
+        stop = time.monotonic() + options["seconds"]
+        lock = threading.Lock()
+        legit, attack = [], {}
+
+        def attacker(n):
+            client = Client()
+            i = 0
+            try:
+                while time.monotonic() < stop:
+                    ip = f"203.0.113.{(n + i) % options['attacker_ips'] + 1}"
+                    res = client.post(url, {"email": targets[i % len(targets)], "password": "guess"},
+                                      content_type="application/json", REMOTE_ADDR=ip)
+                    i += 1
+                    with lock:
+                        attack[res.status_code] = attack.get(res.status_code, 0) + 1
+                    time.sleep(options["attack_interval"])
+            finally:
+                connection.close()
+
+        def legitimate():
+            client = Client()
+            i = 0
+            try:
+                while time.monotonic() < stop:
+                    # Each real user arrives from their own address.
+                    ip = f"198.51.100.{i % 250 + 1}"
+                    start = time.perf_counter()
+                    res = client.post(url, {"email": legit_emails[i % len(legit_emails)], "password": PASSWORD},
+                                      content_type="application/json", REMOTE_ADDR=ip)
+                    elapsed = time.perf_counter() - start
+                    i += 1
+                    with lock:
+                        legit.append((elapsed, res.status_code))
+                    time.sleep(0.05)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attacker, args=(n,)) for n in range(options["attackers"])]
+        threads.append(threading.Thread(target=legitimate))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return legit, attack
+
+    def report(self, label, results):
+        legit, attack = results
+        ok = [elapsed * 1000 for elapsed, code in legit if code == 200]
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(
+            f"  legitimate: {len(ok)}/{len(legit)} succeeded, "
+            f"p50 {percentile(ok, 50):.1f} ms, p95 {percentile(ok, 95):.1f} ms"
+            + (f", mean {statistics.mean(ok):.1f} ms" if ok else "")
+        )
+        codes = ", ".join(f"{code}: {count}" for code, count in sorted(attack.items()))
+        self.stdout.write(f"  attack requests: {sum(attack.values())} ({codes})")
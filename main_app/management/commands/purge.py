@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.archive import purge
+
+
+class Command(BaseCommand):
+    help = ("Delete rows of a model and everything that cascades from them, children first, "
+            "in short batched transactions")
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="app_label.ModelName, e.g. main_app.Program")
+        parser.add_argument("--filter", action="append", default=[], metavar="LOOKUP=VALUE",
+                            help="Queryset filter, e.g. --filter status=CLOSED --filter name__icontains=test")
+        parser.add_argument("--all", action="store_true", help="Allow purging without any --filter")
+        parser.add_argument("--batch-size", type=int, help="Rows per transaction")
+        parser.add_argument("--sleep", type=float, help="Seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        lookups = {}
+        for item in options["filter"]:
+            if "=" not in item:
+                raise CommandError(f"Invalid filter {item!r}, expected LOOKUP=VALUE")
+            key, value = item.split("=", 1)
+            lookups[key] = value
+        if not lookups and not options["all"]:
+            raise CommandError("Refusing to purge every row without --all")
+
+        queryset = model._base_manager.filter(**lookups)
+        counts = purge(
+            queryset, batch_size=options["batch_size"], sleep=options["sleep"], dry_run=options["dry_run"],
+            progress=(lambda label, n: self.stdout.write(f"  {label}: {n} deleted"))
+            if options["verbosity"] > 1 else None,
+        )
+        verb = "would be deleted" if options["dry_run"] else "deleted"
+        for label, n in counts.items():
+            self.stdout.write(f"{label}: {n} {verb}")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main_app.notifications import Sender, notification_settings
+
+
+class Command(BaseCommand):
+    help = "Expand queued notification jobs and send due notifications in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Seconds to sleep when there is nothing to send")
+
+    def handle(self, *args, **options):
+        config = notification_settings()
+        interval = options["interval"] if options["interval"] is not None else config["POLL_INTERVAL_SECONDS"]
+        sender = Sender(config)
+        while True:
+            close_old_connections()
+            result = sender.run_once()
+            if result["sent"] or result["failed"]:
+                self.stdout.write(f"sent {result['sent']}, failed {result['failed']}")
+            if options["once"]:
+                return
+            if not (result["sent"] or result["failed"]):
+                time.sleep(interval)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from main_app.querylog import read_log, recorder, slow_query_settings, summarize
+
+
+class Command(BaseCommand):
+    help = "Print the slowest statements from the slow query log, aggregated by fingerprint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--sort", choices=["total", "max", "mean", "count"], default="total",
+                            help="Rank by total time (default), worst single run, mean time or count")
+        parser.add_argument("--view", help="Only statements run by this view class")
+        parser.add_argument("--plans", action="store_true", help="Show the captured EXPLAIN plans")
+
+    def handle(self, *args, **options):
+        recorder.flush()
+        config = slow_query_settings()
+        entries = read_log(config["PATH"], config["BACKUP_COUNT"])
+        if options["view"]:
+            entries = (e for e in entries if e["view"] == options["view"])
+        offenders = summarize(entries)
+        if not offenders:
+            self.stdout.write(f"No slow queries logged in {config['PATH']}")
+            return
+        key = "count" if options["sort"] == "count" else f"{options['sort']}_ms"
+        offenders.sort(key=lambda o: o[key], reverse=True)
+        for rank, o in enumerate(offenders[:options["limit"]], 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{rank}. {o['digest']}  total {o['total_ms']:.0f} ms  {o['count']}x  "
+                f"mean {o['mean_ms']:.0f} ms  max {o['max_ms']:.0f} ms  last {o['last_seen']}"))
+            self.stdout.write(f"   {o['sql'][:500]}")
+            views = sorted(o["views"].items(), key=lambda v: -v[1])
+            self.stdout.write("   from " + ", ".join(f"{label} {count}x" for label, count in views))
+            if options["plans"] and o["plan"]:
+                for line in o["plan"].splitlines():
+                    self.stdout.write(f"     {line}")
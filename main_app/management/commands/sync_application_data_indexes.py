@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main_app.appdata import sync_indexes
+
+
+class Command(BaseCommand):
+    help = ("Create expression indexes for declared application_data keys, rebuild invalid ones "
+            "and drop ones no program uses")
+
+    def handle(self, *args, **options):
+        created, rebuilt, dropped = sync_indexes()
+        for name in created:
+            self.stdout.write(f"  created {name}")
+        for name in rebuilt:
+            self.stdout.write(f"  rebuilt {name}")
+        for name in dropped:
+            self.stdout.write(f"  dropped {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} created, {len(rebuilt)} rebuilt, {len(dropped)} dropped"))
@@ -0,0 +1,199 @@
+import gzip
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+
+from .nplusone import detect, nplusone_settings
+from .querylog import query_context, view_label
+
+try:
+    import brotli
+except ImportError:  # optional dependency, gzip only
+    brotli = None
+
+
+COMPRESSION_DEFAULTS = {
+    "MIN_SIZE": 1024,
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 4,
+    "CONTENT_TYPES": (
+        "application/json",
+        "text/",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    ),
+}
+
+re_accept_encoding = _lazy_re_compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*")
+
+
+def compression_settings():
+    return {**COMPRESSION_DEFAULTS, **getattr(settings, "RESPONSE_COMPRESSION", {})}
+
+
+def parse_accept_encoding(header):
+    """Return {coding: qvalue} for an Accept-Encoding header."""
+    codings = {}
+    for part in header.split(","):
+        match = re_accept_encoding.fullmatch(part)
+        if not match:
+            continue
+        try:
+            q = float(match[2]) if match[2] is not None else 1.0
+        except ValueError:
+            continue
+        codings[match[1].lower()] = q
+    return codings
+
+
+def negotiate_encoding(header):
+    """Pick the best coding we support: br when available, then gzip."""
+    if not header:
+        return None
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get("*", 0)
+    supported = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0
+    for coding in supported:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(content, coding, config):
+    if coding == "br":
+        return brotli.compress(content, quality=config["BROTLI_QUALITY"])
+    return gzip.compress(content, compresslevel=config["GZIP_LEVEL"], mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Negotiated brotli/gzip compression for buffered responses.
+
+    Small bodies, non-text content types, streaming responses (NDJSON feeds,
+    file downloads, SSE) and anything already encoded are left untouched.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return response
+
+        config = compression_settings()
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if not any(content_type.startswith(t) for t in config["CONTENT_TYPES"]):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < config["MIN_SIZE"]:
+            return response
+
+        coding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding is None:
+            return response
+
+        compressed = compress(response.content, coding, config)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = coding
+        # The representation changed, so a strong ETag no longer matches it.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
+
+
+_END = object()
+
+
+def in_context(chunks, context):
+    """Iterate `chunks` with `context` as the query context while each chunk is produced."""
+    chunks = iter(chunks)
+    try:
+        while True:
+            token = query_context.set(context)
+            try:
+                chunk = next(chunks, _END)
+            finally:
+                query_context.reset(token)
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+async def in_context_async(chunks, context):
+    chunks = aiter(chunks)
+    try:
+        while True:
+            token = query_context.set(context)
+            try:
+                chunk = await anext(chunks, _END)
+            finally:
+                query_context.reset(token)
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+
+
+class QueryContextMiddleware:
+    """Labels the queries of each request with its URL name and view class for the slow query log."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        context = {"url_name": None, "view": None}
+        token = query_context.set(context)
+        try:
+            response = self.get_response(request)
+        finally:
+            query_context.reset(token)
+        # The body is produced after this returns, so its queries need the
+        # context back. File bodies make no queries, and rewrapping them
+        # would drop file_to_stream and with it the server's sendfile path.
+        if response.streaming and not isinstance(response, FileResponse):
+            wrap = in_context_async if response.is_async else in_context
+            response.streaming_content = wrap(response.streaming_content, context)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        context = query_context.get()
+        if context is not None:
+            context["url_name"] = request.resolver_match.url_name if request.resolver_match else None
+            context["view"] = view_label(view_func)
+
+
+class NPlusOneMiddleware:
+    """
+    Reports statements of one shape repeated within a request (see
+    main_app.nplusone). Must come after QueryContextMiddleware, which
+    names the view for the report and the allowlist.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = nplusone_settings()
+        if not config["ENABLED"]:
+            return self.get_response(request)
+        with detect(config) as detector:
+            response = self.get_response(request)
+            context = query_context.get() or {}
+            detector.view, detector.url_name = context.get("view"), context.get("url_name")
+        return response
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:49
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing rows were never modified after creation.
+    apps.get_model('main_app', 'EventRegistration').objects.update(updated_at=models.F('registered_at'))
+    apps.get_model('main_app', 'ProgramApplication').objects.update(
+        updated_at=Coalesce('reviewed_at', 'submitted_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_alter_beneficiary_options_alter_charity_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('scope_charity', models.BigIntegerField(blank=True, null=True)),
+                ('scope_user', models.BigIntegerField(blank=True, null=True)),
+                ('scope_ministry', models.CharField(blank=True, max_length=200)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='eventregistration',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='programapplication',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['updated_at', 'id'], name='beneficiary_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='charity',
+            index=models.Index(fields=['updated_at', 'id'], name='charity_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['updated_at', 'id'], name='event_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventregistration',
+            index=models.Index(fields=['updated_at', 'id'], name='registration_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['updated_at', 'id'], name='program_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='programapplication',
+            index=models.Index(fields=['updated_at', 'id'], name='application_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['resource', 'deleted_at', 'id'], name='tombstone_feed_idx'),
+        ),
+    ]
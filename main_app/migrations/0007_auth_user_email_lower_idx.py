@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_app', '0006_document_uploads'),
+    ]
+
+    operations = [
+        # auth_user belongs to django.contrib.auth, so the expression index
+        # used by EmailBackend is created here rather than in Meta.indexes.
+        migrations.RunSQL(
+            "CREATE INDEX auth_user_email_lower_idx ON auth_user (LOWER(email));",
+            "DROP INDEX auth_user_email_lower_idx;",
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_auth_user_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEventRegistration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('event_id', models.BigIntegerField(db_index=True)),
+                ('event_title', models.CharField(max_length=200)),
+                ('event_date', models.DateTimeField()),
+                ('charity_id', models.BigIntegerField(db_index=True)),
+                ('beneficiary_id', models.BigIntegerField()),
+                ('registered_at', models.DateTimeField()),
+                ('attended', models.BooleanField(default=False)),
+                ('notes', models.TextField(blank=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedProgramApplication',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('program_id', models.BigIntegerField(db_index=True)),
+                ('program_name', models.CharField(max_length=200)),
+                ('ministry_owner', models.CharField(max_length=200)),
+                ('beneficiary_id', models.BigIntegerField()),
+                ('charity_id', models.BigIntegerField(db_index=True)),
+                ('charity_name', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('UNDER_REVIEW', 'Under Review'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('WITHDRAWN', 'Withdrawn')], max_length=20)),
+                ('application_data', models.JSONField(default=dict)),
+                ('submitted_at', models.DateTimeField()),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('review_notes', models.TextField(blank=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
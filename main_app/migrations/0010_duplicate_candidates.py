@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_application_claims'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+                ('full', models.BooleanField(default=False)),
+                ('compared', models.PositiveIntegerField(default=0)),
+                ('candidates', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('reasons', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('CONFIRMED', 'Confirmed duplicate'), ('DISMISSED', 'Not a duplicate')], default='OPEN', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('beneficiary_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates_a', to='main_app.beneficiary')),
+                ('beneficiary_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates_b', to='main_app.beneficiary')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-score'], name='duplicate_review_idx')],
+                'constraints': [models.UniqueConstraint(fields=('beneficiary_a', 'beneficiary_b'), name='uniq_duplicate_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_duplicate_candidates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_date'], name='event_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventregistration',
+            index=models.Index(fields=['registered_at'], name='registration_registered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='programapplication',
+            index=models.Index(fields=['submitted_at'], name='application_submitted_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:36
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor_id', models.BigIntegerField(blank=True, null=True)),
+                ('actor_username', models.CharField(blank=True, max_length=150)),
+                ('action', models.CharField(choices=[('CREATE', 'Create'), ('UPDATE', 'Update'), ('DELETE', 'Delete')], max_length=10)),
+                ('resource', models.CharField(max_length=50)),
+                ('object_id', models.CharField(max_length=64)),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', 'object_id', 'created_at'], name='audit_object_idx'), models.Index(fields=['actor_id', 'created_at'], name='audit_actor_idx'), models.Index(fields=['created_at', 'id'], name='audit_created_idx')],
+            },
+        ),
+    ]
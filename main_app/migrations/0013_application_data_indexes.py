@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:41
+
+from django.db import migrations, models
+
+
+def create_gin_index(apps, schema_editor):
+    # Containment filters on application_data (equality on declared keys) use
+    # this on PostgreSQL; other backends rely on the per-key expression indexes.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS application_data_gin "
+            "ON main_app_programapplication USING GIN (application_data jsonb_path_ops);"
+        )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS application_data_gin;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_audit_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='indexed_data_keys',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Existing applications only record their submission and, if reviewed,
+    # the final decision; intermediate transitions were never kept.
+    ProgramApplication = apps.get_model("main_app", "ProgramApplication")
+    ApplicationStatusChange = apps.get_model("main_app", "ApplicationStatusChange")
+    batch = []
+    rows = ProgramApplication.objects.order_by("id").values_list(
+        "id", "program_id", "status", "submitted_at", "reviewed_at")
+    for id, program_id, status, submitted_at, reviewed_at in rows.iterator(chunk_size=2000):
+        decided = status != "PENDING" and reviewed_at is not None
+        batch.append(ApplicationStatusChange(
+            application_id=id, program_id=program_id, from_status="", changed_at=submitted_at,
+            to_status="PENDING" if decided else status))
+        if decided:
+            batch.append(ApplicationStatusChange(
+                application_id=id, program_id=program_id, from_status="PENDING", to_status=status,
+                changed_at=reviewed_at, seconds_in_status=(reviewed_at - submitted_at).total_seconds()))
+        if len(batch) >= 2000:
+            ApplicationStatusChange.objects.bulk_create(batch)
+            batch = []
+    ApplicationStatusChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0016_event_series'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('PENDING', 'Pending'), ('UNDER_REVIEW', 'Under Review'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('WITHDRAWN', 'Withdrawn')], max_length=20)),
+                ('to_status', models.CharField(choices=[('PENDING', 'Pending'), ('UNDER_REVIEW', 'Under Review'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('WITHDRAWN', 'Withdrawn')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('seconds_in_status', models.FloatField(blank=True, null=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='main_app.programapplication')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_changes', to=settings.AUTH_USER_MODEL)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='main_app.program')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['program', 'from_status', 'changed_at'], name='status_change_stage_idx'), models.Index(fields=['changed_by', 'changed_at'], name='status_change_actor_idx'), models.Index(fields=['application', 'changed_at'], name='status_change_app_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
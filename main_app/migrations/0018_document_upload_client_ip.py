@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0017_application_status_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentupload',
+            name='client_ip',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:53
+
+import main_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0018_document_upload_client_ip'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='program',
+            name='indexed_data_keys',
+            field=models.JSONField(blank=True, default=dict, validators=[main_app.models.validate_indexed_data_keys]),
+        ),
+    ]
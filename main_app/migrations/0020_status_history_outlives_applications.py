@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0019_program_indexed_data_keys_validator'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='applicationstatuschange',
+            name='application',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='status_changes', to='main_app.programapplication'),
+        ),
+    ]
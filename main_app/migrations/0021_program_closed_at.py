@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill(apps, schema_editor):
+    # The close date was never kept; the last edit is the best guess.
+    Program = apps.get_model("main_app", "Program")
+    Program.objects.filter(status="CLOSED").update(closed_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0020_status_history_outlives_applications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
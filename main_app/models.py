@@ -1,5 +1,10 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 ROLE_CHOICES = [
     ('SUPERUSER', 'HRSD Super User'),
@@ -21,6 +26,41 @@ APPLICATION_STATUS_CHOICES = [
     ('WITHDRAWN', 'Withdrawn'),
 ]
 
+DELIVERY_STATUS_CHOICES = [
+    ('PENDING', 'Pending'),
+    ('DELIVERED', 'Delivered'),
+    ('FAILED', 'Failed'),
+]
+
+DUPLICATE_STATUS_CHOICES = [
+    ('OPEN', 'Open'),
+    ('CONFIRMED', 'Confirmed duplicate'),
+    ('DISMISSED', 'Not a duplicate'),
+]
+
+AUDIT_ACTION_CHOICES = [
+    ('CREATE', 'Create'),
+    ('UPDATE', 'Update'),
+    ('DELETE', 'Delete'),
+]
+
+RECURRENCE_CHOICES = [
+    ('DAILY', 'Daily'),
+    ('WEEKLY', 'Weekly'),
+    ('MONTHLY', 'Monthly'),
+]
+
+NOTIFICATION_KIND_CHOICES = [
+    ('EVENT_UPDATED', 'Event Updated'),
+    ('EVENT_CANCELLED', 'Event Cancelled'),
+    ('APPLICATION_DECIDED', 'Application Decided'),
+]
+
+UPLOAD_STATUS_CHOICES = [
+    ('UPLOADING', 'Uploading'),
+    ('COMPLETE', 'Complete'),
+]
+
 CHARITY_TYPE_CHOICES = [
     ('HEALTH', 'Health'),
     ('EDUCATION', 'Education'),
@@ -31,7 +71,42 @@ CHARITY_TYPE_CHOICES = [
 ]
 
 
-class Charity(models.Model):
+def validate_indexed_data_keys(value):
+    from .appdata import AppDataError, validate_keys
+    try:
+        validate_keys(value)
+    except AppDataError as e:
+        raise ValidationError(str(e))
+
+
+class TombstonedQuerySet(models.QuerySet):
+    def delete(self):
+        from .archive import record_cascade_tombstones
+        with transaction.atomic(using=self.db):
+            record_cascade_tombstones(self)
+            return super().delete()
+
+
+class TombstonedModel(models.Model):
+    """
+    Changes-feed models. Deleting one, or a queryset of them, first writes
+    the tombstones of every feed row the delete removes, one insert per
+    model, so the delete itself keeps Django's fast cascade path.
+    """
+    objects = TombstonedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, using=None, keep_parents=False):
+        from .archive import record_cascade_tombstones
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            record_cascade_tombstones(type(self)._base_manager.using(using).filter(pk=self.pk))
+            return super().delete(using, keep_parents)
+
+
+class Charity(TombstonedModel):
     name = models.CharField(max_length=200)
     registration_number = models.CharField(max_length=50, unique=True)
     issuing_authority = models.CharField(max_length=200)
@@ -58,8 +133,11 @@ class Charity(models.Model):
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='charity_updated_idx')]
+
 
-class Beneficiary(models.Model):
+class Beneficiary(TombstonedModel):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name='beneficiary_profile')
     charity = models.ForeignKey(
@@ -81,8 +159,11 @@ class Beneficiary(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.national_id}"
 
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='beneficiary_updated_idx')]
+
 
-class Program(models.Model):
+class Program(TombstonedModel):
     name = models.CharField(max_length=200)
     description = models.TextField()
     ministry_owner = models.CharField(max_length=200)
@@ -95,16 +176,59 @@ class Program(models.Model):
     application_deadline = models.DateField(null=True, blank=True)
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
+    # {key: "number" | "text" | "boolean"}: application_data keys that get an
+    # expression index and can be filtered on (see main_app.appdata).
+    indexed_data_keys = models.JSONField(default=dict, blank=True, validators=[validate_indexed_data_keys])
+    # When status last became CLOSED; archiving counts from here, not from the last edit
+    closed_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        if self.status == 'CLOSED' and self.closed_at is None:
+            self.closed_at = timezone.now()
+        elif self.status != 'CLOSED':
+            self.closed_at = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'closed_at'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='program_updated_idx')]
+
 
-class Event(models.Model):
+# A recurring event. main_app.recurrence creates its occurrences as Event
+# rows up to generated_until and extends them as time passes.
+class EventSeries(models.Model):
+    charity = models.ForeignKey(
+        Charity, on_delete=models.CASCADE, related_name='event_series')
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    location = models.CharField(max_length=200)
+    city = models.CharField(max_length=100)
+    max_capacity = models.PositiveIntegerField(null=True, blank=True)
+    starts_at = models.DateTimeField()
+    frequency = models.CharField(max_length=10, choices=RECURRENCE_CHOICES, default='WEEKLY')
+    interval = models.PositiveSmallIntegerField(default=1)
+    until = models.DateField(null=True, blank=True)
+    generated_until = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.get_frequency_display()}) - {self.charity.name}"
+
+
+class Event(TombstonedModel):
     charity = models.ForeignKey(
         Charity, on_delete=models.CASCADE, related_name='events')
+    series = models.ForeignKey(
+        EventSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences')
     title = models.CharField(max_length=200)
     description = models.TextField()
     event_date = models.DateTimeField()
@@ -118,8 +242,15 @@ class Event(models.Model):
     def __str__(self):
         return f"{self.title} - {self.charity.name}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='event_updated_idx'),
+            models.Index(fields=['event_date'], name='event_date_idx'),
+            models.Index(fields=['series', 'event_date'], name='event_series_idx'),
+        ]
+
 
-class EventRegistration(models.Model):
+class EventRegistration(TombstonedModel):
     beneficiary = models.ForeignKey(
         Beneficiary, on_delete=models.CASCADE, related_name='event_registrations')
     event = models.ForeignKey(
@@ -127,6 +258,13 @@ class EventRegistration(models.Model):
     registered_at = models.DateTimeField(auto_now_add=True)
     attended = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_attended = instance.__dict__.get('attended')
+        return instance
 
     def __str__(self):
         return f"{self.beneficiary} - {self.event.title}"
@@ -136,9 +274,13 @@ class EventRegistration(models.Model):
             models.UniqueConstraint(
                 fields=['beneficiary', 'event'], name='uniq_beneficiary_event'),
         ]
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='registration_updated_idx'),
+            models.Index(fields=['registered_at'], name='registration_registered_idx'),
+        ]
 
 
-class ProgramApplication(models.Model):
+class ProgramApplication(TombstonedModel):
     beneficiary = models.ForeignKey(
         Beneficiary, on_delete=models.CASCADE, related_name='program_applications')
     program = models.ForeignKey(
@@ -149,6 +291,18 @@ class ProgramApplication(models.Model):
     submitted_at = models.DateTimeField(auto_now_add=True)
     reviewed_at = models.DateTimeField(null=True, blank=True)
     review_notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Reviewer work-queue lease; an expired lease counts as unclaimed.
+    claimed_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name='claimed_applications', null=True, blank=True)
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets signal handlers tell a status transition from any other save.
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
 
     def __str__(self):
         return f"{self.beneficiary} - {self.program.name} - {self.status}"
@@ -157,4 +311,299 @@ class ProgramApplication(models.Model):
         constraints = [
             models.UniqueConstraint(
                 fields=['beneficiary', 'program'], name='uniq_beneficiary_program'),
-        ]
\ No newline at end of file
+        ]
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='application_updated_idx'),
+            models.Index(fields=['status', 'submitted_at', 'id'], name='application_queue_idx'),
+            models.Index(fields=['submitted_at'], name='application_submitted_idx'),
+        ]
+
+
+# One row per status transition, written by the ProgramApplication post_save
+# handler. seconds_in_status is how long the application spent in
+# from_status, so time-in-stage statistics aggregate this table alone.
+# History outlives the application: archive_history deletes the hot row,
+# and the archived copy keeps its id as original_id.
+class ApplicationStatusChange(models.Model):
+    application = models.ForeignKey(
+        ProgramApplication, on_delete=models.DO_NOTHING, db_constraint=False, related_name='status_changes')
+    program = models.ForeignKey(
+        Program, on_delete=models.CASCADE, related_name='status_changes')
+    from_status = models.CharField(max_length=20, choices=APPLICATION_STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=APPLICATION_STATUS_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+    changed_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name='status_changes', null=True, blank=True)
+    seconds_in_status = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"#{self.application_id}: {self.from_status or '-'} -> {self.to_status}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['program', 'from_status', 'changed_at'], name='status_change_stage_idx'),
+            models.Index(fields=['changed_by', 'changed_at'], name='status_change_actor_idx'),
+            models.Index(fields=['application', 'changed_at'], name='status_change_app_idx'),
+        ]
+
+
+# Deletion marker for the changes feed. scope_* copy whatever the feed needs
+# to decide who may see the deleted row, since the row itself is gone.
+class Tombstone(models.Model):
+    resource = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    scope_charity = models.BigIntegerField(null=True, blank=True)
+    scope_user = models.BigIntegerField(null=True, blank=True)
+    scope_ministry = models.CharField(max_length=200, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.resource} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        indexes = [models.Index(fields=['resource', 'deleted_at', 'id'], name='tombstone_feed_idx')]
+
+
+class WebhookEndpoint(models.Model):
+    name = models.CharField(max_length=200)
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=200, blank=True)
+    # Empty list subscribes to every event type
+    event_types = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    max_concurrency = models.PositiveSmallIntegerField(default=2)
+    batch_size = models.PositiveSmallIntegerField(default=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class OutboxEvent(models.Model):
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
+
+
+class WebhookDelivery(models.Model):
+    event = models.ForeignKey(
+        OutboxEvent, on_delete=models.CASCADE, related_name='deliveries')
+    endpoint = models.ForeignKey(
+        WebhookEndpoint, on_delete=models.CASCADE, related_name='deliveries')
+    status = models.CharField(
+        max_length=20, choices=DELIVERY_STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event} -> {self.endpoint} ({self.status})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['event', 'endpoint'], name='uniq_event_endpoint'),
+        ]
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='delivery_due_idx')]
+
+
+# One row per distinct file content; the file lives at a path derived from
+# its SHA-256, so identical uploads share storage.
+class StoredDocument(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
+class DocumentUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name='document_uploads', null=True, blank=True)
+    # Caps the open uploads of anonymous clients, who have no owner
+    client_ip = models.GenericIPAddressField(null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(
+        max_length=20, choices=UPLOAD_STATUS_CHOICES, default='UPLOADING')
+    document = models.ForeignKey(
+        StoredDocument, on_delete=models.PROTECT, related_name='uploads', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+# Archive tier. Rows are copied out of the hot tables with the names they
+# were reported under, and keep plain ids rather than foreign keys so the
+# originals can be purged later without touching the archive.
+class ArchivedProgramApplication(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    program_id = models.BigIntegerField(db_index=True)
+    program_name = models.CharField(max_length=200)
+    ministry_owner = models.CharField(max_length=200)
+    beneficiary_id = models.BigIntegerField()
+    charity_id = models.BigIntegerField(db_index=True)
+    charity_name = models.CharField(max_length=200)
+    status = models.CharField(max_length=20, choices=APPLICATION_STATUS_CHOICES)
+    application_data = models.JSONField(default=dict)
+    submitted_at = models.DateTimeField()
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    review_notes = models.TextField(blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.program_name} #{self.original_id} ({self.status})"
+
+
+class ArchivedEventRegistration(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    event_id = models.BigIntegerField(db_index=True)
+    event_title = models.CharField(max_length=200)
+    event_date = models.DateTimeField()
+    charity_id = models.BigIntegerField(db_index=True)
+    beneficiary_id = models.BigIntegerField()
+    registered_at = models.DateTimeField()
+    attended = models.BooleanField(default=False)
+    notes = models.TextField(blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event_title} #{self.original_id}"
+
+
+# Likely duplicate beneficiaries found by manage.py find_duplicates.
+# beneficiary_a always has the lower id, so each pair is stored once.
+class DuplicateCandidate(models.Model):
+    beneficiary_a = models.ForeignKey(
+        Beneficiary, on_delete=models.CASCADE, related_name='duplicate_candidates_a')
+    beneficiary_b = models.ForeignKey(
+        Beneficiary, on_delete=models.CASCADE, related_name='duplicate_candidates_b')
+    score = models.FloatField()
+    reasons = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20, choices=DUPLICATE_STATUS_CHOICES, default='OPEN')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.beneficiary_a_id} ~ {self.beneficiary_b_id} ({self.score:.2f})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['beneficiary_a', 'beneficiary_b'], name='uniq_duplicate_pair'),
+        ]
+        indexes = [models.Index(fields=['status', '-score'], name='duplicate_review_idx')]
+
+
+class DuplicateScan(models.Model):
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+    full = models.BooleanField(default=False)
+    compared = models.PositiveIntegerField(default=0)
+    candidates = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Duplicate scan {self.started_at:%Y-%m-%d %H:%M}"
+
+
+# Append-only record of sensitive changes, written in batches by main_app.audit.
+# Actors are stored by id and username rather than a foreign key so entries
+# outlive the users they name.
+class AuditEntry(models.Model):
+    created_at = models.DateTimeField(default=timezone.now)
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    actor_username = models.CharField(max_length=150, blank=True)
+    action = models.CharField(max_length=10, choices=AUDIT_ACTION_CHOICES)
+    resource = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Audit entries are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Audit entries are append-only")
+
+    def __str__(self):
+        return f"{self.action} {self.resource} #{self.object_id} by {self.actor_username or 'system'}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'object_id', 'created_at'], name='audit_object_idx'),
+            models.Index(fields=['actor_id', 'created_at'], name='audit_actor_idx'),
+            models.Index(fields=['created_at', 'id'], name='audit_created_idx'),
+        ]
+
+
+# One row per announcement, written from the request path; the
+# send_notifications worker expands it into per-recipient Notifications.
+class NotificationJob(models.Model):
+    kind = models.CharField(max_length=30, choices=NOTIFICATION_KIND_CHOICES)
+    context = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    recipient_ids = models.JSONField(default=list)
+    expanded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({len(self.recipient_ids)} recipients)"
+
+    class Meta:
+        indexes = [models.Index(fields=['expanded', 'id'], name='notification_job_pending_idx')]
+
+
+class Notification(models.Model):
+    job = models.ForeignKey(
+        NotificationJob, on_delete=models.CASCADE, related_name='notifications')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='notifications')
+    status = models.CharField(
+        max_length=20, choices=DELIVERY_STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.job} -> {self.user_id} ({self.status})"
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx')]
+
+
+# Responses to requests sent with an Idempotency-Key header, replayed on
+# retry (main_app.idempotency). status_code stays null while the first
+# request is still running.
+class IdempotencyRecord(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='idempotency_records')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='uniq_idempotency_key'),
+        ]
+        indexes = [models.Index(fields=['expires_at'], name='idempotency_expiry_idx')]
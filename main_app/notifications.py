@@ -0,0 +1,207 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.db import connection, transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import EventRegistration, Notification, NotificationJob, ProgramApplication
+from .outbox import backoff
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_DEFAULTS = {
+    # Messages per send_messages() call on the shared backend connection
+    "BATCH_SIZE": 100,
+    "FETCH_LIMIT": 1000,
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF_BASE_SECONDS": 30,
+    "BACKOFF_MAX_SECONDS": 3600,
+    "POLL_INTERVAL_SECONDS": 5,
+    # How long a sender holds the notifications it fetched before another may retry them
+    "LEASE_SECONDS": 300,
+}
+
+# kind -> template prefix under templates/notifications/
+TEMPLATES = {
+    "EVENT_UPDATED": "notifications/event_updated",
+    "EVENT_CANCELLED": "notifications/event_cancelled",
+    "APPLICATION_DECIDED": "notifications/application_decided",
+}
+
+
+def notification_settings():
+    return {**NOTIFICATION_DEFAULTS, **getattr(settings, "NOTIFICATIONS", {})}
+
+
+def enqueue(kind, recipient_ids, context):
+    """
+    Queue one notification for each user in `recipient_ids` as a single row.
+
+    Call this inside the transaction that makes the change, so the
+    notification goes out if and only if the change committed.
+    """
+    recipient_ids = sorted(set(recipient_ids))
+    if not recipient_ids:
+        return None
+    return NotificationJob.objects.create(kind=kind, recipient_ids=recipient_ids, context=context)
+
+
+def event_context(event):
+    return {
+        "event_id": event.id,
+        "title": event.title,
+        "when": timezone.localtime(event.event_date).strftime("%Y-%m-%d %H:%M"),
+        "location": event.location,
+        "city": event.city,
+    }
+
+
+def notify_event(event, kind):
+    user_ids = EventRegistration.objects.filter(event=event).values_list("beneficiary__user_id", flat=True)
+    return enqueue(kind, user_ids, event_context(event))
+
+
+def notify_events(events, kind):
+    """Queue one job per event in the `events` queryset that has registrations."""
+    recipients = defaultdict(list)
+    for event_id, user_id in EventRegistration.objects.filter(event__in=events).values_list(
+            "event_id", "beneficiary__user_id"):
+        recipients[event_id].append(user_id)
+    if not recipients:
+        return []
+    return NotificationJob.objects.bulk_create([
+        NotificationJob(kind=kind, recipient_ids=sorted(set(recipients[event.id])), context=event_context(event))
+        for event in events.filter(id__in=list(recipients))
+    ])
+
+
+def notify_decision(application):
+    user_id, program = ProgramApplication.objects.filter(id=application.id).values_list(
+        "beneficiary__user_id", "program__name").get()
+    return enqueue("APPLICATION_DECIDED", [user_id], {
+        "application_id": application.id,
+        "program": program,
+        "status": application.get_status_display(),
+        "notes": application.review_notes,
+    })
+
+
+class Sender:
+    """
+    Expands queued jobs into per-recipient rows and sends the due ones in
+    batches over a single email backend connection. Templates are loaded
+    once per kind per pass.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or notification_settings()
+
+    def expand(self):
+        expanded = 0
+        for job in NotificationJob.objects.filter(expanded=False).order_by("id")[:self.config["FETCH_LIMIT"]]:
+            with transaction.atomic():
+                # Another worker may have taken this job since it was read
+                if not NotificationJob.objects.filter(id=job.id, expanded=False).update(expanded=True):
+                    continue
+                for start in range(0, len(job.recipient_ids), self.config["FETCH_LIMIT"]):
+                    chunk = job.recipient_ids[start:start + self.config["FETCH_LIMIT"]]
+                    user_ids = User.objects.filter(id__in=chunk, is_active=True).exclude(email="") \
+                        .values_list("id", flat=True)
+                    Notification.objects.bulk_create([Notification(job=job, user_id=id) for id in user_ids])
+            expanded += 1
+        return expanded
+
+    def due(self):
+        """
+        Lease up to FETCH_LIMIT due notifications to this sender by moving
+        their next_attempt_at LEASE_SECONDS ahead, so concurrent senders
+        take disjoint rows. If the sender dies mid-pass they fall due again
+        when the lease runs out.
+
+        On PostgreSQL candidates are locked with FOR UPDATE SKIP LOCKED.
+        Elsewhere a single conditional UPDATE leases them; it re-checks the
+        due condition, so rows another sender leased first are left out.
+        """
+        now = timezone.now()
+        lease = now + timedelta(seconds=self.config["LEASE_SECONDS"])
+        candidates = Notification.objects.filter(status="PENDING", next_attempt_at__lte=now).order_by("id")
+        with transaction.atomic():
+            if connection.features.has_select_for_update_skip_locked:
+                ids = list(candidates.select_for_update(skip_locked=True)
+                           .values_list("id", flat=True)[:self.config["FETCH_LIMIT"]])
+                Notification.objects.filter(id__in=ids).update(next_attempt_at=lease)
+            else:
+                Notification.objects.filter(status="PENDING", next_attempt_at__lte=now, id__in=candidates.values(
+                    "id")[:self.config["FETCH_LIMIT"]]).update(next_attempt_at=lease)
+                ids = list(Notification.objects.filter(status="PENDING", next_attempt_at=lease)
+                           .values_list("id", flat=True))
+        return list(Notification.objects.filter(id__in=ids).select_related("job", "user").order_by("id"))
+
+    def render(self, notifications):
+        templates = {}
+        messages = []
+        for n in notifications:
+            kind = n.job.kind
+            if kind not in templates:
+                prefix = TEMPLATES[kind]
+                templates[kind] = (get_template(f"{prefix}_subject.txt"), get_template(f"{prefix}_body.txt"))
+            subject, body = templates[kind]
+            context = {**n.job.context, "name": n.user.first_name or n.user.username}
+            messages.append(mail.EmailMessage(
+                " ".join(subject.render(context).split()), body.render(context), to=[n.user.email]))
+        return messages
+
+    def run_once(self):
+        self.expand()
+        notifications = self.due()
+        if not notifications:
+            return {"sent": 0, "failed": 0}
+
+        messages = self.render(notifications)
+        size = max(1, self.config["BATCH_SIZE"])
+        results = []
+        connection = mail.get_connection(fail_silently=False)
+        try:
+            connection.open()
+            for start in range(0, len(notifications), size):
+                chunk = notifications[start:start + size]
+                try:
+                    connection.send_messages(messages[start:start + size])
+                    results.append((chunk, None))
+                except Exception as e:
+                    results.append((chunk, f"{type(e).__name__}: {e}"))
+        except Exception as e:
+            done = sum(len(chunk) for chunk, _ in results)
+            results.append((notifications[done:], f"{type(e).__name__}: {e}"))
+        finally:
+            connection.close()
+        return self.record(results)
+
+    def record(self, results):
+        now = timezone.now()
+        sent, failed = [], []
+        for chunk, error in results:
+            if error is None:
+                sent.extend(n.id for n in chunk)
+                continue
+            for n in chunk:
+                n.attempts += 1
+                n.last_error = error[:1000]
+                if n.attempts >= self.config["MAX_ATTEMPTS"]:
+                    n.status = "FAILED"
+                else:
+                    n.next_attempt_at = now + backoff(n.attempts, self.config)
+                failed.append(n)
+            logger.warning("Notification batch of %s failed: %s", len(chunk), error)
+
+        if sent:
+            Notification.objects.filter(id__in=sent).update(status="DELIVERED", sent_at=now, last_error="")
+        if failed:
+            Notification.objects.bulk_update(
+                failed, ["attempts", "last_error", "status", "next_attempt_at"], batch_size=500)
+        return {"sent": len(sent), "failed": len(failed)}
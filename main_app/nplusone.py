@@ -0,0 +1,99 @@
+import logging
+import os
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils.regex_helper import _lazy_re_compile
+
+from .querylog import fingerprint
+
+logger = logging.getLogger(__name__)
+
+NPLUSONE_DEFAULTS = {
+    "ENABLED": False,
+    # Statements of one shape a request may run before it is reported
+    "THRESHOLD": 5,
+    # "warn" logs the offenders; "raise" fails the request, and with it the test that made it
+    "ACTION": "warn",
+    # View class name -> digests or fragments of the normalized SQL it may repeat, or "*" for any
+    "ALLOWLIST": {},
+    "STACK_DEPTH": 6,
+}
+
+_TRANSACTION_CONTROL = _lazy_re_compile(r"\s*(SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)\b")
+_HERE = (os.path.abspath(__file__), os.path.abspath(os.path.join(os.path.dirname(__file__), "querylog.py")))
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def nplusone_settings():
+    return {**NPLUSONE_DEFAULTS, **getattr(settings, "NPLUSONE", {})}
+
+
+def call_site(depth):
+    """The innermost project frames of the current stack, skipping Django, libraries and this module."""
+    root = os.path.abspath(settings.BASE_DIR)
+    frames = [f for f in traceback.extract_stack()
+              if f.filename.startswith(root) and f.filename not in _HERE and "site-packages" not in f.filename]
+    return [f"{os.path.relpath(f.filename, root)}:{f.lineno} in {f.name}: {f.line}" for f in frames[-depth:]]
+
+
+class Detector:
+    """Execute wrapper counting statements by fingerprint; keeps the stack of the first repeat."""
+
+    def __init__(self, config):
+        self.config = config
+        self.groups = {}
+        self.view = self.url_name = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _TRANSACTION_CONTROL.match(sql):
+            digest, normalized = fingerprint(sql)
+            group = self.groups.setdefault(digest, {"sql": normalized, "count": 0, "stack": None})
+            group["count"] += 1
+            if group["count"] == 2:
+                group["stack"] = call_site(self.config["STACK_DEPTH"])
+        return execute(sql, params, many, context)
+
+    def offenders(self):
+        allowed = self.config["ALLOWLIST"].get(self.view, ()) if self.view else ()
+        return [
+            {"digest": digest, **group} for digest, group in self.groups.items()
+            if group["count"] >= self.config["THRESHOLD"]
+            and "*" not in allowed and not any(a == digest or a in group["sql"] for a in allowed)
+        ]
+
+    def report(self):
+        offenders = self.offenders()
+        if not offenders:
+            return
+        where = f"{self.view} ({self.url_name})" if self.url_name else self.view or "this block"
+        lines = [f"Repeated queries in {where}:"]
+        for o in sorted(offenders, key=lambda o: -o["count"]):
+            lines.append(f"  {o['count']}x [{o['digest']}] {o['sql'][:300]}")
+            lines.extend(f"      {frame}" for frame in o["stack"] or [])
+        message = "\n".join(lines)
+        if self.config["ACTION"] == "raise":
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+@contextmanager
+def detect(config=None, using=None):
+    """
+    Count the statements run inside the block and report shapes repeated
+    THRESHOLD or more times, e.g. around a test:
+
+        with nplusone.detect():
+            self.client.get(url)
+    """
+    detector = Detector(config or nplusone_settings())
+    with ExitStack() as stack:
+        for alias in ([using] if using else connections):
+            stack.enter_context(connections[alias].execute_wrapper(detector))
+        yield detector
+    detector.report()
@@ -0,0 +1,224 @@
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from queue import Empty, SimpleQueue
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxEvent, WebhookDelivery, WebhookEndpoint
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DEFAULTS = {
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF_BASE_SECONDS": 5,
+    "BACKOFF_MAX_SECONDS": 3600,
+    "TIMEOUT_SECONDS": 10,
+    "FETCH_LIMIT": 1000,
+    "POLL_INTERVAL_SECONDS": 2,
+    # How long a dispatcher holds the deliveries it fetched before another may retry them
+    "LEASE_SECONDS": 300,
+    # Delivered deliveries, and events with nothing left to deliver, are
+    # removed by manage.py clear_outbox once this old.
+    "RETENTION_DAYS": 30,
+}
+
+SIGNATURE_HEADER = "X-Sila-Signature"
+
+
+def outbox_settings():
+    return {**OUTBOX_DEFAULTS, **getattr(settings, "OUTBOX", {})}
+
+
+def enqueue(event_type, payload):
+    """
+    Record an event and one pending delivery per subscribed endpoint.
+
+    Call this inside the transaction that makes the domain change, so the
+    event exists if and only if the change committed.
+    """
+    event = OutboxEvent.objects.create(event_type=event_type, payload=payload)
+    endpoints = [
+        e for e in WebhookEndpoint.objects.filter(is_active=True).only("id", "event_types")
+        if not e.event_types or event_type in e.event_types
+    ]
+    WebhookDelivery.objects.bulk_create(
+        [WebhookDelivery(event=event, endpoint=e) for e in endpoints])
+    return event
+
+
+def application_payload(application):
+    return {
+        "application_id": application.id,
+        "program_id": application.program_id,
+        "beneficiary_id": application.beneficiary_id,
+        "status": application.status,
+        "submitted_at": application.submitted_at,
+        "reviewed_at": application.reviewed_at,
+    }
+
+
+def registration_payload(registration):
+    return {
+        "registration_id": registration.id,
+        "event_id": registration.event_id,
+        "beneficiary_id": registration.beneficiary_id,
+        "attended": registration.attended,
+        "registered_at": registration.registered_at,
+    }
+
+
+def backoff(attempts, config):
+    delay = min(config["BACKOFF_MAX_SECONDS"], config["BACKOFF_BASE_SECONDS"] * 2 ** (attempts - 1))
+    # Full jitter keeps retries from a failed endpoint from arriving in lockstep
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def purge_delivered(now=None):
+    """Delete deliveries delivered before the retention window, then events older than it with none left."""
+    cutoff = (now or timezone.now()) - timedelta(days=outbox_settings()["RETENTION_DAYS"])
+    deliveries = WebhookDelivery.objects.filter(status="DELIVERED", delivered_at__lt=cutoff).delete()[0]
+    events = OutboxEvent.objects.filter(created_at__lt=cutoff, deliveries__isnull=True).delete()[0]
+    return deliveries, events
+
+
+def sign(secret, body):
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def post_batch(endpoint, deliveries, timeout):
+    body = json.dumps({
+        "deliveries": [
+            {"id": d.id, "event_id": d.event_id, "type": d.event.event_type,
+             "created_at": d.event.created_at, "attempt": d.attempts + 1, "payload": d.event.payload}
+            for d in deliveries
+        ]
+    }, cls=DjangoJSONEncoder).encode()
+    request = urllib.request.Request(endpoint.url, data=body, method="POST")
+    request.add_header("Content-Type", "application/json")
+    if endpoint.secret:
+        request.add_header(SIGNATURE_HEADER, sign(endpoint.secret, body))
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+        return None
+    except urllib.error.HTTPError as e:
+        return f"HTTP {e.code}"
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+class Dispatcher:
+    """
+    Delivers pending webhook deliveries in batches.
+
+    HTTP calls run on worker threads, at most endpoint.max_concurrency at a
+    time per endpoint; all database reads and writes stay on the calling
+    thread.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or outbox_settings()
+
+    def due(self):
+        """
+        Lease up to FETCH_LIMIT due deliveries to this dispatcher by moving
+        their next_attempt_at LEASE_SECONDS ahead, so concurrent dispatchers
+        (old and new during a deploy) never POST the same delivery twice.
+        Uses FOR UPDATE SKIP LOCKED where supported and a conditional
+        UPDATE elsewhere, as notifications.Sender.due() does.
+        """
+        now = timezone.now()
+        lease = now + timedelta(seconds=self.config["LEASE_SECONDS"])
+        due = Q(status="PENDING", next_attempt_at__lte=now, endpoint__is_active=True)
+        candidates = WebhookDelivery.objects.filter(due).order_by("id")
+        with transaction.atomic():
+            if connection.features.has_select_for_update_skip_locked:
+                ids = list(candidates.select_for_update(skip_locked=True, of=("self",))
+                           .values_list("id", flat=True)[:self.config["FETCH_LIMIT"]])
+                WebhookDelivery.objects.filter(id__in=ids).update(next_attempt_at=lease)
+            else:
+                WebhookDelivery.objects.filter(due, id__in=candidates.values(
+                    "id")[:self.config["FETCH_LIMIT"]]).update(next_attempt_at=lease)
+                ids = list(WebhookDelivery.objects.filter(status="PENDING", next_attempt_at=lease)
+                           .values_list("id", flat=True))
+        return list(WebhookDelivery.objects.filter(id__in=ids).select_related("event", "endpoint").order_by("id"))
+
+    def run_once(self):
+        deliveries = self.due()
+        if not deliveries:
+            return {"delivered": 0, "failed": 0}
+
+        lanes = defaultdict(list)
+        for d in deliveries:
+            lanes[d.endpoint_id].append(d)
+        endpoints = {d.endpoint_id: d.endpoint for d in deliveries}
+
+        workers, per_endpoint = 0, {}
+        for endpoint_id, items in lanes.items():
+            endpoint = endpoints[endpoint_id]
+            size = max(1, endpoint.batch_size)
+            queue = SimpleQueue()
+            chunks = [items[i:i + size] for i in range(0, len(items), size)]
+            for chunk in chunks:
+                queue.put(chunk)
+            lanes_for_endpoint = max(1, min(endpoint.max_concurrency, len(chunks)))
+            per_endpoint[endpoint_id] = (endpoint, queue, lanes_for_endpoint)
+            workers += lanes_for_endpoint
+
+        results = []
+        lock = threading.Lock()
+
+        def drain(endpoint, queue):
+            while True:
+                try:
+                    chunk = queue.get_nowait()
+                except Empty:
+                    return
+                error = post_batch(endpoint, chunk, self.config["TIMEOUT_SECONDS"])
+                with lock:
+                    results.append((chunk, error))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for endpoint, queue, lanes_for_endpoint in per_endpoint.values():
+                for _ in range(lanes_for_endpoint):
+                    pool.submit(drain, endpoint, queue)
+
+        return self.record(results)
+
+    def record(self, results):
+        now = timezone.now()
+        delivered, failed = [], []
+        for chunk, error in results:
+            if error is None:
+                delivered.extend(d.id for d in chunk)
+                continue
+            for d in chunk:
+                d.attempts += 1
+                d.last_error = error[:1000]
+                if d.attempts >= self.config["MAX_ATTEMPTS"]:
+                    d.status = "FAILED"
+                else:
+                    d.next_attempt_at = now + backoff(d.attempts, self.config)
+                failed.append(d)
+            logger.warning("Webhook batch to %s failed: %s", chunk[0].endpoint.url, error)
+
+        if delivered:
+            WebhookDelivery.objects.filter(id__in=delivered).update(
+                status="DELIVERED", delivered_at=now, last_error="")
+        if failed:
+            WebhookDelivery.objects.bulk_update(
+                failed, ["attempts", "last_error", "status", "next_attempt_at"], batch_size=500)
+        return {"delivered": len(delivered), "failed": len(failed)}
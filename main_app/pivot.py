@@ -0,0 +1,113 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Avg, Count, DateField, DurationField, F
+from django.db.models.functions import TruncMonth
+
+from .models import Beneficiary, ProgramApplication
+
+PIVOT_DEFAULTS = {
+    "MAX_DIMENSIONS": 3,
+    "MAX_ROWS": 1000,
+}
+
+Dimension = namedtuple("Dimension", "key label")
+Measure = namedtuple("Measure", "aggregate convert")
+Fact = namedtuple("Fact", "model date_field charity_field dimensions measures")
+
+
+def _days(value):
+    return round(value.total_seconds() / 86400, 1) if value is not None else None
+
+
+def _rounded(value):
+    return round(float(value), 2) if value is not None else None
+
+
+FACTS = {
+    "applications": Fact(ProgramApplication, "submitted_at", "beneficiary__charity_id", {
+        "program": Dimension(F("program_id"), "program__name"),
+        "status": Dimension(F("status"), None),
+        "charity": Dimension(F("beneficiary__charity_id"), "beneficiary__charity__name"),
+        "charity_type": Dimension(F("beneficiary__charity__charity_type"), None),
+        "region": Dimension(F("beneficiary__region"), None),
+        "city": Dimension(F("beneficiary__city"), None),
+        "month": Dimension(TruncMonth("submitted_at", output_field=DateField()), None),
+    }, {
+        "count": Measure(Count("pk"), None),
+        "beneficiaries": Measure(Count("beneficiary_id", distinct=True), None),
+        "avg_processing_days": Measure(
+            Avg(F("reviewed_at") - F("submitted_at"), output_field=DurationField()), _days),
+    }),
+    "beneficiaries": Fact(Beneficiary, "created_at", "charity_id", {
+        "charity": Dimension(F("charity_id"), "charity__name"),
+        "charity_type": Dimension(F("charity__charity_type"), None),
+        "region": Dimension(F("region"), None),
+        "city": Dimension(F("city"), None),
+        "active": Dimension(F("is_active"), None),
+        "month": Dimension(TruncMonth("created_at", output_field=DateField()), None),
+    }, {
+        "count": Measure(Count("pk"), None),
+        "avg_monthly_income": Measure(Avg("monthly_income"), _rounded),
+        "avg_family_size": Measure(Avg("family_size"), _rounded),
+    }),
+}
+
+
+class PivotError(ValueError):
+    pass
+
+
+def pivot_settings():
+    return {**PIVOT_DEFAULTS, **getattr(settings, "PIVOT", {})}
+
+
+def parse_names(value, allowed, kind):
+    names = [n for n in (value or "").split(",") if n]
+    unknown = [n for n in names if n not in allowed]
+    if unknown:
+        raise PivotError(f"Unknown {kind} {', '.join(unknown)}; choose from {', '.join(allowed)}")
+    if len(set(names)) != len(names):
+        raise PivotError(f"Repeated {kind}")
+    return names
+
+
+def pivot(queryset, fact, dimensions, measures):
+    """
+    Group `queryset` by up to MAX_DIMENSIONS whitelisted dimensions of
+    `fact` and compute the requested measures in one GROUP BY query.
+
+    Rows come back largest first by the first measure and are capped at
+    MAX_ROWS; "truncated" says whether more groups existed.
+    """
+    config = pivot_settings()
+    if not 1 <= len(dimensions) <= config["MAX_DIMENSIONS"]:
+        raise PivotError(f"Choose between 1 and {config['MAX_DIMENSIONS']} dimensions")
+    if not measures:
+        raise PivotError("Choose at least one measure")
+
+    # Aliases are prefixed so they cannot clash with model field names.
+    columns = {}
+    for name in dimensions:
+        dimension = fact.dimensions[name]
+        columns[f"d_{name}"] = dimension.key
+        if dimension.label:
+            columns[f"d_{name}_label"] = F(dimension.label)
+    aggregates = {f"m_{name}": fact.measures[name].aggregate for name in measures}
+    ordering = [F(f"m_{measures[0]}").desc(nulls_last=True)] + [f"d_{name}" for name in dimensions]
+    rows = list(queryset.order_by().values(**columns).annotate(**aggregates)
+                .order_by(*ordering)[:config["MAX_ROWS"] + 1])
+
+    result = []
+    for row in rows[:config["MAX_ROWS"]]:
+        item = {}
+        for name in dimensions:
+            item[name] = row[f"d_{name}"]
+            if fact.dimensions[name].label:
+                item[f"{name}_label"] = row[f"d_{name}_label"]
+        for name in measures:
+            convert = fact.measures[name].convert
+            item[name] = convert(row[f"m_{name}"]) if convert else row[f"m_{name}"]
+        result.append(item)
+    return {"dimensions": dimensions, "measures": measures, "rows": result,
+            "truncated": len(rows) > config["MAX_ROWS"]}
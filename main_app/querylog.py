@@ -0,0 +1,215 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from django.utils.regex_helper import _lazy_re_compile
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_DEFAULTS = {
+    # None turns the log off
+    "THRESHOLD_MS": 200,
+    "EXPLAIN": True,
+    # Entries are aggregated in memory and written, with their plans, by a
+    # background thread this often; None leaves them for flush() or exit.
+    "FLUSH_INTERVAL_SECONDS": 10,
+    # Defaults to logs/slow_queries.log under BASE_DIR
+    "PATH": None,
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+}
+
+_STRING = _lazy_re_compile(r"'(?:[^']|'')*'")
+_NUMBER = _lazy_re_compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = _lazy_re_compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_LISTS = _lazy_re_compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = _lazy_re_compile(r"\s+")
+_EXPLAINABLE = _lazy_re_compile(r"\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+
+# {"url_name", "view"} of the request running in this context; set by QueryContextMiddleware
+query_context = ContextVar("query_context", default=None)
+
+
+def slow_query_settings():
+    config = {**SLOW_QUERY_DEFAULTS, **getattr(settings, "SLOW_QUERY_LOG", {})}
+    config["PATH"] = config["PATH"] or os.path.join(settings.BASE_DIR, "logs", "slow_queries.log")
+    return config
+
+
+def normalize(sql):
+    """SQL with literals and parameters replaced by ?, and IN lists and VALUES rows of any length folded."""
+    sql = _STRING.sub("?", sql).replace("%s", "?")
+    sql = _NUMBER.sub("?", sql)
+    sql = _LISTS.sub("(...)", _LIST.sub("(...)", sql))
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    """(digest, normalized SQL); queries that differ only in their values share a digest."""
+    normalized = normalize(sql)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16], normalized
+
+
+def view_label(view_func):
+    view = getattr(view_func, "view_class", None) or view_func
+    return getattr(view, "__name__", repr(view))
+
+
+def explain(alias, sql, params):
+    if not _EXPLAINABLE.match(sql):
+        return None
+    connection = connections[alias]
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            rows = cursor.fetchall()
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        _local.explaining = False
+    # SQLite returns (id, parent, notused, detail) rows; other backends one text column
+    return "\n".join(str(row[-1]) if connection.vendor == "sqlite" else " ".join(map(str, row)) for row in rows)
+
+
+class Recorder:
+    """
+    Process-wide aggregate of slow statements keyed by fingerprint and
+    view. A background thread periodically runs EXPLAIN for each new
+    fingerprint, on its own connection, and appends one JSON line per key
+    to a rotating log file, so the request that was slow pays only for a
+    dictionary update.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.explained = set()
+        self.lock = threading.Lock()
+        self.flusher = None
+        self.handler = None
+
+    def add(self, alias, sql, params, many, elapsed_ms):
+        digest, normalized = fingerprint(sql)
+        request = query_context.get() or {}
+        url_name, view = request.get("url_name"), request.get("view")
+        config = slow_query_settings()
+        with self.lock:
+            entry = self.entries.get((digest, url_name, view))
+            if entry is None:
+                entry = self.entries[(digest, url_name, view)] = {
+                    "sql": normalized, "alias": alias, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    # Only used to EXPLAIN the statement, never written out
+                    "raw": None if many else (sql, params),
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            if config["FLUSH_INTERVAL_SECONDS"] and self.flusher is None:
+                self.flusher = threading.Thread(target=self.run, daemon=True, name="slow-query-flusher")
+                self.flusher.start()
+
+    def log_handler(self, config):
+        if self.handler is None or self.handler.baseFilename != os.path.abspath(config["PATH"]):
+            os.makedirs(os.path.dirname(config["PATH"]), exist_ok=True)
+            self.handler = RotatingFileHandler(config["PATH"], maxBytes=config["MAX_BYTES"],
+                                               backupCount=config["BACKUP_COUNT"], encoding="utf-8")
+        return self.handler
+
+    def flush(self):
+        with self.lock:
+            entries, self.entries = self.entries, {}
+        if not entries:
+            return 0
+        config = slow_query_settings()
+        handler = self.log_handler(config)
+        now = timezone.now().isoformat()
+        for (digest, url_name, view), entry in entries.items():
+            plan = None
+            if config["EXPLAIN"] and entry["raw"] and digest not in self.explained:
+                plan = explain(entry["alias"], *entry["raw"])
+                self.explained.add(digest)
+            line = {"at": now, "digest": digest, "url_name": url_name, "view": view, "alias": entry["alias"],
+                    "count": entry["count"], "total_ms": round(entry["total_ms"], 2),
+                    "max_ms": round(entry["max_ms"], 2), "sql": entry["sql"], "plan": plan}
+            handler.emit(logging.makeLogRecord({"msg": json.dumps(line), "levelno": logging.INFO}))
+        return len(entries)
+
+    def run(self):
+        try:
+            while True:
+                time.sleep(slow_query_settings()["FLUSH_INTERVAL_SECONDS"] or 1)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Slow query log flush failed")
+                finally:
+                    connections.close_all()
+        finally:
+            with self.lock:
+                self.flusher = None
+
+
+recorder = Recorder()
+atexit.register(recorder.flush)
+_local = threading.local()
+
+
+def capture(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        threshold = getattr(settings, "SLOW_QUERY_LOG", {}).get("THRESHOLD_MS", SLOW_QUERY_DEFAULTS["THRESHOLD_MS"])
+        if threshold is not None and elapsed_ms >= threshold and not getattr(_local, "explaining", False):
+            recorder.add(context["connection"].alias, sql, params, many, elapsed_ms)
+
+
+def install(sender, connection, **kwargs):
+    if capture not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture)
+
+
+def read_log(path, backups):
+    """Entries of the log file and its rotated backups, oldest first."""
+    for name in [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries):
+    """Aggregate log entries by fingerprint, with the views each statement ran under and its latest plan."""
+    offenders = {}
+    for e in entries:
+        o = offenders.setdefault(e["digest"], {"digest": e["digest"], "sql": e["sql"], "count": 0, "total_ms": 0.0,
+                                               "max_ms": 0.0, "views": {}, "plan": None, "last_seen": None})
+        o["count"] += e["count"]
+        o["total_ms"] += e["total_ms"]
+        o["max_ms"] = max(o["max_ms"], e["max_ms"])
+        label = f"{e['view']} ({e['url_name']})" if e["url_name"] else e["view"] or "outside a request"
+        o["views"][label] = o["views"].get(label, 0) + e["count"]
+        o["plan"] = e["plan"] or o["plan"]
+        o["last_seen"] = e["at"]
+    for o in offenders.values():
+        o["mean_ms"] = o["total_ms"] / o["count"]
+    return list(offenders.values())
+
+
+connection_created.connect(install, dispatch_uid="slow_query_log")
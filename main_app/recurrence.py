@@ -0,0 +1,148 @@
+import calendar
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Event, EventSeries
+from .notifications import notify_events
+
+SERIES_DEFAULTS = {
+    # Occurrences exist this far ahead of now
+    "HORIZON_DAYS": 365,
+    # A series is extended once its horizon is this much shorter than HORIZON_DAYS
+    "REFRESH_DAYS": 7,
+    "BATCH_SIZE": 500,
+}
+
+# Copied from the series onto each occurrence and kept in step on edits
+DETAIL_FIELDS = ("title", "description", "location", "city", "max_capacity", "is_active")
+SCHEDULE_FIELDS = ("starts_at", "frequency", "interval")
+NOTIFIED_FIELDS = ("title", "location", "city")
+
+
+def series_settings():
+    return {**SERIES_DEFAULTS, **getattr(settings, "EVENT_SERIES", {})}
+
+
+def nth_occurrence(series, n):
+    """The n-th (0-based) occurrence, keeping the first one's local wall-clock time."""
+    first = timezone.localtime(series.starts_at)
+    if series.frequency == "MONTHLY":
+        months = first.month - 1 + n * series.interval
+        year, month = first.year + months // 12, months % 12 + 1
+        day = min(first.day, calendar.monthrange(year, month)[1])
+        local = first.replace(tzinfo=None, year=year, month=month, day=day)
+    else:
+        days = n * series.interval * (7 if series.frequency == "WEEKLY" else 1)
+        local = first.replace(tzinfo=None) + timedelta(days=days)
+    return timezone.make_aware(local, first.tzinfo)
+
+
+def occurrence_dates(series, after, end):
+    """Occurrences strictly after `after` and no later than `end`."""
+    first = series.starts_at
+    n = 0
+    if after >= first:
+        # Start just before `after` and step forward; DST shifts make the estimate inexact.
+        if series.frequency == "MONTHLY":
+            local_after, local_first = timezone.localtime(after), timezone.localtime(first)
+            n = ((local_after.year - local_first.year) * 12 + local_after.month - local_first.month) // series.interval
+        else:
+            step = series.interval * (7 if series.frequency == "WEEKLY" else 1)
+            n = (after - first).days // step
+        n = max(0, n - 1)
+    while nth_occurrence(series, n) <= after:
+        n += 1
+    while True:
+        moment = nth_occurrence(series, n)
+        if moment > end:
+            return
+        yield moment
+        n += 1
+
+
+def horizon_end(series, now, config):
+    end = now + timedelta(days=config["HORIZON_DAYS"])
+    if series.until:
+        end = min(end, timezone.make_aware(datetime.combine(series.until, dt_time.max)))
+    return end
+
+
+def extend(series, now=None, config=None):
+    """
+    Create the occurrences between the series' generated_until and the
+    horizon in one bulk insert. Returns how many were created.
+    """
+    config = config or series_settings()
+    now = now or timezone.now()
+    end = horizon_end(series, now, config)
+    # A new series starting in the past only gets its upcoming occurrences
+    after = series.generated_until or max(series.starts_at - timedelta(microseconds=1), now)
+    if end <= after:
+        return 0
+    with transaction.atomic():
+        # Claims the window; a concurrent extension of the same series updates nothing and stops
+        if not EventSeries.objects.filter(id=series.id, generated_until=series.generated_until).update(
+                generated_until=end, updated_at=now):
+            return 0
+        details = {f: getattr(series, f) for f in DETAIL_FIELDS}
+        events = Event.objects.bulk_create(
+            [Event(charity_id=series.charity_id, series=series, event_date=moment, **details)
+             for moment in occurrence_dates(series, after, end)],
+            batch_size=config["BATCH_SIZE"])
+    series.generated_until = end
+    return len(events)
+
+
+def extend_due(now=None):
+    """Extend every active series whose horizon has fallen behind; one query when none has."""
+    config = series_settings()
+    now = now or timezone.now()
+    cutoff = now + timedelta(days=config["HORIZON_DAYS"] - config["REFRESH_DAYS"])
+    due = EventSeries.objects.filter(is_active=True, generated_until__lt=cutoff).filter(
+        Q(until__isnull=True) | Q(until__gt=timezone.localdate(now)))
+    return sum(extend(series, now, config) for series in due)
+
+
+def future_occurrences(series, now):
+    return Event.objects.filter(series=series, event_date__gt=now)
+
+
+def apply_changes(series, before, now=None):
+    """
+    Bring future occurrences in line with an edited series: detail fields
+    with one UPDATE, a shortened `until` by deleting what falls after it,
+    and a lengthened one by extending. Registrants of changed occurrences
+    are notified.
+    """
+    now = now or timezone.now()
+    changed = [f for f in DETAIL_FIELDS if before[f] != getattr(series, f)]
+    future = future_occurrences(series, now)
+    if changed:
+        future.update(**{f: getattr(series, f) for f in changed}, updated_at=now)
+        if "is_active" in changed and not series.is_active:
+            notify_events(future, "EVENT_CANCELLED")
+        elif series.is_active and any(f in changed for f in NOTIFIED_FIELDS):
+            notify_events(future, "EVENT_UPDATED")
+
+    if before["until"] != series.until:
+        config = series_settings()
+        end = horizon_end(series, now, config)
+        if series.generated_until and series.generated_until > end:
+            dropped = future.filter(event_date__gt=end)
+            notify_events(dropped, "EVENT_CANCELLED")
+            dropped.delete()
+            series.generated_until = end
+            EventSeries.objects.filter(id=series.id).update(generated_until=end)
+        extend(series, now, config)
+
+
+def delete_series(series, now=None):
+    """Cancel and delete future occurrences; past ones stay as standalone events."""
+    future = future_occurrences(series, now or timezone.now())
+    notify_events(future, "EVENT_CANCELLED")
+    future.delete()
+    series.delete()
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Charity, Beneficiary, Program, Event, EventRegistration, ProgramApplication
+from .appdata import AppDataError, validate_keys
+from .models import (
+    Charity, Beneficiary, Program, Event, EventSeries, EventRegistration, ProgramApplication, DocumentUpload, AuditEntry
+)
+from .recurrence import SCHEDULE_FIELDS
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -35,6 +39,12 @@ class ProgramSerializer(serializers.ModelSerializer):
         model = Program
         fields = "__all__"
 
+    def validate_indexed_data_keys(self, value):
+        try:
+            return validate_keys(value)
+        except AppDataError as e:
+            raise serializers.ValidationError(str(e))
+
 
 class EventSerializer(serializers.ModelSerializer):
     
@@ -43,6 +53,29 @@ class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = "__all__"
+        read_only_fields = ("series",)
+
+
+class EventSeriesSerializer(serializers.ModelSerializer):
+    charity_name = serializers.CharField(source='charity.name', read_only=True)
+
+    class Meta:
+        model = EventSeries
+        fields = "__all__"
+        read_only_fields = ("generated_until",)
+
+    def validate_interval(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Interval must be at least 1")
+        return value
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            changed = [f for f in SCHEDULE_FIELDS if f in attrs and attrs[f] != getattr(self.instance, f)]
+            if changed:
+                raise serializers.ValidationError(
+                    f"{', '.join(changed)} can't be changed; end this series and create a new one")
+        return attrs
 
 
 class EventRegistrationSerializer(serializers.ModelSerializer):
@@ -56,3 +89,19 @@ class ProgramApplicationSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProgramApplication
         fields = "__all__"
+        read_only_fields = ("claimed_by", "claim_expires_at")
+
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+    sha256 = serializers.CharField(source='document.sha256', read_only=True, default=None)
+
+    class Meta:
+        model = DocumentUpload
+        fields = ("id", "filename", "content_type", "size", "offset", "status", "sha256", "expires_at")
+
+
+class AuditEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditEntry
+        fields = "__all__"
@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, pre_delete
+
+from . import live, outbox
+from .archive import record_cascade_tombstones
+from .history import record_transition
+from .models import EventRegistration, ProgramApplication
+
+
+# Feed models write their own tombstones on delete (TombstonedModel); a
+# deleted user takes its charity and beneficiary rows with it, so those
+# are tombstoned here, once per user rather than per cascaded row.
+def user_deleting(sender, instance, **kwargs):
+    record_cascade_tombstones(User._base_manager.filter(pk=instance.pk))
+
+
+pre_delete.connect(user_deleting, sender=User, dispatch_uid="tombstone_user_cascade")
+
+
+# Outbox events are written by the same save() that changes the row, so they
+# commit or roll back together with it when the caller is in a transaction.
+def application_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_loaded_status", None)
+    if created:
+        record_transition(instance, None, created)
+        live.announce(outbox.enqueue("application.submitted", outbox.application_payload(instance)))
+    elif previous is not None and previous != instance.status:
+        record_transition(instance, previous, created)
+        payload = outbox.application_payload(instance)
+        payload["previous_status"] = previous
+        live.announce(outbox.enqueue("application.status_changed", payload))
+    instance._loaded_status = instance.status
+
+
+def registration_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_loaded_attended", None)
+    if created:
+        live.announce(outbox.enqueue("registration.created", outbox.registration_payload(instance)))
+    elif previous is not None and previous != instance.attended:
+        live.announce(outbox.enqueue("registration.attendance_changed", outbox.registration_payload(instance)))
+    instance._loaded_attended = instance.attended
+
+
+post_save.connect(application_saved, sender=ProgramApplication, dispatch_uid="outbox_application")
+post_save.connect(registration_saved, sender=EventRegistration, dispatch_uid="outbox_registration")
@@ -1,10 +1,63 @@
 # backend/main_app/tests/test_auth.py
 
+import gzip
+import hashlib
+import hmac
+import json
+import shutil
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.http import FileResponse, StreamingHttpResponse
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth.models import User
 
+from . import audit, columnar, exports, nplusone, querylog
+from .appdata import TABLE, AppDataError, key_sql, sync_indexes
+from .archive import archivable_applications, purge
+from .changes import feed_settings
+from .dedup import detect
+from .hashers import TunablePBKDF2PasswordHasher
+from .live import LocalBroker, OutboxBroker, get_broker, route
+from .middleware import QueryContextMiddleware, negotiate_encoding
+from .notifications import Sender, notify_decision
+from .paginators import EstimatedCountPaginator
+from .recurrence import extend_due
+from .models import (
+    Charity, Beneficiary, Program, Event, EventRegistration, ProgramApplication, WebhookDelivery,
+    WebhookEndpoint, StoredDocument, Tombstone, ArchivedProgramApplication, ArchivedEventRegistration,
+    DuplicateCandidate, AuditEntry, Notification, NotificationJob, IdempotencyRecord, EventSeries,
+    ApplicationStatusChange, OutboxEvent
+)
+from .outbox import Dispatcher, outbox_settings, purge_delivered
+from .renderers import FastJSONRenderer
+from .throttling import IPRateThrottle, parse_rate
+from .timeseries import SOURCES, time_series
+from .workqueue import claim
+
 
 class AuthTests(APITestCase):
 
@@ -57,6 +110,34 @@ class AuthTests(APITestCase):
         res = self.client.post(self.login_url, data, format="json")
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_login_single_query_case_insensitive(self):
+        charity = make_charity("Login Charity", admin_user=self.user)
+        with self.assertNumQueries(1):
+            res = self.client.post(self.login_url, {"email": " TEST@Example.com", "password": "testpass123"},
+                                   format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["user"]["charity_admin"]["id"], charity.id)
+
+    def test_login_duplicate_email_prefers_active_then_oldest(self):
+        User.objects.create_user(username="dup", email="test@example.com", password="otherpass123")
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.post(self.login_url, {"email": "test@example.com", "password": "otherpass123"},
+                               format="json")
+        self.assertEqual(res.data["user"]["username"], "dup")
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=2000)
+    def test_login_rehashes_to_configured_iterations(self):
+        hasher = TunablePBKDF2PasswordHasher()
+        self.user.password = hasher.encode("testpass123", hasher.salt(), iterations=1000)
+        self.user.save()
+        res = self.client.post(self.login_url, {"email": "test@example.com", "password": "testpass123"},
+                               format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(hasher.decode(self.user.password)["iterations"], 2000)
+        self.assertTrue(self.user.check_password("testpass123"))
+
     # ---------- VERIFY USER  ----------
 
     def test_verify_user_authenticated(self):
@@ -89,3 +170,1403 @@ class AuthTests(APITestCase):
         data = {"ministry_email": "ministry@example.com"}  
         res = self.client.post(self.ministry_register_url, data, format="json")
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RenderingAndCompressionTests(APITestCase):
+
+    def setUp(self):
+        self.programs_url = reverse("programs-index")
+        Program.objects.bulk_create([
+            Program(name=f"Program {i}", description="Support program " * 10,
+                    ministry_owner="Ministry", status="ACTIVE")
+            for i in range(50)
+        ])
+
+    # ---------- RENDERER ----------
+
+    def test_fast_renderer_matches_stdlib_renderer(self):
+        data = {"name": "جمعية", "income": Decimal("1250.50"), "ids": [1, 2, 3],
+                "at": datetime(2025, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+                "sep": "a\u2028b", "nested": {"ok": True, "none": None}}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    # ---------- COMPRESSION ----------
+
+    def test_large_response_is_gzipped_when_accepted(self):
+        res = self.client.get(self.programs_url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res["Vary"])
+        self.assertEqual(len(json.loads(gzip.decompress(res.content))), 50)
+
+    def test_response_not_compressed_without_accept_encoding(self):
+        res = self.client.get(self.programs_url)
+        self.assertFalse(res.has_header("Content-Encoding"))
+
+    def test_small_response_not_compressed(self):
+        res = self.client.get(reverse("home"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(res.has_header("Content-Encoding"))
+
+    def test_accept_encoding_negotiation(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate"), "gzip")
+        self.assertIsNone(negotiate_encoding("gzip;q=0, identity"))
+        self.assertIsNone(negotiate_encoding("deflate"))
+
+
+def make_charity(name, admin_user=None, **fields):
+    defaults = {"registration_number": name, "issuing_authority": "HRSD", "email": f"{name}@example.com",
+                "phone": "1", "address": "a", "city": "Riyadh", "region": "Riyadh"}
+    return Charity.objects.create(name=name, admin_user=admin_user, **{**defaults, **fields})
+
+
+def make_beneficiary(username, charity, **fields):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="x")
+    defaults = {"national_id": username, "phone": "1", "address": "a", "city": "Riyadh",
+                "region": "Riyadh", "date_of_birth": date(1990, 1, 1)}
+    return Beneficiary.objects.create(user=user, charity=charity, **{**defaults, **fields})
+
+
+@override_settings(CHANGES_FEED={"SAFETY_LAG_SECONDS": 0})
+class ChangesFeedTests(APITestCase):
+
+    def setUp(self):
+        self.url = reverse("changes-feed")
+        self.admin = User.objects.create_user(username="admin", email="admin@example.com", password="x")
+        self.charity = make_charity("Charity", self.admin)
+        self.beneficiary = make_beneficiary("b1", self.charity)
+        make_beneficiary("b2", make_charity("Other"))
+        self.client.force_authenticate(self.admin)
+
+    def read(self, **params):
+        res = self.client.get(self.url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(res.streaming_content).splitlines()]
+        return lines[:-1], lines[-1]
+
+    def test_initial_sync_is_scoped_to_charity(self):
+        rows, tail = self.read()
+        self.assertEqual([(r["resource"], r["id"]) for r in rows],
+                         [("charities", self.charity.id), ("beneficiaries", self.beneficiary.id)])
+        self.assertFalse(tail["has_more"])
+
+    def test_cursor_returns_only_new_changes_and_deletions(self):
+        _, tail = self.read()
+        rows, tail = self.read(cursor=tail["cursor"])
+        self.assertEqual(rows, [])
+
+        self.beneficiary.phone = "2"
+        self.beneficiary.save()
+        rows, tail = self.read(cursor=tail["cursor"])
+        self.assertEqual([(r["op"], r["data"]["phone"]) for r in rows], [("upsert", "2")])
+
+        beneficiary_id = self.beneficiary.id
+        self.beneficiary.delete()
+        rows, _ = self.read(cursor=tail["cursor"])
+        self.assertEqual([(r["op"], r["resource"], r["id"]) for r in rows],
+                         [("delete", "beneficiaries", beneficiary_id)])
+
+    def test_cascade_delete_writes_tombstones_in_bulk(self):
+        program = Program.objects.create(name="P", description="d", ministry_owner="Health")
+        for username in ("b3", "b4"):
+            ProgramApplication.objects.create(beneficiary=make_beneficiary(username, self.charity), program=program)
+        with CaptureQueriesContext(connection) as queries:
+            self.charity.delete()
+        inserts = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "main_app_tombstone"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(dict(Tombstone.objects.values_list("resource").annotate(n=Count("id"))),
+                         {"charities": 1, "beneficiaries": 3, "applications": 2})
+
+        other = Beneficiary.objects.get(national_id="b2")
+        other.user.delete()
+        self.assertTrue(Tombstone.objects.filter(resource="beneficiaries", object_id=other.id).exists())
+
+    def test_tombstones_past_retention_are_pruned(self):
+        retention = timedelta(days=feed_settings()["TOMBSTONE_RETENTION_DAYS"])
+        Tombstone.objects.create(resource="charities", object_id=1, deleted_at=timezone.now() - retention * 2)
+        recent = Tombstone.objects.create(resource="charities", object_id=2)
+        out = StringIO()
+        call_command("clear_tombstones", stdout=out)
+        self.assertIn("Removed 1 expired tombstone", out.getvalue())
+        self.assertEqual(list(Tombstone.objects.values_list("id", flat=True)), [recent.id])
+
+    def test_pagination_sets_has_more(self):
+        rows, tail = self.read(limit=1)
+        self.assertEqual(len(rows), 1)
+        self.assertTrue(tail["has_more"])
+        rows, tail = self.read(limit=1, cursor=tail["cursor"])
+        self.assertEqual(rows[0]["resource"], "beneficiaries")
+
+    def test_invalid_cursor_and_resource(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "junk"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"resources": "nope"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StandInReceiver:
+    """Local HTTP server standing in for a ministry webhook receiver."""
+
+    def __init__(self, fail=False):
+        self.requests = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append((dict(self.headers), json.loads(body), body))
+                self.send_response(500 if fail else 204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class OutboxTests(APITestCase):
+
+    def setUp(self):
+        self.program = Program.objects.create(name="Housing", description="d", ministry_owner="Housing")
+        charity = make_charity("Charity")
+        self.beneficiaries = [make_beneficiary(f"b{i}", charity) for i in range(3)]
+
+    def make_endpoint(self, receiver, **fields):
+        self.addCleanup(receiver.close)
+        return WebhookEndpoint.objects.create(name="Ministry", url=receiver.url, secret="s3cret", **fields)
+
+    def test_application_submitted_through_api_is_queued_and_delivered(self):
+        receiver = StandInReceiver()
+        self.make_endpoint(receiver)
+        self.client.force_authenticate(self.beneficiaries[0].user)
+        res = self.client.post(reverse("program-applications", args=[self.program.id]), {}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(WebhookDelivery.objects.filter(status="PENDING").count(), 1)
+
+        self.assertEqual(Dispatcher().run_once(), {"delivered": 1, "failed": 0})
+        headers, payload, body = receiver.requests[0]
+        self.assertEqual(payload["deliveries"][0]["type"], "application.submitted")
+        expected = "sha256=" + hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers["X-Sila-Signature"], expected)
+        self.assertEqual(WebhookDelivery.objects.get().status, "DELIVERED")
+
+    def test_deliveries_are_batched_per_endpoint(self):
+        receiver = StandInReceiver()
+        self.make_endpoint(receiver, batch_size=2)
+        for b in self.beneficiaries:
+            ProgramApplication.objects.create(beneficiary=b, program=self.program)
+        self.assertEqual(Dispatcher().run_once()["delivered"], 3)
+        self.assertEqual(sorted(len(p["deliveries"]) for _, p, _ in receiver.requests), [1, 2])
+
+    def test_status_change_is_queued_only_for_subscribed_endpoints(self):
+        self.make_endpoint(StandInReceiver(), event_types=["application.status_changed"])
+        app = ProgramApplication.objects.create(beneficiary=self.beneficiaries[0], program=self.program)
+        self.assertFalse(WebhookDelivery.objects.exists())
+        app = ProgramApplication.objects.get(id=app.id)
+        app.status = "APPROVED"
+        app.save()
+        delivery = WebhookDelivery.objects.select_related("event").get()
+        self.assertEqual(delivery.event.payload["previous_status"], "PENDING")
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.make_endpoint(StandInReceiver(fail=True))
+        ProgramApplication.objects.create(beneficiary=self.beneficiaries[0], program=self.program)
+        config = {**outbox_settings(), "MAX_ATTEMPTS": 2}
+        with self.assertLogs("main_app.outbox", "WARNING"):
+            self.assertEqual(Dispatcher(config).run_once()["failed"], 1)
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual((delivery.status, delivery.attempts, delivery.last_error), ("PENDING", 1, "HTTP 500"))
+        # Not due again until the backoff elapses
+        self.assertEqual(Dispatcher(config).run_once()["failed"], 0)
+
+        WebhookDelivery.objects.update(next_attempt_at=delivery.next_attempt_at.replace(year=2000))
+        with self.assertLogs("main_app.outbox", "WARNING"):
+            Dispatcher(config).run_once()
+        self.assertEqual(WebhookDelivery.objects.get().status, "FAILED")
+
+    def test_concurrent_dispatchers_take_disjoint_deliveries(self):
+        receiver = StandInReceiver()
+        self.make_endpoint(receiver)
+        for b in self.beneficiaries:
+            ProgramApplication.objects.create(beneficiary=b, program=self.program)
+        first, second = Dispatcher({**outbox_settings(), "FETCH_LIMIT": 2}), Dispatcher()
+        taken = [d.id for d in first.due()]
+        self.assertEqual(len(taken), 2)
+        rest = [d.id for d in second.due()]
+        self.assertEqual(len(rest), 1)
+        self.assertNotIn(rest[0], taken)
+        self.assertEqual(second.due(), [])
+        # A dispatcher that died mid-pass leaves its lease to expire
+        WebhookDelivery.objects.filter(id__in=taken).update(next_attempt_at=timezone.now())
+        self.assertEqual(second.run_once(), {"delivered": 2, "failed": 0})
+        self.assertEqual(len(receiver.requests), 1)
+
+    def test_delivered_rows_are_pruned_after_retention(self):
+        self.make_endpoint(StandInReceiver())
+        for b in self.beneficiaries[:2]:
+            ProgramApplication.objects.create(beneficiary=b, program=self.program)
+        Dispatcher().run_once()
+        old, recent = WebhookDelivery.objects.order_by("id")
+        long_ago = timezone.now() - timedelta(days=outbox_settings()["RETENTION_DAYS"] + 1)
+        WebhookDelivery.objects.filter(id=old.id).update(delivered_at=long_ago)
+        OutboxEvent.objects.update(created_at=long_ago)
+        stuck = OutboxEvent.objects.create(event_type="application.submitted", payload={})
+        WebhookDelivery.objects.create(event=stuck, endpoint=old.endpoint, status="FAILED")
+        OutboxEvent.objects.filter(id=stuck.id).update(created_at=long_ago)
+
+        self.assertEqual(purge_delivered(), (1, 1))
+        self.assertEqual(set(OutboxEvent.objects.values_list("id", flat=True)), {recent.event_id, stuck.id})
+        out = StringIO()
+        call_command("clear_outbox", stdout=out)
+        self.assertIn("Removed 0", out.getvalue())
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": rates})
+
+
+class DocumentUploadTests(APITestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media, DOCUMENT_UPLOADS={"CHUNK_BYTES": 1024, "READ_BYTES": 100})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.pdf = b"%PDF-1.7\n" + bytes(range(256)) * 10
+
+    def start(self, content=None, content_type="application/pdf"):
+        content = self.pdf if content is None else content
+        res = self.client.post(reverse("uploads-index"), {
+            "filename": "license.pdf", "size": len(content), "content_type": content_type}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data["id"]
+
+    def put(self, upload_id, content, start, total=None):
+        total = len(self.pdf) if total is None else total
+        return self.client.put(
+            reverse("upload-detail", args=[upload_id]), content, content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{start + len(content) - 1}/{total}")
+
+    def upload(self, content=None):
+        content = self.pdf if content is None else content
+        upload_id = self.start(content)
+        for start in range(0, len(content), 1024):
+            res = self.put(upload_id, content[start:start + 1024], start, len(content))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return upload_id, res.data
+
+    def test_chunked_upload_is_hashed_and_content_addressed(self):
+        upload_id, data = self.upload()
+        self.assertEqual(data["status"], "COMPLETE")
+        self.assertEqual(data["sha256"], hashlib.sha256(self.pdf).hexdigest())
+        document = StoredDocument.objects.get()
+        with document.file.open("rb") as fh:
+            self.assertEqual(fh.read(), self.pdf)
+
+    def test_repeated_upload_is_deduplicated(self):
+        self.upload()
+        self.upload()
+        self.assertEqual(StoredDocument.objects.count(), 1)
+
+    def test_out_of_order_chunk_reports_resume_offset(self):
+        upload_id = self.start()
+        self.put(upload_id, self.pdf[:1024], 0)
+        res = self.put(upload_id, self.pdf[2048:3072], 2048)
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["offset"], 1024)
+        self.assertEqual(self.client.get(reverse("upload-detail", args=[upload_id])).data["offset"], 1024)
+
+    def test_limits_and_content_checks(self):
+        res = self.client.post(reverse("uploads-index"), {
+            "filename": "big.pdf", "size": 10 ** 9, "content_type": "application/pdf"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        upload_id = self.start(b"not a pdf at all")
+        self.assertEqual(self.put(upload_id, b"not a pdf at all", 0, 16).status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(DOCUMENT_UPLOADS={"MAX_OPEN_UPLOADS": 2})
+    def test_unfinished_uploads_are_capped_per_client(self):
+        self.start()
+        self.start()
+        data = {"filename": "third.pdf", "size": 10, "content_type": "application/pdf"}
+        res = self.client.post(reverse("uploads-index"), data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(reverse("uploads-index"), data, format="json", REMOTE_ADDR="10.0.0.8")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    @throttle_rates(**{"upload.ip": "2/min"})
+    def test_starting_uploads_is_throttled_per_ip(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.start()
+        self.start()
+        res = self.client.post(reverse("uploads-index"), {
+            "filename": "license.pdf", "size": 10, "content_type": "application/pdf"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_charity_register_references_uploads_by_id(self):
+        license_id, _ = self.upload()
+        admin_id, _ = self.upload(b"%PDF-1.4\nid-card")
+        res = self.client.post(reverse("charity_register"), {
+            "admin_name": "Sara Ali", "email": "sara@example.com", "password": "strongpass123",
+            "phone": "1", "organization_name": "Charity", "registration_number": "R-1",
+            "issuing_authority": "HRSD", "charity_type": "FOOD", "address": "Riyadh",
+            "license_certificate": license_id, "admin_id_document": admin_id}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        charity = Charity.objects.get(registration_number="R-1")
+        self.assertEqual(charity.license_certificate.name,
+                         StoredDocument.objects.get(sha256=hashlib.sha256(self.pdf).hexdigest()).file.name)
+
+
+class CharityDocumentTests(APITestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.content = b"%PDF-1.7\n" + bytes(range(256)) * 4
+        digest = hashlib.sha256(self.content).hexdigest()
+        name = default_storage.save(f"documents/sha256/{digest}", ContentFile(self.content))
+        StoredDocument.objects.create(sha256=digest, file=name, size=len(self.content), content_type="application/pdf")
+
+        self.admin = User.objects.create_user(username="admin", email="admin@example.com", password="x")
+        self.charity = make_charity("Charity", self.admin, license_certificate=name)
+        self.url = reverse("charity-document", args=[self.charity.id, "license_certificate"])
+        self.etag = f'"{digest}"'
+        self.client.force_authenticate(self.admin)
+
+    def test_full_download_is_streamed_with_validators(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res.streaming_content), self.content)
+        self.assertEqual(res["ETag"], self.etag)
+        self.assertEqual(res["Content-Type"], "application/pdf")
+        self.assertEqual(res["Accept-Ranges"], "bytes")
+
+    def test_range_requests(self):
+        res = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(res.streaming_content), self.content[10:20])
+        self.assertEqual(res["Content-Range"], f"bytes 10-19/{len(self.content)}")
+
+        res = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(res.streaming_content), self.content[-5:])
+
+        res = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        res = self.client.get(self.url, HTTP_RANGE="bytes=0-4", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_conditional_request_returns_not_modified(self):
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(DOCUMENT_SERVING={"ACCEL_REDIRECT": {"HEADER": "X-Accel-Redirect", "PREFIX": "/protected/"}})
+    def test_accel_redirect_hands_off_to_proxy(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res["X-Accel-Redirect"], "/protected/" + self.charity.license_certificate.name)
+        self.assertEqual(res.content, b"")
+
+    def test_other_users_are_forbidden(self):
+        self.client.force_authenticate(User.objects.create_user(username="other", password="x"))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ThrottlingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.login_url = reverse("login")
+        User.objects.create_user(username="victim", email="victim@example.com", password="testpass123")
+
+    def login(self, email, password="wrong", ip="10.0.0.1"):
+        return self.client.post(self.login_url, {"email": email, "password": password},
+                                format="json", REMOTE_ADDR=ip)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/min"), (10, 60))
+        self.assertEqual(parse_rate("5/15m"), (5, 900))
+        self.assertEqual(parse_rate("1000/h"), (1000, 3600))
+
+    @throttle_rates(**{"login.email": "3/min"})
+    def test_email_limit_applies_across_ips_before_any_lookup(self):
+        for i in range(3):
+            self.assertEqual(self.login("victim@example.com", ip=f"10.0.0.{i}").status_code, 401)
+        with self.assertNumQueries(0):
+            res = self.login("VICTIM@example.com", password="testpass123", ip="10.0.0.9")
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", res)
+        self.assertEqual(self.login("other@example.com").status_code, 401)
+
+    @throttle_rates(**{"login.ip": "2/min"})
+    def test_ip_limit_applies_across_emails(self):
+        self.login("a@example.com")
+        self.login("b@example.com")
+        self.assertEqual(self.login("c@example.com").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # A client-supplied X-Forwarded-For is not trusted without NUM_PROXIES
+        res = self.client.post(self.login_url, {"email": "d@example.com", "password": "x"}, format="json",
+                               REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="203.0.113.7")
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login("c@example.com", ip="10.0.0.2").status_code, 401)
+
+    @throttle_rates(**{"register.global": "1/min"})
+    def test_global_limit_per_endpoint(self):
+        self.client.post(reverse("ministry_register"), {}, format="json")
+        res = self.client.post(reverse("ministry_register"), {}, format="json", REMOTE_ADDR="10.9.9.9")
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login("victim@example.com", "testpass123").status_code, status.HTTP_200_OK)
+
+    @throttle_rates(**{"login.ip": "10/min"})
+    def test_window_slides_instead_of_resetting(self):
+        throttle, view = IPRateThrottle(), type("View", (), {"throttle_scope": "login"})()
+        factory = APIRequestFactory()
+        clock = [600.0]
+        throttle.timer = lambda: clock[0]
+
+        def attempt():
+            return throttle.allow_request(factory.post("/", REMOTE_ADDR="10.1.1.1"), view)
+
+        for _ in range(10):
+            self.assertTrue(attempt())
+        self.assertFalse(attempt())
+        # A fixed window would reset at t=660; half the old window still counts.
+        clock[0] = 690.0
+        self.assertEqual(sum(attempt() for _ in range(10)), 5)
+
+
+class ArchiveTests(APITestCase):
+
+    def setUp(self):
+        self.ministry = User.objects.create_user(username="moh", email="moh@example.com", password="x",
+                                                 first_name="Health", is_superuser=True)
+        self.charity = make_charity("Archive Charity")
+        self.beneficiaries = [make_beneficiary(f"arch{i}", self.charity) for i in range(3)]
+        self.closed = Program.objects.create(name="Old", description="d", ministry_owner="Health", status="CLOSED")
+        self.active = Program.objects.create(name="New", description="d", ministry_owner="Health")
+        for b in self.beneficiaries:
+            ProgramApplication.objects.create(beneficiary=b, program=self.closed, status="APPROVED")
+        ProgramApplication.objects.create(beneficiary=self.beneficiaries[0], program=self.active)
+        Program.objects.filter(id=self.closed.id).update(closed_at=timezone.now() - timedelta(days=200))
+        self.event = Event.objects.create(charity=self.charity, title="Past", description="d", location="l",
+                                          city="Riyadh", event_date=timezone.now() - timedelta(days=365))
+        for b in self.beneficiaries[:2]:
+            EventRegistration.objects.create(beneficiary=b, event=self.event, attended=True)
+
+    def test_archive_history_moves_rows_and_stats_can_include_them(self):
+        call_command("archive_history", batch_size=2, sleep=0, stdout=StringIO())
+        self.assertEqual(ProgramApplication.objects.count(), 1)
+        self.assertEqual(ArchivedProgramApplication.objects.filter(program_name="Old").count(), 3)
+        self.assertFalse(EventRegistration.objects.exists())
+        self.assertEqual(ArchivedEventRegistration.objects.filter(charity_id=self.charity.id).count(), 2)
+        self.assertEqual(Tombstone.objects.filter(resource="applications").count(), 3)
+        archived = ArchivedProgramApplication.objects.values_list("original_id", flat=True)
+        self.assertEqual(ApplicationStatusChange.objects.filter(application_id__in=list(archived)).count(), 3)
+
+        self.client.force_authenticate(self.ministry)
+        res = self.client.get(reverse("ministry-statistics"))
+        self.assertEqual(res.data["total_applications"], 1)
+        self.assertNotIn("archive", res.data)
+        res = self.client.get(reverse("ministry-statistics"), {"include_archive": "true"})
+        self.assertEqual(res.data["archive"]["total_applications"], 3)
+        self.assertEqual(res.data["archive"]["applications_by_status"], [{"status": "APPROVED", "count": 3}])
+
+    def test_programs_are_archivable_from_when_they_closed(self):
+        self.closed.refresh_from_db()
+        self.closed.description = "edited after closing"
+        self.closed.save()
+        self.assertEqual(archivable_applications().count(), 3)
+        self.active.status = "CLOSED"
+        self.active.save(update_fields=["status"])
+        Program.objects.filter(id=self.active.id).update(updated_at=timezone.now() - timedelta(days=200))
+        self.assertEqual(archivable_applications().count(), 3)
+        self.active.refresh_from_db()
+        self.active.status = "ACTIVE"
+        self.active.save()
+        self.assertIsNone(self.active.closed_at)
+
+    def test_purge_dry_run_then_children_first_in_batches(self):
+        charities = Charity.objects.filter(id=self.charity.id)
+        counts = purge(charities, dry_run=True)
+        self.assertEqual(counts["main_app.Beneficiary"], 3)
+        self.assertEqual(counts["main_app.ProgramApplication"], 4)
+        self.assertEqual(counts["main_app.EventRegistration"], 2)
+        self.assertEqual(ProgramApplication.objects.count(), 4)
+
+        counts = purge(charities, batch_size=2, sleep=0)
+        self.assertEqual(counts["main_app.Charity"], 1)
+        self.assertEqual(counts["main_app.EventRegistration"], 2)
+        self.assertFalse(Beneficiary.objects.exists())
+        self.assertTrue(Program.objects.filter(id=self.closed.id).exists())
+        self.assertEqual(Tombstone.objects.filter(resource="beneficiaries").count(), 3)
+        self.assertEqual(Tombstone.objects.filter(resource="registrations").count(), 2)
+
+
+def make_reviewer(username):
+    return User.objects.create_user(username=username, email=f"{username}@example.com", password="x",
+                                    first_name="Health", is_superuser=True)
+
+
+class ReviewQueueTests(APITestCase):
+
+    def setUp(self):
+        self.url = reverse("review-queue")
+        self.alice, self.bob = make_reviewer("alice"), make_reviewer("bob")
+        charity = make_charity("Queue Charity")
+        self.program = Program.objects.create(name="P", description="d", ministry_owner="Health")
+        other = Program.objects.create(name="Q", description="d", ministry_owner="Education")
+        for i in range(5):
+            ProgramApplication.objects.create(beneficiary=make_beneficiary(f"q{i}", charity), program=self.program)
+        ProgramApplication.objects.create(beneficiary=make_beneficiary("q9", charity), program=other)
+
+    def claim(self, user, count):
+        self.client.force_authenticate(user)
+        res = self.client.post(self.url, {"count": count}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [a["id"] for a in res.data["claimed"]]
+
+    def test_reviewers_get_disjoint_claims_and_expired_leases_return(self):
+        first, second = self.claim(self.alice, 3), self.claim(self.bob, 3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(self.claim(self.bob, 3), [])
+
+        ProgramApplication.objects.filter(id__in=first).update(claim_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(sorted(self.claim(self.bob, 5)), sorted(first))
+
+    def test_review_requires_a_live_claim(self):
+        ids = self.claim(self.alice, 1)
+        url = reverse("application-review", args=[ids[0]])
+        self.client.force_authenticate(self.bob)
+        res = self.client.post(url, {"status": "APPROVED"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+        self.client.force_authenticate(self.alice)
+        res = self.client.post(url, {"status": "APPROVED", "review_notes": "ok"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["status"], "APPROVED")
+        self.assertIsNone(res.data["claimed_by"])
+        self.assertEqual(self.client.get(self.url).data, [])
+
+
+class ConcurrentClaimTests(TransactionTestCase):
+
+    def test_threads_never_share_an_application(self):
+        charity = make_charity("Busy Charity")
+        beneficiaries = [make_beneficiary(f"c{i}", charity) for i in range(6)]
+        for i in range(10):
+            program = Program.objects.create(name=f"P{i}", description="d", ministry_owner="Health")
+            for b in beneficiaries:
+                ProgramApplication.objects.create(beneficiary=b, program=program)
+        reviewers = [make_reviewer(f"r{i}") for i in range(6)]
+        programs = Program.objects.filter(ministry_owner="Health")
+        claimed, errors = [], []
+
+        def work(reviewer):
+            try:
+                while True:
+                    ids = claim(reviewer, programs, 4)
+                    if not ids:
+                        return
+                    claimed.extend(ids)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(r,)) for r in reviewers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(claimed), 60)
+        self.assertEqual(len(set(claimed)), 60)
+
+
+class DuplicateDetectionTests(APITestCase):
+
+    def person(self, username, charity, first, last, **fields):
+        beneficiary = make_beneficiary(username, charity, **fields)
+        User.objects.filter(id=beneficiary.user_id).update(first_name=first, last_name=last)
+        return beneficiary
+
+    def setUp(self):
+        one, two = make_charity("Charity One"), make_charity("Charity Two")
+        self.a = self.person("d1", one, "Mohammed", "Alharbi", phone="0551234567")
+        self.b = self.person("d2", two, "Muhammad", "Al-Harbi", phone="0509999999")
+        self.c = self.person("d3", two, "Sara", "Alqahtani")
+        self.person("d4", one, "Muhammad", "Al Harbi")  # same charity as a: not a cross-charity pair
+
+    def test_finds_cross_charity_variants_and_keeps_review_status(self):
+        stats = detect(workers=0)
+        pairs = list(DuplicateCandidate.objects.values_list("beneficiary_a", "beneficiary_b"))
+        self.assertIn((self.a.id, self.b.id), pairs)
+        self.assertNotIn(self.c.id, {i for pair in pairs for i in pair})
+        self.assertLess(stats["compared"], 6)
+
+        DuplicateCandidate.objects.update(status="DISMISSED")
+        self.assertEqual(detect(workers=0)["compared"], 0)
+
+        self.b.phone = "0551234567"
+        self.b.save()
+        stats = detect(workers=0)
+        self.assertGreater(stats["compared"], 0)
+        candidate = DuplicateCandidate.objects.get(beneficiary_a=self.a, beneficiary_b=self.b)
+        self.assertEqual(candidate.status, "DISMISSED")
+        self.assertEqual(candidate.reasons["phone"], 1.0)
+
+    @override_settings(DUPLICATE_DETECTION={"MAX_BLOCK_SIZE": 3})
+    def test_pair_is_scored_in_a_later_key_when_the_first_block_is_skipped(self):
+        # All four share date of birth and region, an oversized block; the
+        # name block still has to score a and b.
+        with self.assertLogs("main_app.dedup", "WARNING"):
+            stats = detect(workers=0)
+        self.assertEqual(stats["skipped_blocks"], 1)
+        self.assertTrue(DuplicateCandidate.objects.filter(beneficiary_a=self.a, beneficiary_b=self.b).exists())
+
+
+class DistributionTests(APITestCase):
+
+    def setUp(self):
+        self.url = reverse("ministry-distributions")
+        self.client.force_authenticate(make_reviewer("analyst"))
+        riyadh, jeddah = make_charity("Riyadh Charity"), make_charity("Jeddah Charity")
+        for i, income in enumerate([500, 1500, 2500, 3500]):
+            make_beneficiary(f"r{i}", riyadh, monthly_income=Decimal(income), family_size=i + 1, region="Riyadh")
+        for i, income in enumerate([9000, 30000]):
+            make_beneficiary(f"j{i}", jeddah, monthly_income=Decimal(income), family_size=6, region="Makkah")
+
+    def test_histogram_quantiles_and_groups(self):
+        res = self.client.get(self.url, {"metrics": "monthly_income", "group_by": "region",
+                                         "bins_monthly_income": "0,2000,10000", "quantiles": "0.5"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        income = res.data["metrics"]["monthly_income"]
+        self.assertEqual(res.data["count"], 6)
+        self.assertEqual(income["counts"], [2, 3])
+        self.assertEqual(income["above"], 1)
+        self.assertEqual(income["quantiles"]["0.5"], 3000.0)
+
+        groups = res.data["groups"]
+        riyadh = groups["keys"].index("Riyadh")
+        self.assertEqual(groups["count"][riyadh], 4)
+        self.assertEqual(groups["monthly_income"]["mean"][riyadh], 2000.0)
+        self.assertEqual(groups["monthly_income"]["quantiles"]["0.5"][riyadh], 2000.0)
+        self.assertEqual(groups["monthly_income"]["counts"][groups["keys"].index("Makkah")], [0, 1])
+
+    def test_rejects_bad_bins(self):
+        res = self.client.get(self.url, {"bins_age": "10,5"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TimeSeriesTests(APITestCase):
+
+    def setUp(self):
+        self.url = reverse("time-series")
+        self.client.force_authenticate(make_reviewer("trends"))
+        charity = make_charity("Trend Charity")
+        health = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        other = Program.objects.create(name="School", description="d", ministry_owner="Education")
+        when = [datetime(2026, 1, 5, 9, tzinfo=dt_timezone.utc), datetime(2026, 1, 20, 9, tzinfo=dt_timezone.utc),
+                datetime(2026, 3, 31, 23, tzinfo=dt_timezone.utc)]
+        for i, submitted in enumerate(when):
+            app = ProgramApplication.objects.create(beneficiary=make_beneficiary(f"t{i}", charity), program=health,
+                                                    status="APPROVED" if i else "PENDING")
+            ProgramApplication.objects.filter(id=app.id).update(submitted_at=submitted)
+        ProgramApplication.objects.create(beneficiary=Beneficiary.objects.first(), program=other)
+
+    def test_monthly_series_are_zero_filled_and_scoped(self):
+        res = self.client.get(self.url, {"start": "2026-01-01", "end": "2026-04-30", "granularity": "month",
+                                         "group_by": "status"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["buckets"], ["2026-01-01", "2026-02-01", "2026-03-01", "2026-04-01"])
+        self.assertEqual(res.data["counts"], [2, 0, 1, 0])
+        series = {s["key"]: s["counts"] for s in res.data["series"]}
+        self.assertEqual(series, {"APPROVED": [1, 0, 1, 0], "PENDING": [1, 0, 0, 0]})
+
+    def test_any_range_is_one_query(self):
+        source = SOURCES["applications"]
+        with self.assertNumQueries(1):
+            result = time_series(ProgramApplication.objects.all(), source.field, date(2025, 1, 1), date(2026, 12, 31),
+                                 "week", "program", source.groups)
+        self.assertEqual(result["total"], 4)
+        self.assertEqual(result["series"][0]["label"], "Clinic")
+        self.assertEqual(self.client.get(self.url, {"granularity": "hour"}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class PivotTests(APITestCase):
+
+    def setUp(self):
+        self.url = reverse("pivot")
+        self.client.force_authenticate(make_reviewer("pivot"))
+        north, south = make_charity("North", charity_type="HEALTH"), make_charity("South", charity_type="FOOD")
+        clinic = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        housing = Program.objects.create(name="Housing", description="d", ministry_owner="Health")
+        school = Program.objects.create(name="School", description="d", ministry_owner="Education")
+        a, b, c = (make_beneficiary("p1", north), make_beneficiary("p2", north), make_beneficiary("p3", south))
+        submitted = timezone.now() - timedelta(days=4)
+        for beneficiary, program in [(a, clinic), (a, housing), (b, clinic), (c, clinic), (c, school)]:
+            app = ProgramApplication.objects.create(beneficiary=beneficiary, program=program)
+            ProgramApplication.objects.filter(id=app.id).update(submitted_at=submitted)
+        ProgramApplication.objects.filter(beneficiary=c).update(status="APPROVED", reviewed_at=submitted + timedelta(days=2))
+
+    def test_groups_by_dimensions_with_measures_in_one_query(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, {"dimensions": "charity_type,status",
+                                             "measures": "count,beneficiaries,avg_processing_days"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["rows"], [
+            {"charity_type": "HEALTH", "status": "PENDING", "count": 3, "beneficiaries": 2, "avg_processing_days": None},
+            {"charity_type": "FOOD", "status": "APPROVED", "count": 1, "beneficiaries": 1, "avg_processing_days": 2.0},
+        ])
+        self.assertFalse(res.data["truncated"])
+
+    def test_labels_cap_and_whitelist(self):
+        with override_settings(PIVOT={"MAX_ROWS": 1}):
+            res = self.client.get(self.url, {"dimensions": "program"})
+        self.assertEqual(res.data["rows"], [{"program": res.data["rows"][0]["program"], "program_label": "Clinic",
+                                             "count": 3}])
+        self.assertTrue(res.data["truncated"])
+        self.assertEqual(self.client.get(self.url, {"dimensions": "beneficiary__user__password"}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class RecordingBroker(LocalBroker):
+    """Stand-in broker that keeps what was published."""
+
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, events):
+        self.published.extend(events)
+
+
+@override_settings(LIVE_UPDATES={"BROKER": "main_app.live.LocalBroker", "HEARTBEAT_SECONDS": 5})
+class LiveUpdateTests(APITestCase):
+
+    def setUp(self):
+        self.ministry = make_reviewer("live")
+        self.charity = make_charity("Live Charity")
+        self.program = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        self.event = Event.objects.create(charity=self.charity, title="Fair", description="d", location="l",
+                                          city="Riyadh", event_date=timezone.now() + timedelta(days=3))
+        self.beneficiary = make_beneficiary("live-b", self.charity)
+
+    @override_settings(LIVE_UPDATES={"BROKER": "main_app.tests.RecordingBroker"})
+    def test_changes_are_published_after_commit_and_routed(self):
+        broker = get_broker()
+        with self.captureOnCommitCallbacks(execute=True):
+            app = ProgramApplication.objects.create(beneficiary=self.beneficiary, program=self.program)
+            registration = EventRegistration.objects.create(beneficiary=self.beneficiary, event=self.event)
+            self.assertEqual(broker.published, [])
+        app = ProgramApplication.objects.get(id=app.id)
+        registration = EventRegistration.objects.get(id=registration.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            app.status = "APPROVED"
+            app.save()
+            registration.attended = True
+            registration.save()
+            registration.notes = "seen"
+            registration.save()
+
+        messages = route(broker.published)
+        self.assertEqual([m["type"] for m in messages], [
+            "application.submitted", "registration.created",
+            "application.status_changed", "registration.attendance_changed",
+        ])
+        self.assertEqual((messages[0]["ministry"], messages[0]["charity_id"]), ("Health", self.charity.id))
+        self.assertEqual((messages[1]["ministry"], messages[1]["charity_id"]), (None, self.charity.id))
+
+    async def test_stream_pushes_only_the_subscribers_deltas(self):
+        token = str(AccessToken.for_user(self.ministry))
+        response = await self.async_client.get(reverse("live-updates"), {"token": token})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertIn(b"event: ready", await anext(chunks))
+
+        get_broker().fanout([
+            {"id": 1, "type": "registration.created", "ministry": None, "charity_id": self.charity.id, "data": {}},
+            {"id": 2, "type": "application.submitted", "ministry": "Health", "charity_id": 1,
+             "data": {"application_id": 7}},
+        ])
+        chunk = (await anext(chunks)).decode()
+        self.assertEqual(chunk, 'id: 2\nevent: application.submitted\ndata: {"application_id": 7}\n\n')
+        await chunks.aclose()
+
+        response = await self.async_client.get(reverse("live-updates"), {"token": "nope"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stream_is_refused_outside_asgi(self):
+        token = str(AccessToken.for_user(self.ministry))
+        response = self.client.get(reverse("live-updates"), {"token": token})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_outbox_poller_holds_back_recent_events(self):
+        old, young, older = (OutboxEvent.objects.create(event_type="registration.created", payload={})
+                             for _ in range(3))
+        OutboxEvent.objects.filter(id__in=[old.id, older.id]).update(created_at=timezone.now() - timedelta(seconds=5))
+        # The id after a young event waits for it, whatever its own age.
+        self.assertEqual(OutboxBroker().pending(0), [old])
+        with override_settings(LIVE_UPDATES={"SAFETY_LAG_SECONDS": 0}):
+            self.assertEqual(OutboxBroker().pending(old.id), [young, older])
+
+
+class AdminChangelistTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="staff", password="x", is_staff=True, is_superuser=True)
+        self.charity = make_charity("Admin Charity")
+        self.program = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        self.event = Event.objects.create(charity=self.charity, title="Fair", description="d", location="l",
+                                          city="Riyadh", event_date=timezone.now())
+
+    def changelist_queries(self, model):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse(f"admin:main_app_{model}_changelist"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        beneficiary = make_beneficiary("adm0", self.charity)
+        ProgramApplication.objects.create(beneficiary=beneficiary, program=self.program)
+        EventRegistration.objects.create(beneficiary=beneficiary, event=self.event)
+        before = {m: self.changelist_queries(m) for m in ("programapplication", "eventregistration")}
+        for i in range(1, 4):
+            beneficiary = make_beneficiary(f"adm{i}", make_charity(f"Admin Charity {i}"))
+            ProgramApplication.objects.create(beneficiary=beneficiary, program=self.program)
+            EventRegistration.objects.create(beneficiary=beneficiary, event=self.event)
+        self.assertEqual({m: self.changelist_queries(m) for m in before}, before)
+
+    @override_settings(ADMIN_COUNTS={"MAX_COUNT": 2})
+    def test_filtered_counts_stop_at_the_cap(self):
+        for i in range(3):
+            ProgramApplication.objects.create(beneficiary=make_beneficiary(f"cap{i}", self.charity),
+                                              program=self.program)
+        paginator = EstimatedCountPaginator(ProgramApplication.objects.filter(status="PENDING").order_by("id"), 1)
+        self.assertEqual(paginator.count, 2)
+
+
+class AuditLogTests(APITestCase):
+
+    def setUp(self):
+        self.ministry = make_reviewer("auditor")
+        self.program = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        self.client.force_authenticate(self.ministry)
+
+    def test_updates_are_logged_with_a_field_diff_and_queryable(self):
+        res = self.client.put(reverse("program-detail", args=[self.program.id]),
+                              {"name": "Clinics", "description": "d"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        entry = AuditEntry.objects.get()
+        self.assertEqual((entry.action, entry.resource, entry.object_id, entry.actor_id),
+                         ("UPDATE", "program", str(self.program.id), self.ministry.id))
+        self.assertEqual(entry.changes, {"name": ["Clinic", "Clinics"]})
+        with self.assertRaises(ValueError):
+            entry.save()
+
+        res = self.client.get(reverse("audit-log"), {"resource": "program", "object_id": self.program.id, "limit": 1})
+        self.assertEqual([e["id"] for e in res.data["results"]], [entry.id])
+        self.assertIsNone(res.data["next"])
+
+    def test_entries_are_written_in_one_insert_when_the_change_commits(self):
+        with self.assertNumQueries(5):
+            with audit.atomic():
+                for name in ("A", "B"):
+                    with audit.tracking(self.ministry, self.program):
+                        self.program.name = name
+                        self.program.save()
+        try:
+            with audit.atomic():
+                with audit.tracking(self.ministry, self.program):
+                    self.program.name = "Rolled back"
+                    self.program.save()
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertEqual([e.changes["name"][1] for e in AuditEntry.objects.order_by("id")], ["A", "B"])
+
+
+class ApplicationDataTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(make_reviewer("appdata"))
+        self.program = Program.objects.create(name="Rent", description="d", ministry_owner="Health",
+                                              indexed_data_keys={"income": "number", "housing": "text"})
+        call_command("sync_application_data_indexes", stdout=StringIO())
+        self.url = reverse("program-applications", args=[self.program.id])
+        charity = make_charity("Data")
+        for username, income, housing in [("d1", 1500, "rent"), ("d2", 4000, "rent"), ("d3", 900, "own")]:
+            ProgramApplication.objects.create(beneficiary=make_beneficiary(username, charity), program=self.program,
+                                              application_data={"income": income, "housing": housing})
+
+    def test_filters_counts_and_groups_on_declared_keys(self):
+        res = self.client.get(self.url, {"data.income__lt": "2000", "data.housing": "rent"})
+        self.assertEqual([a["application_data"]["income"] for a in res.data], [1500])
+        res = self.client.get(self.url, {"data.income__gte": "1000", "count": "true"})
+        self.assertEqual(res.data, {"count": 2})
+        res = self.client.get(self.url, {"group_by_data": "housing"})
+        self.assertEqual(res.data["counts"], [{"value": "rent", "count": 2}, {"value": "own", "count": 1}])
+        self.assertEqual(self.client.get(self.url, {"data.name": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"data.income": "lots"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_declared_keys_are_validated_and_indexed(self):
+        res = self.client.put(reverse("program-detail", args=[self.program.id]),
+                              {"name": "Rent", "description": "d", "indexed_data_keys": {"x'); --": "text"}},
+                              format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.program.indexed_data_keys = {"x'); --": "text"}
+        with self.assertRaises(ValidationError):
+            self.program.full_clean()
+        with self.assertRaises(AppDataError):
+            key_sql("x'); --", connection.vendor)
+        self.program.refresh_from_db()
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN SELECT id FROM main_app_programapplication WHERE program_id = %s "
+                               "AND json_extract(application_data, '$.income') > 1000", [self.program.id])
+                self.assertIn("appdata_income_idx", " ".join(str(row) for row in cursor.fetchall()))
+
+    def test_indexes_are_built_by_sync_not_on_save(self):
+        Program.objects.create(name="Rooms", description="d", ministry_owner="Health",
+                               indexed_data_keys={"rooms": "number"})
+        with connection.cursor() as cursor:
+            self.assertNotIn("appdata_rooms_idx", connection.introspection.get_constraints(cursor, TABLE))
+        self.assertEqual(sync_indexes(), (["appdata_rooms_idx"], [], []))
+        Program.objects.filter(name="Rooms").delete()
+        self.assertEqual(sync_indexes(), ([], [], ["appdata_rooms_idx"]))
+
+
+class FlakyEmailBackend(LocMemEmailBackend):
+    """Counts connections and rejects the first batch it is given."""
+    opened = 0
+    rejected = False
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if not FlakyEmailBackend.rejected:
+            FlakyEmailBackend.rejected = True
+            raise ConnectionError("421 try again later")
+        return super().send_messages(messages)
+
+
+class NotificationTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="notify-admin", email="na@example.com", password="x")
+        self.charity = make_charity("Notify", self.admin)
+        self.event = Event.objects.create(charity=self.charity, title="Fair", description="d", location="Hall",
+                                          city="Riyadh", event_date=timezone.now() + timedelta(days=3))
+        for username in ("n1", "n2", "n3"):
+            EventRegistration.objects.create(beneficiary=make_beneficiary(username, self.charity), event=self.event)
+        self.client.force_authenticate(self.admin)
+
+    def update_event(self, **changes):
+        data = {"title": "Fair", "description": "d", "location": "Hall", "city": "Riyadh",
+                "event_date": self.event.event_date.isoformat(), **changes}
+        return self.client.put(reverse("event-detail", args=[self.event.id]), data, format="json")
+
+    def test_event_change_is_one_job_sent_in_batches(self):
+        self.assertEqual(self.update_event(description="same time and place").status_code, status.HTTP_200_OK)
+        self.assertFalse(NotificationJob.objects.exists())
+        self.update_event(location="Park")
+        job = NotificationJob.objects.get()
+        self.assertEqual((job.kind, len(job.recipient_ids)), ("EVENT_UPDATED", 3))
+
+        with override_settings(EMAIL_BACKEND="main_app.tests.FlakyEmailBackend"), \
+                self.assertLogs("main_app.notifications", "WARNING") as logs:
+            result = Sender({**Sender().config, "BATCH_SIZE": 2}).run_once()
+        self.assertEqual(result, {"sent": 1, "failed": 2})
+        self.assertIn("421 try again later", logs.output[0])
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(mail.outbox[0].subject, "Update to Fair")
+        self.assertIn("Where: Park, Riyadh", mail.outbox[0].body)
+        retry = Notification.objects.filter(status="PENDING")
+        self.assertEqual((retry.count(), retry.first().attempts), (2, 1))
+
+    def test_concurrent_senders_take_disjoint_notifications(self):
+        self.update_event(location="Park")
+        first, second = Sender({**Sender().config, "FETCH_LIMIT": 2}), Sender()
+        first.expand()
+        taken = [n.id for n in first.due()]
+        self.assertEqual(len(taken), 2)
+        rest = [n.id for n in second.due()]
+        self.assertEqual(len(rest), 1)
+        self.assertNotIn(rest[0], taken)
+        self.assertEqual(second.due(), [])
+        # A sender that died mid-pass leaves its lease to expire
+        Notification.objects.filter(id__in=taken).update(next_attempt_at=timezone.now())
+        self.assertEqual(second.run_once(), {"sent": 2, "failed": 0})
+
+    def test_plain_text_emails_are_not_html_escaped(self):
+        beneficiary = make_beneficiary("oneil", self.charity)
+        User.objects.filter(id=beneficiary.user_id).update(first_name="O'Neil")
+        program = Program.objects.create(name="Food & Shelter", description="d", ministry_owner="Health")
+        application = ProgramApplication.objects.create(beneficiary=beneficiary, program=program, status="APPROVED",
+                                                        review_notes='Bring "form A" <signed>')
+        notify_decision(application)
+        self.assertEqual(Sender().run_once(), {"sent": 1, "failed": 0})
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, "Your application to Food & Shelter: Approved")
+        self.assertIn("Hello O'Neil,", message.body)
+        self.assertIn('Reviewer notes: Bring "form A" <signed>', message.body)
+
+    def test_deleting_an_upcoming_event_notifies_registrants(self):
+        res = self.client.delete(reverse("event-detail", args=[self.event.id]))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Sender().run_once(), {"sent": 3, "failed": 0})
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ["n1@example.com", "n2@example.com", "n3@example.com"])
+        self.assertTrue(all("has been cancelled" in m.subject for m in mail.outbox))
+
+
+class IdempotencyTests(APITestCase):
+
+    def setUp(self):
+        charity = make_charity("Retry")
+        self.beneficiary = make_beneficiary("retry", charity)
+        self.program = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        self.url = reverse("program-applications", args=[self.program.id])
+        self.client.force_authenticate(self.beneficiary.user)
+
+    def apply(self, key, **data):
+        return self.client.post(self.url, {"application_data": {"income": 100}, **data}, format="json",
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.apply("k1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(1):
+            retry = self.apply("k1")
+        self.assertEqual((retry.status_code, retry.data, retry["Idempotent-Replayed"]),
+                         (status.HTTP_201_CREATED, first.data, "true"))
+        self.assertEqual(ProgramApplication.objects.count(), 1)
+        self.assertEqual(self.apply("k1", application_data={"income": 5}).status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+        # Without a key the endpoint behaves as before
+        self.assertEqual(self.apply("").status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IDEMPOTENCY={"WAIT_SECONDS": 0})
+    def test_duplicate_of_a_request_in_progress_waits_then_conflicts(self):
+        first = self.apply("k2")
+        IdempotencyRecord.objects.filter(key="k2").update(status_code=None, response=None)
+        self.assertEqual(self.apply("k2").status_code, status.HTTP_409_CONFLICT)
+        IdempotencyRecord.objects.filter(key="k2").update(created_at=timezone.now() - timedelta(minutes=5))
+        # The stuck request is taken over; the view runs again and sees the earlier application
+        self.assertEqual(self.apply("k2").data, {"error": "You have already applied to this program"})
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+
+class EventSeriesTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="series-admin", email="sa@example.com", password="x")
+        self.charity = make_charity("Weekly", self.admin)
+        self.client.force_authenticate(self.admin)
+        self.starts_at = (timezone.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+
+    def create_series(self, **fields):
+        data = {"title": "Food distribution", "description": "d", "location": "Hall", "city": "Riyadh",
+                "starts_at": self.starts_at.isoformat(), "frequency": "WEEKLY", **fields}
+        return self.client.post(reverse("event-series-index"), data, format="json")
+
+    def test_a_year_of_weekly_events_is_one_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.create_series(until=str((self.starts_at + timedelta(days=357)).date()))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["occurrences_created"], 52)
+        self.assertLessEqual(len(queries), 10)
+        dates = list(Event.objects.filter(series_id=res.data["id"]).order_by("event_date")
+                     .values_list("event_date", flat=True))
+        self.assertEqual((dates[0], dates[1] - dates[0], len(dates)), (self.starts_at, timedelta(days=7), 52))
+
+    @override_settings(EVENT_SERIES={"HORIZON_DAYS": 30, "REFRESH_DAYS": 7})
+    def test_horizon_is_extended_lazily_and_edits_reach_future_occurrences(self):
+        series = EventSeries.objects.get(id=self.create_series().data["id"])
+        self.assertEqual(series.occurrences.count(), 5)
+        with self.assertNumQueries(1):
+            self.assertEqual(extend_due(), 0)
+        self.assertEqual(extend_due(timezone.now() + timedelta(days=14)), 2)
+
+        first = series.occurrences.order_by("event_date").first()
+        EventRegistration.objects.create(beneficiary=make_beneficiary("weekly-b", self.charity), event=first)
+        Event.objects.filter(id=first.id).update(event_date=timezone.now() - timedelta(hours=1))
+        res = self.client.patch(reverse("event-series-detail", args=[series.id]),
+                                {"location": "Park", "until": str((self.starts_at + timedelta(days=14)).date())},
+                                format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(series.occurrences.values_list("location", flat=True).order_by("event_date")),
+                         ["Hall", "Park", "Park"])
+        self.assertEqual(self.client.patch(reverse("event-series-detail", args=[series.id]),
+                                           {"interval": 2}, format="json").status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_series_are_topped_up_by_the_command_not_by_listing_events(self):
+        series = EventSeries.objects.get(id=self.create_series().data["id"])
+        series.occurrences.exclude(event_date=self.starts_at).delete()
+        EventSeries.objects.filter(id=series.id).update(generated_until=self.starts_at)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse("events-index")).status_code, status.HTTP_200_OK)
+        self.assertEqual(series.occurrences.count(), 1)
+        call_command("extend_event_series", stdout=StringIO())
+        self.assertGreater(series.occurrences.count(), 1)
+
+    def test_series_cannot_be_moved_to_another_charity(self):
+        series_id = self.create_series().data["id"]
+        other = make_charity("Other")
+        res = self.client.patch(reverse("event-series-detail", args=[series_id]),
+                                {"charity": other.id, "title": "Moved"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        series = EventSeries.objects.get(id=series_id)
+        self.assertEqual((series.charity_id, series.title), (self.charity.id, "Moved"))
+        self.assertFalse(Event.objects.filter(series=series).exclude(charity=self.charity).exists())
+
+
+class ProcessingTimeTests(APITestCase):
+
+    def setUp(self):
+        self.reviewer = make_reviewer("timer")
+        self.client.force_authenticate(self.reviewer)
+        self.program = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        self.application = ProgramApplication.objects.create(
+            beneficiary=make_beneficiary("timed", make_charity("Timed")), program=self.program)
+
+    def test_status_changes_are_recorded_with_time_in_status(self):
+        self.application.status = "APPROVED"
+        self.application._changed_by = self.reviewer
+        self.application.save()
+        history = list(self.application.status_changes.order_by("id").values_list(
+            "from_status", "to_status", "changed_by_id"))
+        self.assertEqual(history, [("", "PENDING", None), ("PENDING", "APPROVED", self.reviewer.id)])
+        self.assertGreaterEqual(self.application.status_changes.last().seconds_in_status, 0)
+
+    def test_save_without_a_loaded_status_is_not_a_transition(self):
+        application = ProgramApplication.objects.defer("status").get(id=self.application.id)
+        application.review_notes = "called"
+        application.save(update_fields=["review_notes"])
+        self.assertEqual(self.application.status_changes.count(), 1)
+        self.assertFalse(OutboxEvent.objects.filter(event_type="application.status_changed").exists())
+
+    def test_percentiles_and_throughput_come_from_the_database(self):
+        ApplicationStatusChange.objects.bulk_create([
+            ApplicationStatusChange(application=self.application, program=self.program, from_status="PENDING",
+                                    to_status="APPROVED" if days % 2 else "REJECTED", changed_by=self.reviewer,
+                                    seconds_in_status=days * 86400)
+            for days in range(1, 11)
+        ])
+        with self.assertNumQueries(3):
+            res = self.client.get(reverse("processing-times"), {"program_id": self.program.id})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["stages"], [{
+            "program_id": self.program.id, "program": "Clinic", "stage": "PENDING", "count": 10,
+            "mean_days": 5.5, "median_days": 5.0, "p90_days": 9.0, "p99_days": 10.0,
+        }])
+        self.assertEqual(res.data["reviewers"][0]["decisions"], 10)
+        self.assertEqual(res.data["reviewers"][0]["approved"], 5)
+
+
+@override_settings(EXPORT_BUNDLE={"WORKERS": 0})
+class ExportBundleTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(make_reviewer("exporter"))
+        north, south = make_charity("North"), make_charity("South")
+        clinic = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        school = Program.objects.create(name="School", description="d", ministry_owner="Education")
+        for username, charity in [("e1", north), ("e2", north), ("e3", south)]:
+            beneficiary = make_beneficiary(username, charity)
+            ProgramApplication.objects.create(beneficiary=beneficiary, program=clinic)
+            ProgramApplication.objects.create(beneficiary=beneficiary, program=school)
+
+    def test_bundle_has_a_shard_per_charity_and_a_checked_manifest(self):
+        res = self.client.post(reverse("ministry-statistics"), {"export_type": "bundle", "shard_by": "charity"},
+                               format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/zip")
+        bundle = zipfile.ZipFile(BytesIO(b"".join(res.streaming_content)))
+        manifest = json.loads(bundle.read("manifest.json"))
+        self.assertEqual(manifest["total_rows"], 3)
+        self.assertEqual([(f["label"], f["rows"]) for f in manifest["files"]], [("North", 2), ("South", 1)])
+        for f in manifest["files"]:
+            self.assertEqual(hashlib.sha256(bundle.read(f["name"])).hexdigest(), f["sha256"])
+        rows = gzip.decompress(bundle.read(manifest["files"][1]["name"])).decode().splitlines()
+        self.assertEqual(rows[1].split(",")[1:5], ["Clinic", "ACTIVE", "", "South"])
+        self.assertEqual(self.client.post(reverse("ministry-statistics"), {"export_type": "bundle", "shard_by": "x"},
+                                          format="json").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    @override_settings(EXPORT_BUNDLE={"WORKERS": 4})
+    def test_bundle_over_http_does_not_spawn_a_process_pool(self):
+        with mock.patch.object(exports, "ProcessPoolExecutor") as pool:
+            res = self.client.post(reverse("ministry-statistics"), {"export_type": "bundle", "shard_by": "charity"},
+                                   format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        pool.assert_not_called()
+
+class ColumnarExportTests(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(make_reviewer("analyst"))
+        charity = make_charity("North")
+        clinic = Program.objects.create(name="Clinic", description="d", ministry_owner="Health")
+        school = Program.objects.create(name="School", description="d", ministry_owner="Education")
+        for username in ("c1", "c2", "c3"):
+            beneficiary = make_beneficiary(username, charity, monthly_income=Decimal("1234.50"))
+            ProgramApplication.objects.create(beneficiary=beneficiary, program=clinic)
+            ProgramApplication.objects.create(beneficiary=beneficiary, program=school)
+
+    def export(self, dataset, **params):
+        res = self.client.get(reverse("columnar-export", args=[dataset]), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b"".join(res.streaming_content)
+
+    @skipUnless(columnar.available(), "pyarrow is not installed")
+    def test_exports_are_typed_and_scoped(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(pa.BufferReader(self.export("applications")))
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(set(table.column("program").to_pylist()), {"Clinic"})
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("status").type))
+        self.assertTrue(pa.types.is_timestamp(table.schema.field("submitted_at").type))
+
+        with override_settings(COLUMNAR_EXPORT={"CHUNK_ROWS": 2}):
+            body = self.export("beneficiaries", file_format="arrow", compression="lz4")
+        reader = pa.ipc.open_file(pa.BufferReader(body))
+        self.assertEqual(reader.num_record_batches, 2)
+        table = reader.read_all()
+        self.assertEqual(table.column("charity").to_pylist(), ["North"] * 3)
+        self.assertEqual(table.column("monthly_income").to_pylist(), [Decimal("1234.50")] * 3)
+
+        res = self.client.get(reverse("columnar-export", args=["applications"]),
+                              {"file_format": "arrow", "compression": "snappy"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_pyarrow_is_reported(self):
+        with mock.patch.object(columnar, "pa", None):
+            res = self.client.get(reverse("columnar-export", args=["registrations"]))
+        self.assertEqual(res.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertEqual(self.client.get(reverse("columnar-export", args=["events"])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+
+class SlowQueryLogTests(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = f"{directory}/slow.log"
+        override = override_settings(SLOW_QUERY_LOG={"THRESHOLD_MS": 0, "FLUSH_INTERVAL_SECONDS": None,
+                                                     "PATH": self.path})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_fingerprint_ignores_values(self):
+        digest, sql = querylog.fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'x' LIMIT 21")
+        self.assertEqual(sql, "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?")
+        self.assertEqual(querylog.fingerprint("SELECT *  FROM t WHERE id IN (%s) AND name = 'it''s' LIMIT 5")[0],
+                         digest)
+        self.assertEqual(querylog.normalize("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)"),
+                         "INSERT INTO t (a, b) VALUES (...)")
+
+    def test_request_queries_are_logged_with_view_and_plan(self):
+        admin = User.objects.create_user(username="slowadmin", password="x")
+        make_charity("Slow", admin_user=admin)
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.get(reverse("charity-statistics")).status_code, status.HTTP_200_OK)
+        querylog.recorder.flush()
+
+        entries = [e for e in querylog.read_log(self.path, 0) if e["view"] == "CharityStatistics"]
+        self.assertTrue(entries)
+        self.assertEqual({e["url_name"] for e in entries}, {"charity-statistics"})
+        self.assertTrue(any(e["plan"] for e in entries if e["sql"].startswith("SELECT")))
+
+        out = StringIO()
+        call_command("slow_queries", "--view", "CharityStatistics", "--plans", stdout=out)
+        self.assertIn("from CharityStatistics (charity-statistics)", out.getvalue())
+
+    def test_streamed_queries_keep_the_request_context(self):
+        seen = []
+
+        def body():
+            for _ in range(2):
+                seen.append(querylog.query_context.get())
+                yield b"chunk"
+
+        def view(request):
+            return StreamingHttpResponse(body())
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = QueryContextMiddleware(get_response)
+        request = APIRequestFactory().get("/")
+        request.resolver_match = None
+        response = middleware(request)
+        self.assertIsNone(querylog.query_context.get())
+        self.assertEqual(b"".join(response.streaming_content), b"chunkchunk")
+        self.assertEqual(seen, [{"url_name": None, "view": "view"}] * 2)
+        self.assertIsNone(querylog.query_context.get())
+
+    def test_file_responses_keep_their_file_for_sendfile(self):
+        body = BytesIO(b"file body")
+        middleware = QueryContextMiddleware(lambda request: FileResponse(body))
+        response = middleware(APIRequestFactory().get("/"))
+        self.assertIs(response.file_to_stream, body)
+        self.assertEqual(b"".join(response.streaming_content), b"file body")
+
+
+class NPlusOneTests(APITestCase):
+    config = {**nplusone.NPLUSONE_DEFAULTS, "THRESHOLD": 3, "ACTION": "raise"}
+
+    def test_repeated_queries_are_reported_with_call_site(self):
+        charities = [make_charity(f"Loop{i}") for i in range(3)]
+        with self.assertRaises(nplusone.NPlusOneError) as caught:
+            with nplusone.detect(self.config):
+                for charity in charities:
+                    list(charity.beneficiaries.all())
+        self.assertIn("3x", str(caught.exception))
+        self.assertIn("main_app/tests.py", str(caught.exception))
+
+        with nplusone.detect({**self.config, "ALLOWLIST": {"Loop": ["main_app_beneficiary"]}}) as detector:
+            detector.view = "Loop"
+            for charity in charities:
+                list(charity.beneficiaries.all())
+
+        with self.assertLogs("main_app.nplusone", "WARNING"):
+            with nplusone.detect({**self.config, "ACTION": "warn"}):
+                for charity in charities:
+                    list(charity.beneficiaries.all())
+
+    def test_statistics_summaries_do_not_repeat_per_row(self):
+        reviewer = make_reviewer("nplus")
+        admin = User.objects.create_user(username="nplusadmin", password="x")
+        charity = make_charity("Many", admin_user=admin)
+        for i in range(6):
+            Program.objects.create(name=f"P{i}", description="d", ministry_owner="Health")
+            Event.objects.create(charity=charity, title=f"E{i}", description="d", location="l", city="Riyadh",
+                                 event_date=timezone.now() + timedelta(days=1), max_capacity=10)
+        with override_settings(NPLUSONE={**self.config, "ENABLED": True}):
+            self.client.force_authenticate(reviewer)
+            res = self.client.get(reverse("ministry-statistics"))
+            self.assertEqual(len(res.data["programs_summary"]), 6)
+            self.client.force_authenticate(admin)
+            res = self.client.get(reverse("charity-statistics"))
+            self.assertEqual(len(res.data["events_summary"]), 6)
+            self.assertEqual(self.client.post(reverse("charity-statistics"), {"export_type": "events"},
+                                              format="json").status_code, status.HTTP_200_OK)
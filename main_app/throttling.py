@@ -0,0 +1,122 @@
+import hashlib
+import re
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+re_rate = re.compile(r"^(\d+)/(\d*)([a-z]+)$")
+
+
+def parse_rate(rate):
+    """
+    Parse "<requests>/<period>" where period is an optional multiplier and
+    a unit, e.g. "10/min", "5/15m", "1000/h". Returns (requests, seconds).
+    """
+    match = re_rate.match(rate.replace(" ", "").lower())
+    if not match or match[3] not in PERIODS:
+        raise ImproperlyConfigured(f"Invalid throttle rate: {rate!r}")
+    return int(match[1]), int(match[2] or 1) * PERIODS[match[3]]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Sliding-window counter kept in the Django cache.
+
+    The estimate weights the previous fixed window by how much of it still
+    overlaps the sliding window, which needs two counters per key instead
+    of a timestamp log. Rates come from DEFAULT_THROTTLE_RATES under
+    "<view.throttle_scope>.<kind>", so each endpoint is tuned separately;
+    a missing rate disables that throttle. Only allowed requests are
+    counted.
+    """
+    kind = None
+    cache = cache
+    timer = time.time
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def get_rate(self, view):
+        scope = getattr(view, "throttle_scope", None)
+        if not scope:
+            return None
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f"{scope}.{self.kind}")
+        return parse_rate(rate) if rate else None
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        rate = self.get_rate(view)
+        if rate is None:
+            return True
+        if getattr(request, "_throttled", False):
+            # DRF consults every throttle; a request an earlier one already
+            # rejected must not use up this one's allowance.
+            return True
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return True
+
+        limit, window = rate
+        now = self.timer()
+        current = int(now // window)
+        elapsed = (now % window) / window
+        base = f"throttle:{view.throttle_scope}:{self.kind}:{ident}"
+        cur_key, prev_key = f"{base}:{current}", f"{base}:{current - 1}"
+        counts = self.cache.get_many([cur_key, prev_key])
+        cur, prev = counts.get(cur_key, 0), counts.get(prev_key, 0)
+
+        if prev * (1 - elapsed) + cur >= limit:
+            if cur >= limit or not prev:
+                self.wait_seconds = window * (1 - elapsed)
+            else:
+                # Time until the previous window's weight decays enough
+                self.wait_seconds = window * max(0.0, (1 - (limit - cur) / prev) - elapsed)
+            request._throttled = True
+            return False
+
+        if not self.cache.add(cur_key, 1, timeout=window * 2):
+            try:
+                self.cache.incr(cur_key)
+            except ValueError:
+                self.cache.set(cur_key, 1, timeout=window * 2)
+        return True
+
+    def wait(self):
+        return max(1, round(self.wait_seconds)) if self.wait_seconds is not None else None
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    kind = "ip"
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailRateThrottle(SlidingWindowThrottle):
+    """Keyed by the account being targeted, whatever IP the attempts come from."""
+    kind = "email"
+
+    def get_ident_key(self, request, view):
+        field = getattr(view, "throttle_email_field", "email")
+        try:
+            email = request.data.get(field)
+        except AttributeError:
+            return None
+        if not email or not isinstance(email, str):
+            return None
+        return hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+
+
+class GlobalRateThrottle(SlidingWindowThrottle):
+    """Ceiling for the endpoint as a whole, so a distributed burst cannot pin every worker."""
+    kind = "global"
+
+    def get_ident_key(self, request, view):
+        return "all"
+
+
+AUTH_THROTTLES = [IPRateThrottle, EmailRateThrottle, GlobalRateThrottle]
@@ -0,0 +1,154 @@
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import Beneficiary, EventRegistration, ProgramApplication
+
+TIME_SERIES_DEFAULTS = {
+    "MAX_BUCKETS": 1000,
+    "MAX_SERIES": 50,
+    "DEFAULT_DAYS": 30,
+}
+
+GRANULARITIES = ("day", "week", "month", "quarter")
+
+Source = namedtuple("Source", "model field groups")
+
+# group_by name -> (key field, label field or None)
+SOURCES = {
+    "applications": Source(ProgramApplication, "submitted_at", {
+        "status": ("status", None),
+        "program": ("program_id", "program__name"),
+        "charity": ("beneficiary__charity_id", "beneficiary__charity__name"),
+    }),
+    "registrations": Source(EventRegistration, "registered_at", {
+        "attended": ("attended", None),
+        "event": ("event_id", "event__title"),
+        "charity": ("event__charity_id", "event__charity__name"),
+    }),
+    "beneficiaries": Source(Beneficiary, "created_at", {
+        "active": ("is_active", None),
+        "charity": ("charity_id", "charity__name"),
+        "region": ("region", None),
+    }),
+}
+
+
+class TimeSeriesError(ValueError):
+    pass
+
+
+def time_series_settings():
+    return {**TIME_SERIES_DEFAULTS, **getattr(settings, "TIME_SERIES", {})}
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def truncate(day, granularity):
+    """Start of the bucket containing `day`; weeks start on Monday, as in the database."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def bucket_starts(start, end, granularity):
+    current = truncate(start, granularity)
+    while current <= end:
+        yield current
+        if granularity == "day":
+            current += timedelta(days=1)
+        elif granularity == "week":
+            current += timedelta(weeks=1)
+        else:
+            current = _add_months(current, 3 if granularity == "quarter" else 1)
+
+
+def count_buckets(queryset, field, start, end, granularity="day", group=None):
+    """
+    Count rows of `queryset` per `granularity` bucket of the datetime
+    `field` between the dates `start` and `end` (inclusive), optionally
+    split by a (key field, label field) group.
+
+    Runs one GROUP BY query whatever the range; empty buckets are filled
+    with zeros here. Returns (bucket start dates, {key: [label, counts]}).
+    """
+    if granularity not in GRANULARITIES:
+        raise TimeSeriesError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if start > end:
+        raise TimeSeriesError("start must not be after end")
+    limit = time_series_settings()["MAX_BUCKETS"]
+    buckets = list(islice(bucket_starts(start, end, granularity), limit + 1))
+    if len(buckets) > limit:
+        raise TimeSeriesError(f"More than {limit} buckets; shorten the range or use a coarser granularity")
+
+    key_field, label_field = group or (None, None)
+    columns = [c for c in (key_field, label_field) if c]
+    # Bounds on the raw column keep the range filter indexable.
+    tz = timezone.get_current_timezone()
+    rows = (queryset.order_by()
+            .filter(**{f"{field}__gte": timezone.make_aware(datetime.combine(start, time.min), tz),
+                       f"{field}__lt": timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)})
+            .annotate(bucket=Trunc(field, granularity, output_field=DateField(), tzinfo=tz))
+            .values("bucket", *columns)
+            .annotate(count=Count("pk")))
+
+    position = {b: i for i, b in enumerate(buckets)}
+    series = {}
+    for row in rows:
+        key = row[key_field] if key_field else None
+        entry = series.setdefault(key, [row[label_field] if label_field else key, [0] * len(buckets)])
+        entry[1][position[row["bucket"]]] += row["count"]
+    return buckets, series
+
+
+def time_series(queryset, field, start, end, granularity="day", group_by=None, groups=None):
+    """
+    Columnar time series for the API: bucket labels, the overall counts
+    and, when grouped, the largest MAX_SERIES series with the remainder
+    summed into "other".
+    """
+    group = None
+    if group_by:
+        if group_by not in (groups or {}):
+            raise TimeSeriesError(f"group_by must be one of {', '.join(groups or ())}")
+        group = groups[group_by]
+    buckets, series = count_buckets(queryset, field, start, end, granularity, group)
+    totals = [sum(column) for column in zip(*(counts for _, counts in series.values()))] or [0] * len(buckets)
+    result = {
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "buckets": [b.isoformat() for b in buckets],
+        "counts": totals,
+        "total": sum(totals),
+    }
+    if group:
+        ranked = sorted(series.items(), key=lambda item: -sum(item[1][1]))
+        limit = time_series_settings()["MAX_SERIES"]
+        result["group_by"] = group_by
+        result["series"] = [{"key": key, "label": label, "counts": counts, "total": sum(counts)}
+                            for key, (label, counts) in ranked[:limit]]
+        if len(ranked) > limit:
+            result["other"] = [sum(column) for column in zip(*(counts for _, (_, counts) in ranked[limit:]))]
+    return result
+
+
+def recent_daily_counts(queryset, field, days=None):
+    """The dashboards' last-N-days series, in their existing date/day/count shape."""
+    end = timezone.localdate()
+    days = days or time_series_settings()["DEFAULT_DAYS"]
+    buckets, series = count_buckets(queryset, field, end - timedelta(days=days - 1), end)
+    counts = series.get(None, [None, [0] * len(buckets)])[1]
+    return [{"date": b.strftime("%Y-%m-%d"), "day": b.strftime("%d/%m"), "count": n} for b, n in zip(buckets, counts)]
@@ -0,0 +1,230 @@
+import hashlib
+import os
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Charity, DocumentUpload, StoredDocument
+
+UPLOAD_DEFAULTS = {
+    "MAX_BYTES": 20 * 1024 * 1024,
+    "CHUNK_BYTES": 2 * 1024 * 1024,
+    "READ_BYTES": 64 * 1024,
+    "EXPIRY_HOURS": 24,
+    # Unfinished, unexpired uploads one user, or one IP when anonymous, may hold
+    "MAX_OPEN_UPLOADS": 5,
+    "CONTENT_TYPES": ("application/pdf", "image/png", "image/jpeg"),
+    "TEMP_DIR": None,
+}
+
+# Leading bytes of each accepted format, checked against the first chunk.
+MAGIC = {
+    "application/pdf": (b"%PDF-",),
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/jpeg": (b"\xff\xd8\xff",),
+}
+
+
+class UploadError(Exception):
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def upload_settings():
+    return {**UPLOAD_DEFAULTS, **getattr(settings, "DOCUMENT_UPLOADS", {})}
+
+
+def partial_dir():
+    path = upload_settings()["TEMP_DIR"] or Path(settings.MEDIA_ROOT) / "uploads" / "partial"
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def partial_path(upload):
+    return partial_dir() / f"{upload.id}.part"
+
+
+def document_name(digest):
+    return f"documents/sha256/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def create_upload(owner, filename, size, content_type, client_ip=None):
+    config = upload_settings()
+    owner = owner if owner and owner.is_authenticated else None
+    if not filename:
+        raise UploadError("filename is required.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("size must be an integer.")
+    if size <= 0:
+        raise UploadError("size must be positive.")
+    if size > config["MAX_BYTES"]:
+        raise UploadError(f"File exceeds the {config['MAX_BYTES']} byte limit.")
+    if content_type not in config["CONTENT_TYPES"]:
+        raise UploadError(f"Unsupported content type: {content_type}")
+    now = timezone.now()
+    open_uploads = DocumentUpload.objects.filter(status="UPLOADING", expires_at__gt=now)
+    open_uploads = open_uploads.filter(owner=owner) if owner else open_uploads.filter(owner=None, client_ip=client_ip)
+    if open_uploads.count() >= config["MAX_OPEN_UPLOADS"]:
+        raise UploadError(f"Too many unfinished uploads; complete one or wait {config['EXPIRY_HOURS']} hours.")
+    upload = DocumentUpload.objects.create(
+        owner=owner, client_ip=None if owner else client_ip,
+        filename=os.path.basename(filename)[:255], size=size, content_type=content_type,
+        expires_at=now + timedelta(hours=config["EXPIRY_HOURS"]),
+    )
+    partial_path(upload).touch()
+    return upload
+
+
+# Running hashes of in-progress uploads handled by this process, keyed by
+# upload id. If a chunk lands on another worker (or after a restart) the
+# hash is rebuilt from the partial file, still in bounded memory.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _hasher_at(upload, path, offset):
+    with _hashers_lock:
+        cached = _hashers.pop(upload.id, None)
+    if cached and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    remaining, read_bytes = offset, upload_settings()["READ_BYTES"]
+    with open(path, "rb") as fh:
+        while remaining:
+            block = fh.read(min(read_bytes, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def append_chunk(upload_id, offset, length, stream):
+    """
+    Stream `length` bytes from `stream` into the upload at `offset`.
+
+    Bytes are written and hashed in READ_BYTES pieces, so memory use does
+    not depend on the chunk or file size. Returns the updated upload.
+    """
+    config = upload_settings()
+    if length > config["CHUNK_BYTES"]:
+        raise UploadError(f"Chunks are limited to {config['CHUNK_BYTES']} bytes.")
+
+    with transaction.atomic():
+        upload = DocumentUpload.objects.select_for_update().get(id=upload_id)
+        if upload.status != "UPLOADING":
+            raise UploadError("Upload is already complete.", upload.received)
+        if upload.expires_at < timezone.now():
+            raise UploadError("Upload has expired.", upload.received)
+        if offset != upload.received:
+            raise UploadError("Offset does not match the bytes received so far.", upload.received)
+        if offset + length > upload.size:
+            raise UploadError("Chunk runs past the declared size.", upload.received)
+
+        path = partial_path(upload)
+        hasher = _hasher_at(upload, path, offset)
+        written = 0
+        with open(path, "r+b") as fh:
+            # Drop anything an interrupted request wrote past the last
+            # acknowledged offset.
+            fh.seek(offset)
+            fh.truncate()
+            while written < length:
+                block = stream.read(min(config["READ_BYTES"], length - written))
+                if not block:
+                    break
+                if offset == 0 and written == 0 and not _sniff(block, upload.content_type):
+                    raise UploadError(f"File content is not {upload.content_type}.")
+                fh.write(block)
+                hasher.update(block)
+                written += len(block)
+        if written != length:
+            raise UploadError("Request body is shorter than Content-Range.", upload.received)
+
+        upload.received = offset + written
+        if upload.received == upload.size:
+            upload.document = _store(upload, path, hasher.hexdigest())
+            upload.status = "COMPLETE"
+        else:
+            with _hashers_lock:
+                _hashers[upload.id] = (upload.received, hasher)
+        upload.save(update_fields=["received", "status", "document", "updated_at"])
+    return upload
+
+
+def _sniff(head, content_type):
+    return any(head.startswith(m) for m in MAGIC.get(content_type, (b"",)))
+
+
+def _store(upload, path, digest):
+    existing = StoredDocument.objects.filter(sha256=digest).first()
+    if existing is None:
+        name = document_name(digest)
+        if not default_storage.exists(name):
+            with open(path, "rb") as fh:
+                name = default_storage.save(name, File(fh))
+        try:
+            with transaction.atomic():
+                existing = StoredDocument.objects.create(
+                    sha256=digest, file=name, size=upload.size, content_type=upload.content_type)
+        except IntegrityError:
+            # Same content finished concurrently elsewhere
+            existing = StoredDocument.objects.get(sha256=digest)
+    path.unlink(missing_ok=True)
+    return existing
+
+
+def resolve_document(value):
+    """
+    Map a register-form document field to something a FileField accepts:
+    a completed upload id becomes its stored file name, an uploaded file is
+    passed through after the size check.
+    """
+    config = upload_settings()
+    if hasattr(value, "read"):
+        if value.size > config["MAX_BYTES"]:
+            raise UploadError(f"File exceeds the {config['MAX_BYTES']} byte limit.")
+        return value
+    upload = DocumentUpload.objects.select_related("document").filter(id=_as_uuid(value)).first()
+    if upload is None or upload.status != "COMPLETE":
+        raise UploadError("Upload not found or not complete.")
+    return upload.document.file.name
+
+
+def _as_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise UploadError("Invalid upload id.")
+
+
+def purge_stale(now=None):
+    """Delete expired uploads, their partial files, and stored documents nothing references."""
+    now = now or timezone.now()
+    stale = DocumentUpload.objects.filter(expires_at__lt=now)
+    removed_uploads = 0
+    for upload in stale.iterator():
+        partial_path(upload).unlink(missing_ok=True)
+        removed_uploads += 1
+    stale.delete()
+
+    referenced = set(Charity.objects.exclude(license_certificate="").values_list("license_certificate", flat=True))
+    referenced |= set(Charity.objects.exclude(admin_id_document="").values_list("admin_id_document", flat=True))
+    removed_documents = 0
+    orphans = StoredDocument.objects.filter(uploads__isnull=True).exclude(file__in=referenced)
+    for doc in orphans.iterator():
+        default_storage.delete(doc.file.name)
+        doc.delete()
+        removed_documents += 1
+    return removed_uploads, removed_documents
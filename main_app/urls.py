@@ -3,23 +3,38 @@ from .views import (
     Home,
     CharitiesIndex,
     CharityDetail,
+    CharityDocument,
     BeneficiariesIndex,
     BeneficiaryDetail,
     ProgramsIndex,
     ProgramDetail,
     ProgramApplications,
+    ReviewQueue,
+    ApplicationReview,
     ProgramStatistics,
     MinistryStatistics,
+    MinistryDistributions,
+    TimeSeries,
+    Pivot,
+    ProcessingTimes,
+    ColumnarExport,
     CharityStatistics,
     EventsIndex,
     EventDetail,
+    EventSeriesIndex,
+    EventSeriesDetail,
     EventRegistrations,
     CreateUserView,
     LoginView,
     VerifyUserView,
     UserProfileView,
     CharityRegisterView,
-    MinistryRegisterView
+    MinistryRegisterView,
+    ChangesFeed,
+    AuditLog,
+    live_updates,
+    DocumentUploadsIndex,
+    DocumentUploadDetail,
 )
 
 
@@ -28,6 +43,7 @@ urlpatterns = [
     # Charities urls
     path("charities/", CharitiesIndex.as_view(), name="charities-index"),
     path("charities/<int:charity_id>/", CharityDetail.as_view(), name="charity-detail"),
+    path("charities/<int:charity_id>/documents/<str:document>/", CharityDocument.as_view(), name="charity-document"),
     # Beneficiaries urls
     path("beneficiaries/", BeneficiariesIndex.as_view(), name="beneficiaries-index"),
     path("beneficiaries/<int:beneficiary_id>/", BeneficiaryDetail.as_view(), name="beneficiary-detail"),
@@ -36,12 +52,22 @@ urlpatterns = [
     path("programs/<int:program_id>/", ProgramDetail.as_view(), name="program-detail"),
     path("programs/<int:program_id>/applications/", ProgramApplications.as_view(), name="program-applications"),
     path("programs/<int:program_id>/statistics/", ProgramStatistics.as_view(), name="program-statistics"),
+    # Review queue
+    path("applications/queue/", ReviewQueue.as_view(), name="review-queue"),
+    path("applications/<int:application_id>/review/", ApplicationReview.as_view(), name="application-review"),
     # Ministry Statistics
     path("ministry/statistics/", MinistryStatistics.as_view(), name="ministry-statistics"),
+    path("ministry/distributions/", MinistryDistributions.as_view(), name="ministry-distributions"),
+    path("statistics/time-series/", TimeSeries.as_view(), name="time-series"),
+    path("statistics/pivot/", Pivot.as_view(), name="pivot"),
+    path("statistics/processing-times/", ProcessingTimes.as_view(), name="processing-times"),
+    path("exports/<str:dataset>/", ColumnarExport.as_view(), name="columnar-export"),
     # Charity Statistics
     path("charity/statistics/", CharityStatistics.as_view(), name="charity-statistics"),
     # Events urls
     path("events/", EventsIndex.as_view(), name="events-index"),
+    path("events/series/", EventSeriesIndex.as_view(), name="event-series-index"),
+    path("events/series/<int:series_id>/", EventSeriesDetail.as_view(), name="event-series-detail"),
     path("events/<int:event_id>/", EventDetail.as_view(), name="event-detail"),
     path("events/<int:event_id>/registrations/", EventRegistrations.as_view(), name="event-registrations"),
     path("events/<int:event_id>/registrations/<int:registration_id>/", EventRegistrations.as_view(), name="event-registration-delete"),
@@ -52,4 +78,12 @@ urlpatterns = [
     path("users/profile/", UserProfileView.as_view(), name="user-profile"),
     path("charities/register/", CharityRegisterView.as_view(), name="charity_register"),
     path("ministries/register/", MinistryRegisterView.as_view(), name="ministry_register"),
+    # Document uploads
+    path("uploads/", DocumentUploadsIndex.as_view(), name="uploads-index"),
+    path("uploads/<uuid:upload_id>/", DocumentUploadDetail.as_view(), name="upload-detail"),
+    # Sync
+    path("changes/", ChangesFeed.as_view(), name="changes-feed"),
+    path("live/", live_updates, name="live-updates"),
+    # Audit
+    path("audit/", AuditLog.as_view(), name="audit-log"),
 ]
@@ -3,26 +3,58 @@
 # ===== IMPORTS & HELPERS =====
 from datetime import timedelta
 import csv
+import re
+import tempfile
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from django.db import IntegrityError
-from django.db.models import Count
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, DurationField, F, Q
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics, status, permissions
 from rest_framework.exceptions import PermissionDenied, NotFound
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Charity, Beneficiary, Program, Event, EventRegistration, ProgramApplication
+from . import audit
+from .appdata import AppDataError, count_by, data_filters, filter_applications
+from .archive import application_archive_summary, include_archive, registration_archive_summary
+from .distributions import (
+    GROUP_FIELDS, METRICS, DistributionError, distribution_settings, distributions, parse_edges, parse_quantiles
+)
+from .columnar import (
+    DATASETS as COLUMNAR_DATASETS, FORMATS as COLUMNAR_FORMATS, ColumnarError, available as columnar_available,
+    export as export_columnar
+)
+from .documents import DOCUMENT_FIELDS, serve_document
+from .changes import RESOURCES, CursorExpired, InvalidCursor, decode_cursor, feed_settings, iter_changes
+from .exports import export_bundle, export_settings
+from .history import DEFAULT_DAYS as HISTORY_DEFAULT_DAYS, reviewer_throughput, stage_percentiles
+from .idempotency import idempotent
+from .live import get_broker, stream as live_stream, subscriber_filter
+from .pivot import FACTS, PivotError, parse_names, pivot
+from .models import (
+    Charity, Beneficiary, Program, Event, EventSeries, EventRegistration, ProgramApplication, DocumentUpload,
+    ArchivedProgramApplication, ArchivedEventRegistration, ApplicationStatusChange
+)
+from .notifications import notify_event
+from .recurrence import DETAIL_FIELDS, apply_changes, delete_series, extend
 from .serializers import (
-    CharitySerializer, BeneficiarySerializer, ProgramSerializer, EventSerializer,
-    EventRegistrationSerializer, ProgramApplicationSerializer, UserSerializer
+    AuditEntrySerializer, CharitySerializer, BeneficiarySerializer, ProgramSerializer, EventSerializer, EventSeriesSerializer,
+    EventRegistrationSerializer, ProgramApplicationSerializer, UserSerializer, DocumentUploadSerializer
 )
+from .throttling import AUTH_THROTTLES, GlobalRateThrottle, IPRateThrottle
+from .timeseries import GRANULARITIES, SOURCES, TimeSeriesError, recent_daily_counts, time_series, time_series_settings
+from .uploads import UploadError, append_chunk, create_upload, resolve_document, upload_settings
+from .workqueue import ClaimError, claim, held_by, queue_settings, release, review
 
 
 def parse_date(value):
@@ -70,6 +102,10 @@ class CharitiesIndex(generics.ListCreateAPIView):
             return err("Only superusers can create charities", status.HTTP_403_FORBIDDEN)
         return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        with audit.atomic():
+            audit.record_created(self.request.user, serializer.save())
+
 
 class CharityDetail(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -103,6 +139,33 @@ class CharityDetail(generics.RetrieveUpdateDestroyAPIView):
             return err("Only superusers can delete charities", status.HTTP_403_FORBIDDEN)
         return super().destroy(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        with audit.atomic(), audit.tracking(self.request.user, serializer.instance):
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with audit.atomic(), audit.tracking(self.request.user, instance, "DELETE"):
+            instance.delete()
+
+
+class CharityDocument(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, charity_id, document):
+        if document not in DOCUMENT_FIELDS:
+            raise NotFound("Document not found")
+        charity = get_object_or_404(Charity, id=charity_id)
+        user = request.user
+        if not user.is_superuser and not (hasattr(user, "charity_admin") and user.charity_admin == charity):
+            return err("You don't have permission to view this document", status.HTTP_403_FORBIDDEN)
+        field_file = getattr(charity, document)
+        if not field_file:
+            raise NotFound("Document not found")
+        try:
+            return serve_document(request, field_file, f"charity_{charity.id}_{document}")
+        except FileNotFoundError:
+            raise NotFound("Document file is missing")
+
 
 # ===== BENEFICIARIES =====
 class BeneficiariesIndex(generics.ListCreateAPIView):
@@ -120,6 +183,7 @@ class BeneficiariesIndex(generics.ListCreateAPIView):
             return qs.filter(user=user)
         return qs.none()
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         user = request.user
         if not (user.is_superuser or hasattr(user, "charity_admin")):
@@ -165,7 +229,8 @@ class BeneficiariesIndex(generics.ListCreateAPIView):
         payload["user"], payload["charity"] = created_user.id, charity.id
         serializer = self.get_serializer(data=payload)
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=created_user, charity=charity)
+        with audit.atomic():
+            audit.record_created(user, serializer.save(user=created_user, charity=charity))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -204,23 +269,26 @@ class BeneficiaryDetail(generics.RetrieveUpdateDestroyAPIView):
         payload = request.data.copy()
         payload["charity"] = beneficiary.charity.id
         user_data = request.data.get("user") or {}
-        if user_data and (user.is_superuser or (hasattr(user, "charity_admin") and user.charity_admin == beneficiary.charity)):
-            beneficiary.user.first_name = user_data.get(
-                "first_name", beneficiary.user.first_name)
-            beneficiary.user.last_name = user_data.get(
-                "last_name", beneficiary.user.last_name)
-            beneficiary.user.save()
-
         serializer = self.get_serializer(beneficiary, data=payload)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with audit.atomic():
+            if user_data and (user.is_superuser or (hasattr(user, "charity_admin") and user.charity_admin == beneficiary.charity)):
+                with audit.tracking(user, beneficiary.user):
+                    beneficiary.user.first_name = user_data.get(
+                        "first_name", beneficiary.user.first_name)
+                    beneficiary.user.last_name = user_data.get(
+                        "last_name", beneficiary.user.last_name)
+                    beneficiary.user.save()
+            with audit.tracking(user, beneficiary):
+                serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
         beneficiary = self.get_object()
         if not request.user.is_superuser and not (hasattr(request.user, "charity_admin") and request.user.charity_admin == beneficiary.charity):
             return err("You don't have permission to delete this beneficiary", status.HTTP_403_FORBIDDEN)
-        beneficiary.delete()
+        with audit.atomic(), audit.tracking(request.user, beneficiary, "DELETE"):
+            beneficiary.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -247,7 +315,8 @@ class ProgramsIndex(generics.ListCreateAPIView):
         payload["ministry_owner"] = name
         serializer = self.get_serializer(data=payload)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with audit.atomic():
+            audit.record_created(request.user, serializer.save())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -282,7 +351,8 @@ class ProgramDetail(generics.RetrieveUpdateDestroyAPIView):
             payload["ministry_owner"] = name
         serializer = self.get_serializer(program, data=payload)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with audit.atomic(), audit.tracking(request.user, program):
+            serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
@@ -292,7 +362,8 @@ class ProgramDetail(generics.RetrieveUpdateDestroyAPIView):
         name = ministry_name(request.user)
         if name and program.ministry_owner and name.lower() not in program.ministry_owner.lower():
             return err("You can only delete programs that belong to your ministry", status.HTTP_403_FORBIDDEN)
-        program.delete()
+        with audit.atomic(), audit.tracking(request.user, program, "DELETE"):
+            program.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -313,10 +384,24 @@ class ProgramApplications(APIView):
                     program_id=program_id, beneficiary__user=user)
             else:
                 qs = ProgramApplication.objects.none()
+
+            params = request.query_params
+            group_key = params.get("group_by_data")
+            if group_key or any(True for _ in data_filters(params)):
+                program = get_object_or_404(Program, id=program_id)
+                qs = filter_applications(qs, program, params)
+                if group_key:
+                    return Response({"key": group_key, "counts": count_by(qs, program, group_key)},
+                                    status=status.HTTP_200_OK)
+            if params.get("count") == "true":
+                return Response({"count": qs.count()}, status=status.HTTP_200_OK)
             return Response(self.serializer_class(qs, many=True).data, status=status.HTTP_200_OK)
+        except AppDataError as e:
+            return err(str(e))
         except Exception as e:
             return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @idempotent
     def post(self, request, program_id):
         try:
             if not hasattr(request.user, "beneficiary_profile"):
@@ -330,7 +415,8 @@ class ProgramApplications(APIView):
             serializer = self.serializer_class(data=payload)
             serializer.is_valid(raise_exception=True)
             try:
-                serializer.save()
+                with transaction.atomic():
+                    serializer.save()
             except IntegrityError:
                 return err("You have already applied to this program")
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -338,6 +424,74 @@ class ProgramApplications(APIView):
             return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# ===== REVIEW QUEUE =====
+class ReviewQueue(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ProgramApplicationSerializer
+
+    def get(self, request):
+        try:
+            if not is_ministry(request.user):
+                return err("Only ministry users can review applications", status.HTTP_403_FORBIDDEN)
+            qs = held_by(request.user).order_by("submitted_at", "id")
+            return Response(self.serializer_class(qs, many=True).data, status=status.HTTP_200_OK)
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def post(self, request):
+        try:
+            if not is_ministry(request.user):
+                return err("Only ministry users can review applications", status.HTTP_403_FORBIDDEN)
+            name = ministry_name(request.user)
+            if not name:
+                return err("Ministry name not found")
+            try:
+                count = int(request.data.get("count", 10))
+            except (TypeError, ValueError):
+                return err("count must be an integer")
+            programs = Program.objects.filter(ministry_owner__icontains=name)
+            program_id = request.data.get("program_id")
+            if program_id:
+                programs = programs.filter(id=program_id)
+            ids = claim(request.user, programs, count)
+            qs = ProgramApplication.objects.filter(id__in=ids).order_by("submitted_at", "id")
+            return Response({
+                "claimed": self.serializer_class(qs, many=True).data,
+                "lease_seconds": queue_settings()["LEASE_SECONDS"],
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def delete(self, request):
+        try:
+            if not is_ministry(request.user):
+                return err("Only ministry users can review applications", status.HTTP_403_FORBIDDEN)
+            ids = request.data.get("ids")
+            return Response({"released": release(request.user, ids)}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ApplicationReview(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ProgramApplicationSerializer
+
+    def post(self, request, application_id):
+        try:
+            if not is_ministry(request.user):
+                return err("Only ministry users can review applications", status.HTTP_403_FORBIDDEN)
+            decision = request.data.get("status")
+            if decision not in ("APPROVED", "REJECTED"):
+                return err("status must be APPROVED or REJECTED")
+            try:
+                application = review(request.user, application_id, decision, request.data.get("review_notes", ""))
+            except ClaimError as e:
+                return err(str(e), status.HTTP_409_CONFLICT)
+            return Response(self.serializer_class(application).data, status=status.HTTP_200_OK)
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # ===== EVENTS =====
 class EventsIndex(generics.ListCreateAPIView):
     permission_classes = [permissions.AllowAny]
@@ -368,6 +522,67 @@ class EventsIndex(generics.ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class EventSeriesIndex(generics.ListCreateAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = EventSeriesSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = EventSeries.objects.select_related("charity").order_by("id")
+        if user.is_superuser:
+            return qs
+        if hasattr(user, "charity_admin"):
+            return qs.filter(charity=user.charity_admin)
+        return qs.none()
+
+    def create(self, request, *args, **kwargs):
+        user = request.user
+        if not (user.is_superuser or hasattr(user, "charity_admin")):
+            return err("Only superusers and charity admins can create event series", status.HTTP_403_FORBIDDEN)
+        payload = request.data.copy()
+        if hasattr(user, "charity_admin"):
+            payload["charity"] = user.charity_admin.id
+        serializer = self.get_serializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            series = serializer.save()
+            created = extend(series)
+        return Response({**serializer.data, "generated_until": series.generated_until, "occurrences_created": created},
+                        status=status.HTTP_201_CREATED)
+
+
+class EventSeriesDetail(generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = EventSeriesSerializer
+    lookup_field = "id"
+    lookup_url_kwarg = "series_id"
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = EventSeries.objects.select_related("charity")
+        if user.is_superuser:
+            return qs
+        if hasattr(user, "charity_admin"):
+            return qs.filter(charity=user.charity_admin)
+        return qs.none()
+
+    def perform_update(self, serializer):
+        series = serializer.instance
+        before = {f: getattr(series, f) for f in (*DETAIL_FIELDS, "until")}
+        with transaction.atomic():
+            # A series and its occurrences stay with the charity that created them
+            serializer.save(charity=series.charity)
+            apply_changes(series, before)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            delete_series(instance)
+
+
+# Registered beneficiaries are notified when any of these change
+NOTIFIED_EVENT_FIELDS = ("title", "event_date", "location", "city")
+
+
 class EventDetail(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = EventSerializer
@@ -384,7 +599,14 @@ class EventDetail(generics.RetrieveUpdateDestroyAPIView):
         payload["charity"] = event.charity.id
         serializer = self.get_serializer(event, data=payload)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        before = [getattr(event, f) for f in NOTIFIED_EVENT_FIELDS]
+        was_active = event.is_active
+        with transaction.atomic():
+            serializer.save()
+            if was_active and not event.is_active:
+                notify_event(event, "EVENT_CANCELLED")
+            elif event.is_active and before != [getattr(event, f) for f in NOTIFIED_EVENT_FIELDS]:
+                notify_event(event, "EVENT_UPDATED")
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
@@ -392,7 +614,10 @@ class EventDetail(generics.RetrieveUpdateDestroyAPIView):
         user = request.user
         if not (user.is_superuser or (hasattr(user, "charity_admin") and user.charity_admin == event.charity)):
             return err("You don't have permission to delete this event", status.HTTP_403_FORBIDDEN)
-        event.delete()
+        with transaction.atomic():
+            if event.is_active and event.event_date > timezone.now():
+                notify_event(event, "EVENT_CANCELLED")
+            event.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -417,6 +642,7 @@ class EventRegistrations(APIView):
         except Exception as error:
             return err(str(error), status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @idempotent
     def post(self, request, event_id):
         try:
             if not hasattr(request.user, "beneficiary_profile"):
@@ -437,7 +663,8 @@ class EventRegistrations(APIView):
             serializer = self.serializer_class(data=payload)
             serializer.is_valid(raise_exception=True)
             try:
-                instance = serializer.save()
+                with transaction.atomic():
+                    instance = serializer.save()
             except IntegrityError:
                 return err("You are already registered for this event")
 
@@ -466,6 +693,8 @@ class EventRegistrations(APIView):
 class CreateUserView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = "signup"
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -485,16 +714,15 @@ class CreateUserView(generics.CreateAPIView):
 
 
 class LoginView(APIView):
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = "login"
+
     def post(self, request):
         email, password = request.data.get(
             "email"), request.data.get("password")
         if not email or not password:
             return err("Email and password are required", status.HTTP_400_BAD_REQUEST)
-        try:
-            found = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return err("Invalid credentials", status.HTTP_401_UNAUTHORIZED)
-        user = authenticate(username=found.username, password=password)
+        user = authenticate(request, email=email, password=password)
         if not user:
             return err("Invalid credentials", status.HTTP_401_UNAUTHORIZED)
         refresh = RefreshToken.for_user(user)
@@ -519,38 +747,40 @@ class UserProfileView(APIView):
             user = request.user
             old_first_name = user.first_name
 
-            charity_name_update = request.data.get("charity_name")
-            if charity_name_update and hasattr(user, "charity_admin"):
-                charity = user.charity_admin
-                charity.name = charity_name_update
-                charity.save()
-
             serializer = self.serializer_class(
                 user, data=request.data, partial=True)
-            if serializer.is_valid():
-                if request.data.get("password"):
-                    user.set_password(request.data["password"])
-                    user.save()
-                    validated = serializer.validated_data.copy()
-                    validated.pop("password", None)
-                    validated.pop("charity_name", None)
-                    serializer.save(**validated)
-                else:
-                    validated = serializer.validated_data.copy()
-                    validated.pop("charity_name", None)
-                    serializer.save(**validated)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            with audit.atomic():
+                charity_name_update = request.data.get("charity_name")
+                if charity_name_update and hasattr(user, "charity_admin"):
+                    charity = user.charity_admin
+                    with audit.tracking(user, charity):
+                        charity.name = charity_name_update
+                        charity.save()
+
+                with audit.tracking(user, user):
+                    # Removed here so the serializer cannot store it unhashed
+                    serializer.validated_data.pop("password", None)
+                    if request.data.get("password"):
+                        user.set_password(request.data["password"])
+                        # Only the fact of the change is logged, never the hash
+                        audit.record(user, "UPDATE", user, {"password": [None, "changed"]})
+                    serializer.save()
 
                 if user.is_superuser and "first_name" in request.data:
                     new_first_name = request.data["first_name"]
                     if old_first_name and new_first_name and old_first_name != new_first_name:
-                        Program.objects.filter(ministry_owner__icontains=old_first_name).update(
-                            ministry_owner=new_first_name)
-
-                data = self.serializer_class(user).data
-                data["charity_admin"] = {"id": user.charity_admin.id, "name": user.charity_admin.name} if hasattr(
-                    user, "charity_admin") else None
-                return Response(data, status=status.HTTP_200_OK)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                        renamed = Program.objects.filter(ministry_owner__icontains=old_first_name)
+                        for program in renamed.only("id", "ministry_owner"):
+                            audit.record(user, "UPDATE", program,
+                                         {"ministry_owner": [program.ministry_owner, new_first_name]})
+                        renamed.update(ministry_owner=new_first_name, updated_at=timezone.now())
+
+            data = self.serializer_class(user).data
+            data["charity_admin"] = {"id": user.charity_admin.id, "name": user.charity_admin.name} if hasattr(
+                user, "charity_admin") else None
+            return Response(data, status=status.HTTP_200_OK)
         except Exception as e:
             return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -569,6 +799,8 @@ class VerifyUserView(APIView):
 
 class CharityRegisterView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = "register"
 
     def post(self, request):
         try:
@@ -584,6 +816,11 @@ class CharityRegisterView(APIView):
                 return err("Email already exists.")
             if Charity.objects.filter(registration_number=d["registration_number"]).exists():
                 return err("Registration number already exists.")
+            try:
+                license_certificate = resolve_document(d["license_certificate"])
+                admin_id_document = resolve_document(d["admin_id_document"])
+            except UploadError as e:
+                return err(str(e))
 
             parts = d["admin_name"].strip().split(maxsplit=1)
             first_name, last_name = (
@@ -604,7 +841,7 @@ class CharityRegisterView(APIView):
                 name=d["organization_name"], registration_number=d["registration_number"],
                 issuing_authority=d["issuing_authority"], charity_type=d["charity_type"],
                 email=d["email"], phone=d["phone"], address=d["address"], city="", region="",
-                license_certificate=d.get("license_certificate"), admin_id_document=d.get("admin_id_document"),
+                license_certificate=license_certificate, admin_id_document=admin_id_document,
                 admin_user=user, is_active=False,
             )
             refresh = RefreshToken.for_user(user)
@@ -618,6 +855,9 @@ class CharityRegisterView(APIView):
 
 class MinistryRegisterView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = "register"
+    throttle_email_field = "ministry_email"
 
     def post(self, request):
         try:
@@ -682,49 +922,60 @@ class MinistryStatistics(APIView):
             if date_to:
                 apps = apps.filter(submitted_at__date__lte=date_to)
 
+            program_counts = programs.aggregate(
+                total=Count("id"), active=Count("id", filter=Q(status="ACTIVE")),
+                inactive=Count("id", filter=Q(status="INACTIVE")), closed=Count("id", filter=Q(status="CLOSED")))
+            per_program = {
+                row["program_id"]: row for row in apps.order_by().values("program_id").annotate(
+                    total=Count("id"), beneficiaries=Count("beneficiary", distinct=True))
+            }
             statistics = {
                 "ministry_name": name,
-                "total_programs": programs.count(),
-                "active_programs": programs.filter(status="ACTIVE").count(),
-                "inactive_programs": programs.filter(status="INACTIVE").count(),
-                "closed_programs": programs.filter(status="CLOSED").count(),
+                "total_programs": program_counts["total"],
+                "active_programs": program_counts["active"],
+                "inactive_programs": program_counts["inactive"],
+                "closed_programs": program_counts["closed"],
                 "total_applications": apps.count(),
                 "unique_beneficiaries": apps.values("beneficiary").distinct().count(),
                 "applications_by_status": list(apps.values("status").annotate(count=Count("id")).order_by("status")),
                 "programs_summary": [
                     {
                         "id": p.id, "name": p.name, "status": p.status,
-                        "total_applications": apps.filter(program=p).count(),
-                        "unique_beneficiaries": apps.filter(program=p).values("beneficiary").distinct().count(),
+                        "total_applications": per_program.get(p.id, {}).get("total", 0),
+                        "unique_beneficiaries": per_program.get(p.id, {}).get("beneficiaries", 0),
                     } for p in programs
                 ],
                 "applications_by_program": list(
                     apps.values("program__id", "program__name").annotate(
                         count=Count("id")).order_by("-count")
                 ),
-                "applications_over_time": [
-                    {
-                        "date": (timezone.now().date() - timedelta(days=29-i)).strftime("%Y-%m-%d"),
-                        "day": (timezone.now().date() - timedelta(days=29-i)).strftime("%d/%m"),
-                        "count": apps.filter(submitted_at__date=(timezone.now().date() - timedelta(days=29-i))).count()
-                    } for i in range(30)
-                ],
+                "applications_over_time": recent_daily_counts(apps, "submitted_at"),
                 "applications_by_charity": list(
                     apps.values("beneficiary__charity__id",
                                 "beneficiary__charity__name")
                     .annotate(count=Count("id")).order_by("-count")[:10]
                 ),
                 "recent_applications": apps.filter(submitted_at__gte=timezone.now()-timedelta(days=7)).count(),
-                "avg_processing_days": (lambda rows: round(sum(rows)/len(rows), 1) if rows else None)(
-                    [(a.reviewed_at - a.submitted_at).days for a in apps.exclude(reviewed_at__isnull=True)
-                     if a.submitted_at and a.reviewed_at]
-                ),
+                "avg_processing_days": (lambda avg: round(avg.total_seconds() / 86400, 1) if avg else None)(
+                    apps.filter(reviewed_at__isnull=False).aggregate(
+                        avg=Avg(F("reviewed_at") - F("submitted_at"), output_field=DurationField()))["avg"]),
                 "filters_applied": {
                     "program_id": program_id, "status": status_filter,
                     "date_from": request.query_params.get("date_from"),
                     "date_to": request.query_params.get("date_to"),
                 }
             }
+            if include_archive(request.query_params):
+                archived = ArchivedProgramApplication.objects.filter(ministry_owner__icontains=name)
+                if program_id:
+                    archived = archived.filter(program_id=program_id)
+                if status_filter:
+                    archived = archived.filter(status=status_filter)
+                if date_from:
+                    archived = archived.filter(submitted_at__date__gte=date_from)
+                if date_to:
+                    archived = archived.filter(submitted_at__date__lte=date_to)
+                statistics["archive"] = application_archive_summary(archived)
             return Response(statistics, status=status.HTTP_200_OK)
         except PermissionDenied as e:
             return err(str(e), status.HTTP_403_FORBIDDEN)
@@ -758,6 +1009,21 @@ class MinistryStatistics(APIView):
             if date_to:
                 apps = apps.filter(submitted_at__date__lte=date_to)
 
+            if export_type == "bundle":
+                # Shards run in this process unless REQUEST_WORKERS says otherwise;
+                # export_ministry_bundle is the parallel path for large exports
+                bundle = tempfile.TemporaryFile()
+                try:
+                    export_bundle(bundle, name, shard_by=request.data.get("shard_by", "program"),
+                                  program_id=program_id, status=status_filter, date_from=date_from, date_to=date_to,
+                                  workers=export_settings()["REQUEST_WORKERS"])
+                except ValueError as e:
+                    bundle.close()
+                    return err(str(e))
+                bundle.seek(0)
+                return FileResponse(bundle, as_attachment=True, content_type="application/zip",
+                                    filename=f'ministry_export_{name.replace(" ", "_")}_{timezone.now().strftime("%Y%m%d")}.zip')
+
             response = HttpResponse(content_type="text/csv")
             response["Content-Disposition"] = (
                 f'attachment; filename="ministry_statistics_{name.replace(" ", "_")}_{timezone.now().strftime("%Y%m%d")}.csv"'
@@ -806,6 +1072,229 @@ class MinistryStatistics(APIView):
             return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class MinistryDistributions(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            if not is_ministry(request.user):
+                return err("Only ministry users can view beneficiary distributions", status.HTTP_403_FORBIDDEN)
+            params = request.query_params
+            metrics = [m for m in params.get("metrics", ",".join(METRICS)).split(",") if m]
+            if not metrics or any(m not in METRICS for m in metrics):
+                return err(f"metrics must be a comma-separated subset of {', '.join(METRICS)}")
+            group_by = params.get("group_by") or None
+            if group_by and group_by not in GROUP_FIELDS:
+                return err(f"group_by must be one of {', '.join(GROUP_FIELDS)}")
+            config = distribution_settings()
+            edges = {m: parse_edges(params[f"bins_{m}"], config["MAX_BINS"]) for m in metrics if params.get(f"bins_{m}")}
+            quantiles = parse_quantiles(params["quantiles"]) if params.get("quantiles") else None
+
+            beneficiaries = Beneficiary.objects.all()
+            if params.get("charity_id"):
+                beneficiaries = beneficiaries.filter(charity_id=params["charity_id"])
+            if params.get("region"):
+                beneficiaries = beneficiaries.filter(region=params["region"])
+            if params.get("city"):
+                beneficiaries = beneficiaries.filter(city=params["city"])
+            if params.get("is_active") in ("true", "false"):
+                beneficiaries = beneficiaries.filter(is_active=params["is_active"] == "true")
+            if params.get("program_id"):
+                name = ministry_name(request.user)
+                program = get_object_or_404(Program, id=params["program_id"], ministry_owner__icontains=name or "")
+                beneficiaries = beneficiaries.filter(
+                    id__in=ProgramApplication.objects.filter(program=program).values("beneficiary_id"))
+
+            return Response(distributions(beneficiaries, metrics, group_by, edges, quantiles), status=status.HTTP_200_OK)
+        except DistributionError as e:
+            return err(str(e))
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class TimeSeries(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user = request.user
+            params = request.query_params
+            source = SOURCES.get(params.get("source", "applications"))
+            if source is None:
+                return err(f"source must be one of {', '.join(SOURCES)}")
+            granularity = params.get("granularity", "day")
+            if granularity not in GRANULARITIES:
+                return err(f"granularity must be one of {', '.join(GRANULARITIES)}")
+            end = parse_date(params.get("end")) if params.get("end") else timezone.localdate()
+            start = (parse_date(params.get("start")) if params.get("start")
+                     else end and end - timedelta(days=time_series_settings()["DEFAULT_DAYS"] - 1))
+            if not start or not end:
+                return err("start and end must be dates in YYYY-MM-DD format")
+
+            rows = source.model.objects.all()
+            if is_ministry(user):
+                name = ministry_name(user)
+                if not name:
+                    return err("Ministry name not found")
+                if source.model is ProgramApplication:
+                    rows = rows.filter(program__ministry_owner__icontains=name)
+                charity_id = params.get("charity_id")
+            elif hasattr(user, "charity_admin"):
+                charity_id = user.charity_admin.id
+            else:
+                return err("Only ministry users and charity admins can view time series", status.HTTP_403_FORBIDDEN)
+
+            if charity_id:
+                rows = rows.filter(**{source.groups["charity"][0]: charity_id})
+            if params.get("program_id") and source.model is ProgramApplication:
+                rows = rows.filter(program_id=params["program_id"])
+            if params.get("event_id") and source.model is EventRegistration:
+                rows = rows.filter(event_id=params["event_id"])
+
+            result = time_series(rows, source.field, start, end, granularity,
+                                 params.get("group_by") or None, source.groups)
+            return Response({"source": params.get("source", "applications"), **result}, status=status.HTTP_200_OK)
+        except TimeSeriesError as e:
+            return err(str(e))
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class Pivot(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user = request.user
+            params = request.query_params
+            fact = FACTS.get(params.get("fact", "applications"))
+            if fact is None:
+                return err(f"fact must be one of {', '.join(FACTS)}")
+            dimensions = parse_names(params.get("dimensions"), fact.dimensions, "dimension")
+            measures = parse_names(params.get("measures", "count"), fact.measures, "measure")
+
+            rows = fact.model.objects.all()
+            if is_ministry(user):
+                name = ministry_name(user)
+                if not name:
+                    return err("Ministry name not found")
+                if fact.model is ProgramApplication:
+                    rows = rows.filter(program__ministry_owner__icontains=name)
+                charity_id = params.get("charity_id")
+            elif hasattr(user, "charity_admin"):
+                charity_id = user.charity_admin.id
+            else:
+                return err("Only ministry users and charity admins can run pivots", status.HTTP_403_FORBIDDEN)
+
+            if charity_id:
+                rows = rows.filter(**{fact.charity_field: charity_id})
+            if fact.model is ProgramApplication:
+                if params.get("program_id"):
+                    rows = rows.filter(program_id=params["program_id"])
+                if params.get("status"):
+                    rows = rows.filter(status=params["status"])
+            date_from = parse_date(params.get("date_from"))
+            date_to = parse_date(params.get("date_to"))
+            if date_from:
+                rows = rows.filter(**{f"{fact.date_field}__date__gte": date_from})
+            if date_to:
+                rows = rows.filter(**{f"{fact.date_field}__date__lte": date_to})
+
+            result = pivot(rows, fact, dimensions, measures)
+            return Response({"fact": params.get("fact", "applications"), **result}, status=status.HTTP_200_OK)
+        except PivotError as e:
+            return err(str(e))
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ProcessingTimes(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            if not is_ministry(request.user):
+                return err("Only ministry users can view processing times", status.HTTP_403_FORBIDDEN)
+            name = ministry_name(request.user)
+            if not name:
+                return err("Ministry name not found")
+            params = request.query_params
+            date_to = parse_date(params.get("date_to")) if params.get("date_to") else timezone.localdate()
+            date_from = (parse_date(params.get("date_from")) if params.get("date_from")
+                         else date_to and date_to - timedelta(days=HISTORY_DEFAULT_DAYS - 1))
+            if not date_from or not date_to:
+                return err("date_from and date_to must be dates in YYYY-MM-DD format")
+
+            changes = ApplicationStatusChange.objects.filter(
+                program__ministry_owner__icontains=name, changed_at__date__gte=date_from, changed_at__date__lte=date_to)
+            if params.get("program_id"):
+                changes = changes.filter(program_id=params["program_id"])
+            return Response({
+                "date_from": date_from, "date_to": date_to,
+                "stages": stage_percentiles(changes),
+                "reviewers": reviewer_throughput(changes, (date_to - date_from).days + 1),
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ColumnarExport(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, dataset):
+        try:
+            user = request.user
+            params = request.query_params
+            spec = COLUMNAR_DATASETS.get(dataset)
+            if spec is None:
+                return err(f"dataset must be one of {', '.join(COLUMNAR_DATASETS)}", status.HTTP_404_NOT_FOUND)
+            if not columnar_available():
+                return err("Columnar exports require the pyarrow package", status.HTTP_501_NOT_IMPLEMENTED)
+            fmt = params.get("file_format", "parquet")
+            if fmt not in COLUMNAR_FORMATS:
+                return err(f"file_format must be one of {', '.join(COLUMNAR_FORMATS)}")
+
+            rows = spec.model.objects.all()
+            if is_ministry(user):
+                name = ministry_name(user)
+                if not name:
+                    return err("Ministry name not found")
+                if spec.model is ProgramApplication:
+                    rows = rows.filter(program__ministry_owner__icontains=name)
+                charity_id = params.get("charity_id")
+            elif hasattr(user, "charity_admin"):
+                charity_id = user.charity_admin.id
+            else:
+                return err("Only ministry users and charity admins can export data", status.HTTP_403_FORBIDDEN)
+
+            if charity_id:
+                rows = rows.filter(**{spec.charity_field: charity_id})
+            if spec.model is ProgramApplication:
+                if params.get("program_id"):
+                    rows = rows.filter(program_id=params["program_id"])
+                if params.get("status"):
+                    rows = rows.filter(status=params["status"])
+            date_from = parse_date(params.get("date_from"))
+            date_to = parse_date(params.get("date_to"))
+            if date_from:
+                rows = rows.filter(**{f"{spec.date_field}__date__gte": date_from})
+            if date_to:
+                rows = rows.filter(**{f"{spec.date_field}__date__lte": date_to})
+
+            out = tempfile.TemporaryFile()
+            try:
+                export_columnar(rows, spec, fmt, out, compression=params.get("compression"))
+            except ColumnarError as e:
+                out.close()
+                return err(str(e))
+            out.seek(0)
+            content_type, extension, _ = COLUMNAR_FORMATS[fmt]
+            return FileResponse(out, as_attachment=True, content_type=content_type,
+                                filename=f"{dataset}_{timezone.now().strftime('%Y%m%d')}.{extension}")
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class ProgramStatistics(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -893,11 +1382,10 @@ class CharityStatistics(APIView):
                 apps = apps.filter(submitted_at__date__lte=date_to)
 
             events_summary = []
-            for ev in events_qs:
-                total_registrations = EventRegistration.objects.filter(
-                    event=ev).count()
-                attended_count = EventRegistration.objects.filter(
-                    event=ev, attended=True).count()
+            for ev in events_qs.annotate(total_registrations=Count("registrations"),
+                                         attended_count=Count("registrations", filter=Q(registrations__attended=True))):
+                total_registrations = ev.total_registrations
+                attended_count = ev.attended_count
                 available_spots = (None if ev.max_capacity is None else max(
                     0, ev.max_capacity - total_registrations))
                 events_summary.append({
@@ -912,22 +1400,15 @@ class CharityStatistics(APIView):
                     "attended_count": attended_count,
                 })
 
-            registrations_over_time = [
-                {
-                    "date": (timezone.now().date()-timedelta(days=29-i)).strftime("%Y-%m-%d"),
-                    "day": (timezone.now().date()-timedelta(days=29-i)).strftime("%d/%m"),
-                    "count": regs.filter(registered_at__date=(timezone.now().date()-timedelta(days=29-i))).count()
-                } for i in range(30)
-            ]
+            registrations_over_time = recent_daily_counts(regs, "registered_at")
 
             upcoming = Event.objects.filter(
                 charity=charity, event_date__gte=timezone.now(),
                 event_date__lte=timezone.now()+timedelta(days=7), is_active=True
-            ).order_by("event_date")[:5]
+            ).annotate(total_registrations=Count("registrations")).order_by("event_date")[:5]
             upcoming_data = []
             for e in upcoming:
-                total_registrations = EventRegistration.objects.filter(
-                    event=e).count()
+                total_registrations = e.total_registrations
                 upcoming_data.append({
                     "id": e.id,
                     "title": e.title,
@@ -962,6 +1443,25 @@ class CharityStatistics(APIView):
                     "date_to": request.query_params.get("date_to"),
                 }
             }
+            if include_archive(request.query_params):
+                archived_regs = ArchivedEventRegistration.objects.filter(charity_id=charity.id)
+                if event_id:
+                    archived_regs = archived_regs.filter(event_id=event_id)
+                if date_from:
+                    archived_regs = archived_regs.filter(registered_at__date__gte=date_from)
+                if date_to:
+                    archived_regs = archived_regs.filter(registered_at__date__lte=date_to)
+                archived_apps = ArchivedProgramApplication.objects.filter(charity_id=charity.id)
+                if status_filter:
+                    archived_apps = archived_apps.filter(status=status_filter)
+                if date_from:
+                    archived_apps = archived_apps.filter(submitted_at__date__gte=date_from)
+                if date_to:
+                    archived_apps = archived_apps.filter(submitted_at__date__lte=date_to)
+                statistics["archive"] = {
+                    **registration_archive_summary(archived_regs),
+                    **application_archive_summary(archived_apps),
+                }
             return Response(statistics, status=status.HTTP_200_OK)
         except PermissionDenied as e:
             return err(str(e), status=status.HTTP_403_FORBIDDEN)
@@ -1041,9 +1541,8 @@ class CharityStatistics(APIView):
                 writer.writerow(["=== EVENTS SUMMARY ==="])
                 writer.writerow(["Event ID", "Event Title", "Event Date", "Location", "City",
                                  "Max Capacity", "Current Registrations", "Available Spots", "Status"])
-                for e in events_qs:
-                    total_registrations = EventRegistration.objects.filter(
-                        event=e).count()
+                for e in events_qs.annotate(total_registrations=Count("registrations")):
+                    total_registrations = e.total_registrations
                     available_spots = (None if e.max_capacity is None else max(
                         0, e.max_capacity - total_registrations))
                     writer.writerow([
@@ -1108,9 +1607,8 @@ class CharityStatistics(APIView):
             elif export_type == "events":
                 writer.writerow(["Event ID", "Event Title", "Event Date", "Location", "City",
                                  "Max Capacity", "Current Registrations", "Available Spots", "Status"])
-                for e in events_qs:
-                    total_registrations = EventRegistration.objects.filter(
-                        event=e).count()
+                for e in events_qs.annotate(total_registrations=Count("registrations")):
+                    total_registrations = e.total_registrations
                     available_spots = (None if e.max_capacity is None else max(
                         0, e.max_capacity - total_registrations))
                     writer.writerow([
@@ -1160,3 +1658,154 @@ class CharityStatistics(APIView):
         except Exception as e:
             return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+# ===== CHANGES FEED =====
+class ChangesFeed(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        config = feed_settings()
+        names = request.query_params.get("resources")
+        names = [n.strip() for n in names.split(",") if n.strip()] if names else list(RESOURCES)
+        unknown = [n for n in names if n not in RESOURCES]
+        if unknown:
+            return err(f"Unknown resources: {', '.join(unknown)}")
+        names = [n for n in RESOURCES if n in names]
+        try:
+            limit = int(request.query_params.get("limit", config["PAGE_SIZE"]))
+        except ValueError:
+            return err("limit must be an integer")
+        limit = max(1, min(limit, config["MAX_PAGE_SIZE"]))
+        try:
+            state = decode_cursor(request.query_params.get("cursor"))
+        except InvalidCursor as e:
+            return err(str(e))
+        except CursorExpired as e:
+            return err(str(e), status.HTTP_410_GONE)
+        response = StreamingHttpResponse(
+            iter_changes(request.user, state, names, limit), content_type="application/x-ndjson")
+        response["Cache-Control"] = "no-store"
+        return response
+
+
+# ===== AUDIT LOG =====
+class AuditLog(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            if not request.user.is_superuser:
+                return err("Only superusers can view the audit log", status.HTTP_403_FORBIDDEN)
+            params = request.query_params
+            config = audit.audit_settings()
+            try:
+                limit = max(1, min(int(params.get("limit", config["PAGE_SIZE"])), config["MAX_PAGE_SIZE"]))
+                entries = audit.search(
+                    resource=params.get("resource"), object_id=params.get("object_id"),
+                    actor_id=params.get("actor_id"), action=params.get("action"),
+                    since=params.get("since"), until=params.get("until"), cursor=params.get("cursor"),
+                )
+            except ValueError as e:
+                return err(str(e))
+            rows = list(entries[:limit + 1])
+            return Response({
+                "results": AuditEntrySerializer(rows[:limit], many=True).data,
+                "next": audit.encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return err(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ===== LIVE UPDATES =====
+def stream_user(request):
+    """JWT from the Authorization header, or ?token= since EventSource cannot set headers."""
+    auth = JWTAuthentication()
+    try:
+        if request.GET.get("token"):
+            token = auth.get_validated_token(request.GET["token"])
+            user = auth.get_user(token)
+        else:
+            user = (auth.authenticate(request) or (None, None))[0]
+    except (InvalidToken, AuthenticationFailed):
+        return None, None
+    return user, subscriber_filter(user) if user else None
+
+
+async def live_updates(request):
+    # A plain async view: DRF's APIView would hold a worker thread for the
+    # whole life of the connection.
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    if not isinstance(request, ASGIRequest):
+        # WSGI buffers an async stream to the end before sending it, which never comes
+        return JsonResponse({"error": "Live updates are only available when the server runs under ASGI (sila.asgi)"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    user, match = await sync_to_async(stream_user)(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication credentials were not provided or are invalid"},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    if match is None:
+        return JsonResponse({"error": "Only ministry users and charity admins can subscribe to live updates"},
+                            status=status.HTTP_403_FORBIDDEN)
+    response = StreamingHttpResponse(live_stream(get_broker(), match), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# ===== DOCUMENT UPLOADS =====
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class DocumentUploadsIndex(APIView):
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = AUTH_THROTTLES
+    throttle_scope = "upload"
+
+    def post(self, request):
+        try:
+            upload = create_upload(
+                request.user, request.data.get("filename"), request.data.get("size"),
+                request.data.get("content_type"), client_ip=IPRateThrottle().get_ident(request))
+        except UploadError as e:
+            return err(str(e))
+        data = DocumentUploadSerializer(upload).data
+        data["chunk_size"] = upload_settings()["CHUNK_BYTES"]
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class DocumentUploadDetail(APIView):
+    permission_classes = [permissions.AllowAny]
+    # Chunks are raw bytes with no email to key on; the body is streamed, never parsed
+    throttle_classes = [IPRateThrottle, GlobalRateThrottle]
+    throttle_scope = "upload-chunk"
+
+    def get_upload(self, request, upload_id):
+        upload = get_object_or_404(DocumentUpload.objects.select_related("document"), id=upload_id)
+        if upload.owner_id and upload.owner_id != request.user.id:
+            raise NotFound("Upload not found")
+        return upload
+
+    def get(self, request, upload_id):
+        return Response(DocumentUploadSerializer(self.get_upload(request, upload_id)).data, status=status.HTTP_200_OK)
+
+    def put(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        match = CONTENT_RANGE.match(request.headers.get("Content-Range", ""))
+        if not match:
+            return err("Content-Range header of the form 'bytes start-end/total' is required.")
+        start, end, total = (int(g) for g in match.groups())
+        length = end - start + 1
+        if total != upload.size or length <= 0:
+            return err("Content-Range does not match the declared upload size.")
+        if int(request.META.get("CONTENT_LENGTH") or 0) != length:
+            return err("Content-Length does not match Content-Range.")
+        try:
+            upload = append_chunk(upload.id, start, length, request._request)
+        except UploadError as e:
+            body = {"error": str(e)}
+            if e.offset is not None:
+                body["offset"] = e.offset
+                return Response(body, status=status.HTTP_409_CONFLICT)
+            return Response(body, status=status.HTTP_400_BAD_REQUEST)
+        return Response(DocumentUploadSerializer(upload).data, status=status.HTTP_200_OK)
@@ -0,0 +1,104 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import audit
+from .models import ProgramApplication
+from .notifications import notify_decision
+
+QUEUE_DEFAULTS = {
+    "LEASE_SECONDS": 15 * 60,
+    "MAX_CLAIM": 50,
+    # SQLite only: attempts when another writer holds the database lock
+    "LOCKED_RETRIES": 20,
+}
+
+
+class ClaimError(Exception):
+    pass
+
+
+def queue_settings():
+    return {**QUEUE_DEFAULTS, **getattr(settings, "REVIEW_QUEUE", {})}
+
+
+def unclaimed(now):
+    return Q(claimed_by__isnull=True) | Q(claim_expires_at__lt=now)
+
+
+def claimable(programs, now):
+    return ProgramApplication.objects.filter(unclaimed(now), status="PENDING", program__in=programs)
+
+
+def claim(reviewer, programs, count):
+    """
+    Lease up to `count` of the oldest unclaimed PENDING applications in
+    `programs` to `reviewer` and return their ids.
+
+    On PostgreSQL candidates are locked with FOR UPDATE SKIP LOCKED, so
+    concurrent reviewers take disjoint rows without waiting on each other.
+    Elsewhere a single conditional UPDATE claims the rows; it re-checks the
+    claim in its WHERE clause, so a row another reviewer took first is
+    simply not updated.
+    """
+    config = queue_settings()
+    count = max(1, min(int(count), config["MAX_CLAIM"]))
+    now = timezone.now()
+    lease = {"claimed_by": reviewer, "claim_expires_at": now + timedelta(seconds=config["LEASE_SECONDS"]),
+             "updated_at": now}
+    candidates = claimable(programs, now).order_by("submitted_at", "id")
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(candidates.select_for_update(skip_locked=True, of=("self",))
+                       .values_list("id", flat=True)[:count])
+            ProgramApplication.objects.filter(id__in=ids).update(**lease)
+        return ids
+
+    for attempt in range(config["LOCKED_RETRIES"]):
+        try:
+            with transaction.atomic():
+                ProgramApplication.objects.filter(unclaimed(now), status="PENDING",
+                                                  id__in=candidates.values("id")[:count]).update(**lease)
+                return list(ProgramApplication.objects.filter(
+                    claimed_by=reviewer, claim_expires_at=lease["claim_expires_at"]).values_list("id", flat=True))
+        except OperationalError as e:
+            if "locked" not in str(e) or attempt == config["LOCKED_RETRIES"] - 1:
+                raise
+            time.sleep(random.uniform(0, min(0.2, 0.005 * 2 ** attempt)))
+
+
+def held_by(reviewer, now=None):
+    return ProgramApplication.objects.filter(claimed_by=reviewer, claim_expires_at__gte=now or timezone.now())
+
+
+def release(reviewer, ids=None):
+    qs = ProgramApplication.objects.filter(claimed_by=reviewer)
+    if ids is not None:
+        qs = qs.filter(id__in=ids)
+    return qs.update(claimed_by=None, claim_expires_at=None, updated_at=timezone.now())
+
+
+def review(reviewer, application_id, new_status, notes=""):
+    """Record a decision on an application the reviewer currently holds, ending the lease."""
+    with audit.atomic():
+        application = ProgramApplication.objects.select_for_update().filter(id=application_id).first()
+        if application is None:
+            raise ClaimError("Application not found")
+        if application.claimed_by_id != reviewer.id or application.claim_expires_at < timezone.now():
+            raise ClaimError("Claim the application before reviewing it; the lease may have expired")
+        with audit.tracking(reviewer, application):
+            application.status = new_status
+            application.review_notes = notes
+            application.reviewed_at = timezone.now()
+            application.claimed_by = None
+            application.claim_expires_at = None
+            application._changed_by = reviewer
+            application.save()
+        notify_decision(application)
+    return application
@@ -14,6 +14,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,6 +30,7 @@ SECRET_KEY = os.environ.get("SECRET_KEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
+TESTING = sys.argv[1:2] == ["test"]
 
 ALLOWED_HOSTS = []
 CORS_ALLOW_ALL_ORIGINS = False
@@ -52,6 +54,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "main_app.middleware.QueryContextMiddleware",
+    "main_app.middleware.NPlusOneMiddleware",
+    "main_app.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -64,9 +69,175 @@ MIDDLEWARE = [
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
+    ),
+    # orjson is used when installed, otherwise the stdlib encoder
+    "DEFAULT_RENDERER_CLASSES": (
+        "main_app.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    # Sliding-window limits for the unauthenticated auth endpoints, as
+    # "<view scope>.<ip|email|global>": "<requests>/<period>". Remove an
+    # entry to disable that limit.
+    "DEFAULT_THROTTLE_RATES": {
+        "login.ip": "30/min",
+        "login.email": "10/5min",
+        "login.global": "600/min",
+        "signup.ip": "10/h",
+        "signup.email": "5/h",
+        "signup.global": "300/min",
+        "register.ip": "10/h",
+        "register.email": "5/h",
+        "register.global": "100/min",
+        "upload.ip": "30/h",
+        "upload.global": "300/min",
+        # A 20 MB document at the default 2 MB chunk size is 10 chunks
+        "upload-chunk.ip": "600/h",
+        "upload-chunk.global": "3000/min",
+    },
+    # Proxies in front of the app whose X-Forwarded-For entries are trusted; 0 uses REMOTE_ADDR only
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
+}
+
+# Throttle counters live here; use Redis so limits are shared by all workers.
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.environ["REDIS_URL"]}
+        if os.environ.get("REDIS_URL") else
+        {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
     )
 }
 
+# Incremental sync feed (/changes/; manage.py clear_tombstones prunes)
+CHANGES_FEED = {
+    "SAFETY_LAG_SECONDS": 2,
+    "PAGE_SIZE": 500,
+    "MAX_PAGE_SIZE": 5000,
+    "TOMBSTONE_RETENTION_DAYS": 30,
+}
+
+# Webhook delivery (manage.py dispatch_outbox; manage.py clear_outbox prunes)
+OUTBOX = {
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF_BASE_SECONDS": 5,
+    "BACKOFF_MAX_SECONDS": 3600,
+    "TIMEOUT_SECONDS": 10,
+    "RETENTION_DAYS": 30,
+}
+
+# Ministry reviewer work queue (applications/queue/)
+REVIEW_QUEUE = {
+    "LEASE_SECONDS": 15 * 60,
+    "MAX_CLAIM": 50,
+}
+
+# Cross-charity duplicate beneficiary detection (manage.py find_duplicates)
+DUPLICATE_DETECTION = {
+    "THRESHOLD": 0.7,
+    "MAX_BLOCK_SIZE": 500,
+    "WORKERS": int(os.environ["DEDUP_WORKERS"]) if os.environ.get("DEDUP_WORKERS") else None,
+}
+
+# Beneficiary distribution analytics (ministry/distributions/)
+DISTRIBUTIONS = {
+    "CHUNK_ROWS": 50000,
+    "MAX_BINS": 200,
+    "MAX_GROUPS": 500,
+}
+
+# Dashboard time series (statistics/time-series/)
+TIME_SERIES = {
+    "MAX_BUCKETS": 1000,
+    "MAX_SERIES": 50,
+}
+
+# Generic grouped aggregates (statistics/pivot/)
+PIVOT = {
+    "MAX_DIMENSIONS": 3,
+    "MAX_ROWS": 1000,
+}
+
+# Server-Sent Events for dashboards (live/). OutboxBroker reaches dashboards
+# on every worker; LocalBroker only those connected to the same process.
+LIVE_UPDATES = {
+    "BROKER": os.environ.get("LIVE_UPDATES_BROKER", "main_app.live.OutboxBroker"),
+    "HEARTBEAT_SECONDS": 15,
+    "POLL_INTERVAL_SECONDS": 1,
+    "SAFETY_LAG_SECONDS": 2,
+}
+
+# Admin changelist counts for large tables (main_app.paginators)
+ADMIN_COUNTS = {
+    "ESTIMATE_ABOVE": 100000,
+    "MAX_COUNT": 100000,
+}
+
+# Audit log (audit/). Entries recorded inside audit.atomic() are
+# bulk-inserted just before the transaction commits.
+AUDIT_LOG = {
+    "BATCH_SIZE": 500,
+}
+
+# Beneficiary email notifications (manage.py send_notifications)
+NOTIFICATIONS = {
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 5,
+}
+
+# Idempotency-Key replay for submission endpoints
+# (manage.py clear_idempotency_keys removes expired records)
+IDEMPOTENCY = {
+    "TTL_SECONDS": 24 * 60 * 60,
+    "WAIT_SECONDS": 10,
+}
+
+# Recurring event series (events/series/): occurrences are created this
+# far ahead and topped up by `manage.py extend_event_series`
+EVENT_SERIES = {
+    "HORIZON_DAYS": 365,
+    "REFRESH_DAYS": 7,
+}
+
+# Sharded ministry export (ministry/statistics/ POST export_type=bundle,
+# manage.py export_ministry_bundle). WORKERS None uses every CPU.
+EXPORT_BUNDLE = {
+    "WORKERS": int(os.environ["EXPORT_WORKERS"]) if os.environ.get("EXPORT_WORKERS") else None,
+}
+
+# Arrow IPC / Parquet exports (exports/<dataset>/), available when pyarrow is installed
+COLUMNAR_EXPORT = {
+    "CHUNK_ROWS": 10000,
+    "COMPRESSION": "zstd",
+}
+
+# Slow query log (manage.py slow_queries). THRESHOLD_MS None turns it off.
+SLOW_QUERY_LOG = {
+    "THRESHOLD_MS": int(os.environ["SLOW_QUERY_MS"]) if os.environ.get("SLOW_QUERY_MS") else 200,
+    "PATH": os.environ.get("SLOW_QUERY_LOG_PATH", BASE_DIR / "logs" / "slow_queries.log"),
+}
+
+# N+1 query detection per request (main_app.nplusone); test runs fail on a repeat
+NPLUSONE = {
+    "ENABLED": DEBUG or TESTING,
+    "ACTION": "raise" if TESTING else os.environ.get("NPLUSONE_ACTION", "warn"),
+    "THRESHOLD": 5,
+    "ALLOWLIST": {},
+}
+
+# Archive tier and batched deletes (manage.py archive_history, purge)
+ARCHIVE = {
+    "BATCH_SIZE": 500,
+    "SLEEP_SECONDS": 0.05,
+    "CLOSED_PROGRAM_DAYS": 90,
+    "PAST_EVENT_DAYS": 180,
+}
+
+# br is offered only when the brotli package is installed
+RESPONSE_COMPRESSION = {
+    "MIN_SIZE": int(os.environ.get("COMPRESSION_MIN_SIZE", 1024)),
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 4,
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -137,6 +308,22 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+AUTHENTICATION_BACKENDS = [
+    "main_app.backends.EmailBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+# The first hasher encodes new passwords; the rest only verify older hashes.
+PASSWORD_HASHERS = [
+    "main_app.hashers.TunablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ["PASSWORD_HASH_ITERATIONS"]) if os.environ.get("PASSWORD_HASH_ITERATIONS") else None
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -154,6 +341,40 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", BASE_DIR / "media")
+
+# Chunked, content-addressed charity document uploads (/uploads/)
+DOCUMENT_UPLOADS = {
+    "MAX_BYTES": 20 * 1024 * 1024,
+    "CHUNK_BYTES": 2 * 1024 * 1024,
+    "EXPIRY_HOURS": 24,
+    "MAX_OPEN_UPLOADS": 5,
+    "CONTENT_TYPES": ("application/pdf", "image/png", "image/jpeg"),
+}
+
+# Set DOCUMENT_ACCEL_PREFIX (e.g. /protected-media/) when nginx serves
+# MEDIA_ROOT from an internal location; documents are then sent with
+# X-Accel-Redirect instead of being streamed by Django.
+DOCUMENT_SERVING = {
+    "ACCEL_REDIRECT": (
+        {"HEADER": "X-Accel-Redirect", "PREFIX": os.environ["DOCUMENT_ACCEL_PREFIX"]}
+        if os.environ.get("DOCUMENT_ACCEL_PREFIX") else None
+    ),
+}
+
+# Email. The console backend prints messages; set EMAIL_BACKEND to
+# django.core.mail.backends.filebased.EmailBackend and EMAIL_FILE_PATH to
+# write them to files, or to the smtp backend in production.
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+EMAIL_FILE_PATH = os.environ.get("EMAIL_FILE_PATH", BASE_DIR / "sent_emails")
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS") == "1"
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "Sila <no-reply@sila.local>")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 